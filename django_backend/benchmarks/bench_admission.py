@@ -0,0 +1,116 @@
+"""
+Load test admission control on the generate-image endpoint.
+
+Starts one ASGI worker per scenario, with image-gen limited to a few
+concurrent calls, and fires a burst of distinct prompts at it (so the result
+cache cannot absorb it):
+
+- unbounded: an effectively unlimited wait queue, i.e. no load shedding
+- bounded: a short wait queue; the overflow gets 429 with Retry-After
+- deadline: the short queue plus an X-Request-Timeout on every request;
+  requests that cannot finish in time get 503 with Retry-After
+
+Usage:
+    python -m benchmarks.bench_admission --requests 40 --concurrency 2 --queue 6
+"""
+
+import argparse
+import http.client
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import (
+    bench_session, free_port, migrate, percentile, setup_django, start_server,
+    stop_server,
+)
+
+PATH = '/api/generate-image'
+
+
+def post(port, body, headers):
+    """Send one request and return (status, Retry-After or None, seconds)."""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    started = time.perf_counter()
+    try:
+        connection.request(
+            'POST', PATH, body=json.dumps(body).encode(),
+            headers={'Content-Type': 'application/json', **headers},
+        )
+        response = connection.getresponse()
+        response.read()
+        return response.status, response.getheader('Retry-After'), time.perf_counter() - started
+    finally:
+        connection.close()
+
+
+def run_burst(port, headers, total, run_id):
+    """Send `total` concurrent requests and summarize them by outcome."""
+    def one(i):
+        return post(port, {'prompt': f'admission {run_id} {i}'}, headers)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=total) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    served = [seconds for status, _, seconds in results if status == 200]
+    refused = [seconds for status, _, seconds in results if status in (429, 503)]
+    retry_after = [int(value) for _, value, _ in results if value]
+    return {
+        'requests': total,
+        'elapsed_s': round(elapsed, 2),
+        'ok': len(served),
+        'status_429': sum(1 for status, _, _ in results if status == 429),
+        'status_503': sum(1 for status, _, _ in results if status == 503),
+        'other': sum(1 for status, _, _ in results if status not in (200, 429, 503)),
+        'ok_p50_ms': round(percentile(served, 50) * 1000, 1),
+        'ok_p99_ms': round(percentile(served, 99) * 1000, 1),
+        'ok_max_ms': round(max(served, default=0) * 1000, 1),
+        'refused_p99_ms': round(percentile(refused, 99) * 1000, 1),
+        'retry_after_s': [min(retry_after), max(retry_after)] if retry_after else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=2,
+                        help='image-gen calls allowed to run at once')
+    parser.add_argument('--queue', type=int, default=6,
+                        help='image-gen calls allowed to wait in the bounded scenarios')
+    parser.add_argument('--timeout', type=float, default=5.0,
+                        help='X-Request-Timeout sent in the deadline scenario')
+    args = parser.parse_args()
+
+    setup_django()
+    migrate()
+    session = bench_session()
+
+    scenarios = {
+        'unbounded': (100000, {}),
+        'bounded': (args.queue, {}),
+        'deadline': (args.queue, {'X-Request-Timeout': str(args.timeout)}),
+    }
+    report = {}
+    for name, (queue, extra_headers) in scenarios.items():
+        port = free_port()
+        server = start_server('asgi', port, workers=1, env={
+            'ML_MAX_CONCURRENCY': str(args.concurrency),
+            'ML_MAX_QUEUE': str(queue),
+        })
+        try:
+            # Load the model and seed the service time estimate
+            post(port, {'prompt': f'admission warm-up {name}'}, session)
+            report[name] = run_burst(
+                port, {**session, **extra_headers}, args.requests, f'{name}-{time.time()}'
+            )
+        finally:
+            stop_server(server)
+        print(f"{name}: {json.dumps(report[name])}")
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark the style classifier on synthetic embeddings.
+
+For each classifier, reports training time, held-out accuracy and prediction
+throughput at several batch sizes, from one embedding per call (as a
+per-item loop would) up to whole batches. Then runs classify_items end to
+end over a catalog in a temporary SQLite database and similarity index.
+
+Usage:
+    python -m benchmarks.bench_classifier --items 100000 --train 20000
+"""
+
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .bench_similarity import synthetic_embeddings
+from .common import migrate, setup_django
+
+CATEGORIES = ('casual', 'formal', 'streetwear', 'bohemian', 'minimalist', 'vintage', 'sporty')
+
+
+def labelled_embeddings(count, dim, seed=0):
+    """Synthetic embeddings labelled by a fixed random projection."""
+    vectors = synthetic_embeddings(count, dim, clusters=64, seed=seed)
+    rng = np.random.default_rng(seed)
+    projection = rng.standard_normal((dim, len(CATEGORIES))).astype(np.float32)
+    labels = (vectors @ projection).argmax(axis=1).astype(np.int32)
+    return vectors, labels
+
+
+def throughput(classifier, vectors, batch_size, limit):
+    """Embeddings classified per second in calls of batch_size."""
+    vectors = vectors[:limit]
+    started = time.perf_counter()
+    for start in range(0, len(vectors), batch_size):
+        classifier.predict(vectors[start:start + batch_size])
+    return round(len(vectors) / (time.perf_counter() - started))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--train', type=int, default=20000, help='labelled embeddings')
+    parser.add_argument('--batch-size', type=int, default=1000, help='classify_items batch size')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        os.environ['ML_DATA_DIR'] = str(directory / 'ml_data')
+        os.environ['DATABASE_URL'] = f"sqlite:///{directory / 'bench.sqlite3'}"
+        migrate({key: os.environ[key] for key in ('ML_DATA_DIR', 'DATABASE_URL')})
+        setup_django()
+        from django.core.management import call_command
+
+        from ml_api.models import FashionItem
+        from ml_api.similarity import EMBEDDING_DIM, get_similarity_index
+        from ml_api.style_classifier import CLASSIFIERS, StyleClassifier
+
+        vectors, labels = labelled_embeddings(args.train + args.items, EMBEDDING_DIM)
+        train_x, train_y = vectors[:args.train], labels[:args.train]
+        vectors, labels = vectors[args.train:], labels[args.train:]
+
+        classifiers, reports = {}, []
+        for kind in CLASSIFIERS:
+            started = time.perf_counter()
+            classifier = StyleClassifier.train(train_x, train_y, CATEGORIES, kind=kind)
+            train_s = time.perf_counter() - started
+            classifiers[kind] = classifier
+            accuracy = np.mean(classifier.predict_proba(vectors[:10000]).argmax(axis=1) == labels[:10000])
+            reports.append({
+                'classifier': kind,
+                'train_s': round(train_s, 2),
+                'accuracy': round(float(accuracy), 3),
+                # A per-item loop is measured on fewer embeddings to keep it short
+                'items_per_s': {
+                    str(batch_size): throughput(classifier, vectors, batch_size,
+                                                2000 if batch_size == 1 else len(vectors))
+                    for batch_size in (1, 64, 1000, 10000)
+                },
+            })
+            print(json.dumps(reports[-1]), flush=True)
+
+        started = time.perf_counter()
+        FashionItem.objects.bulk_create(
+            (FashionItem(title=f'item {i}', image=f'benchmark/{i}.jpg') for i in range(args.items)),
+            batch_size=10000,
+        )
+        ids = list(FashionItem.objects.order_by('id').values_list('id', flat=True))
+        index = get_similarity_index()
+        for start in range(0, len(ids), 10000):
+            index.add(ids[start:start + 10000], vectors[start:start + 10000])
+        print(f'Populated {args.items} items in {time.perf_counter() - started:.1f}s', flush=True)
+
+        end_to_end = []
+        for kind, classifier in classifiers.items():
+            path = directory / f'{kind}.joblib'
+            classifier.save(path)
+            FashionItem.objects.update(style_category='')
+            started = time.perf_counter()
+            call_command('classify_items', model=str(path), batch_size=args.batch_size, stdout=io.StringIO())
+            elapsed = time.perf_counter() - started
+            end_to_end.append({
+                'classifier': kind,
+                'elapsed_s': round(elapsed, 2),
+                'items_per_s': round(args.items / elapsed),
+            })
+    print(json.dumps({'items': args.items, 'results': reports, 'classify_items': end_to_end}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
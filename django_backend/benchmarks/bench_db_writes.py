@@ -0,0 +1,216 @@
+"""
+Benchmark concurrent writes to FashionItem and StyleRecommendation.
+
+Several writer processes, like gunicorn workers, insert FashionItem rows and
+upsert StyleRecommendation rows while reader processes list items. Each
+database is created and migrated from scratch:
+
+- sqlite-default: SQLite with its default rollback journal (SQLITE_TUNED=0)
+- sqlite-tuned: SQLite in WAL mode with synchronous=NORMAL and mmap
+- postgres: the database at --postgres-url, if given. Its tables are flushed.
+- pgbouncer: the same database through PgBouncer in transaction pooling
+  mode at --pgbouncer-url, if given (DB_PGBOUNCER=1)
+
+Reports write and read throughput, latency percentiles and failed writes
+(e.g. "database is locked").
+
+Usage:
+    python -m benchmarks.bench_db_writes --writers 8 --writes 200 --readers 2
+    python -m benchmarks.bench_db_writes --postgres-url postgres://user:pw@localhost/bench \
+        --pgbouncer-url postgres://user:pw@localhost:6432/bench
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from .common import migrate, percentile, setup_django
+
+# Items created before the run, between which recommendations are upserted
+SEED_ITEMS = 200
+
+
+def configure(env):
+    os.environ.update(env)
+    setup_django()
+
+
+def write(worker, i, rng, seed_ids):
+    """One write: insert an item or upsert a recommendation between seed items."""
+    from ml_api.models import FashionItem, StyleRecommendation
+
+    if i % 2 == 0:
+        FashionItem.objects.create(
+            title=f'bench item {worker}-{i}',
+            image=f'benchmark/{worker}-{i}.jpg',
+            style_category='casual',
+            color_palette={'dominant': ['#000000', '#ffffff']},
+        )
+    else:
+        source, target = rng.sample(seed_ids, 2)
+        StyleRecommendation.objects.update_or_create(
+            source_item_id=source,
+            recommended_item_id=target,
+            defaults={
+                'similarity_score': rng.random(),
+                'recommendation_reason': 'benchmark',
+            },
+        )
+
+
+def read():
+    from ml_api.models import FashionItem
+
+    list(FashionItem.objects.order_by('-created_at')[:20])
+
+
+def writer(env, worker, writes, start, results):
+    configure(env)
+    from django.db import DatabaseError
+
+    from ml_api.models import FashionItem
+
+    seed_ids = list(FashionItem.objects.values_list('id', flat=True))
+    rng = random.Random(worker)
+    latencies, errors = [], 0
+    start.wait()
+    for i in range(writes):
+        started = time.perf_counter()
+        try:
+            write(worker, i, rng, seed_ids)
+        except DatabaseError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    results.put(('write', latencies, errors))
+
+
+def reader(env, start, stop, results):
+    configure(env)
+    latencies = []
+    start.wait()
+    while not stop.is_set():
+        started = time.perf_counter()
+        read()
+        latencies.append(time.perf_counter() - started)
+    results.put(('read', latencies, 0))
+
+
+def seed(env):
+    configure(env)
+    from django.core.management import call_command
+
+    from ml_api.models import FashionItem
+
+    call_command('flush', '--noinput', verbosity=0)
+    FashionItem.objects.bulk_create(
+        FashionItem(title=f'seed {i}', image=f'benchmark/seed-{i}.jpg')
+        for i in range(SEED_ITEMS)
+    )
+
+
+def run(name, env, args):
+    """Run the writers and readers against one database and summarize them."""
+    migrate(env)
+    context = multiprocessing.get_context('spawn')
+    process = context.Process(target=seed, args=(env,))
+    process.start()
+    process.join()
+
+    start, stop = context.Event(), context.Event()
+    results = context.Queue()
+    writers = [
+        context.Process(target=writer, args=(env, worker, args.writes, start, results))
+        for worker in range(args.writers)
+    ]
+    readers = [
+        context.Process(target=reader, args=(env, start, stop, results))
+        for _ in range(args.readers)
+    ]
+    for process in writers + readers:
+        process.start()
+    # Let every process finish setting up Django before the clock starts
+    time.sleep(args.warmup)
+    started = time.perf_counter()
+    start.set()
+
+    write_latencies, read_latencies, errors = [], [], 0
+    for _ in writers:
+        _, latencies, failed = results.get()
+        write_latencies += latencies
+        errors += failed
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for _ in readers:
+        _, latencies, _ = results.get()
+        read_latencies += latencies
+    for process in writers + readers:
+        process.join()
+
+    def ms(values, q):
+        return round(percentile(values, q) * 1000, 2)
+
+    return {
+        'database': name,
+        'writers': args.writers,
+        'readers': args.readers,
+        'writes': len(write_latencies),
+        'failed_writes': errors,
+        'elapsed_s': round(elapsed, 3),
+        'writes_per_s': round(len(write_latencies) / elapsed, 1),
+        'write_p50_ms': ms(write_latencies, 50),
+        'write_p99_ms': ms(write_latencies, 99),
+        'reads_per_s': round(len(read_latencies) / elapsed, 1),
+        'read_p50_ms': ms(read_latencies, 50),
+        'read_p99_ms': ms(read_latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=200, help='writes per writer')
+    parser.add_argument('--readers', type=int, default=2)
+    parser.add_argument('--postgres-url', help='PostgreSQL database URL to also benchmark')
+    parser.add_argument('--pgbouncer-url',
+                        help='PgBouncer (transaction pooling) URL of a PostgreSQL database to also benchmark')
+    parser.add_argument('--warmup', type=float, default=3.0,
+                        help='seconds for the processes to start before the run')
+    args = parser.parse_args()
+
+    reports = []
+    with tempfile.TemporaryDirectory() as directory:
+        databases = {
+            'sqlite-default': {
+                'DATABASE_URL': f"sqlite:///{Path(directory) / 'default.sqlite3'}",
+                'SQLITE_TUNED': '0',
+            },
+            'sqlite-tuned': {
+                'DATABASE_URL': f"sqlite:///{Path(directory) / 'tuned.sqlite3'}",
+                'SQLITE_TUNED': '1',
+            },
+        }
+        if args.postgres_url:
+            databases['postgres'] = {'DATABASE_URL': args.postgres_url}
+        if args.pgbouncer_url:
+            databases['pgbouncer'] = {'DATABASE_URL': args.pgbouncer_url, 'DB_PGBOUNCER': '1'}
+        for name, env in databases.items():
+            report = run(name, env, args)
+            print(
+                f"{name:<15} {report['writes_per_s']:>8.1f} writes/s  "
+                f"p50 {report['write_p50_ms']:>7.2f} ms  p99 {report['write_p99_ms']:>8.2f} ms  "
+                f"failed {report['failed_writes']:<4} {report['reads_per_s']:>8.1f} reads/s  "
+                f"p99 {report['read_p99_ms']:>7.2f} ms",
+                flush=True,
+            )
+            reports.append(report)
+    print(json.dumps(reports, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Exercise the remote image fetcher against a local stub HTTP server.
+
+The stub serves generated JPEGs with ETag/Last-Modified validators and a fixed
+response delay. The benchmark reports serial vs concurrent cold fetches, fresh
+cache hits and conditional revalidation, and checks the size limit and the
+per-host connection limit.
+
+Usage:
+    python -m benchmarks.bench_fetcher --images 32 --delay-ms 100
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .common import free_port, setup_django
+
+
+class StubImageServer(ThreadingHTTPServer):
+    """
+    HTTP server for /image/<n>.jpg (max-age=0, so always revalidated),
+    /fresh/<n>.jpg (max-age=3600) and /large.bin.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, port, delay, max_body):
+        from PIL import Image
+
+        super().__init__(('127.0.0.1', port), StubHandler)
+        self.delay = delay
+        self.max_body = max_body
+        self.requests = 0
+        self.not_modified = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), (120, 60, 30)).save(buffer, format='JPEG')
+        self.image = buffer.getvalue()
+        self.last_modified = formatdate(time.time() - 3600, usegmt=True)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            if self.path == '/large.bin':
+                body = b'\0' * (server.max_body + 1)
+                try:
+                    self._send(200, body, {'Content-Type': 'application/octet-stream'})
+                except BrokenPipeError:
+                    pass  # The fetcher aborts once the size limit is hit
+                return
+            etag = f'"{self.path}"'
+            if self.headers.get('If-None-Match') == etag:
+                with server.lock:
+                    server.not_modified += 1
+                self._send(304, b'', {'ETag': etag})
+                return
+            self._send(200, server.image, {
+                'Content-Type': 'image/jpeg',
+                'ETag': etag,
+                'Last-Modified': server.last_modified,
+                'Cache-Control': 'max-age=3600' if self.path.startswith('/fresh/') else 'max-age=0',
+            })
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _send(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+async def timed(coroutine):
+    started = time.perf_counter()
+    result = await coroutine
+    return result, round((time.perf_counter() - started) * 1000, 1)
+
+
+async def run(fetcher, server, base_url, images):
+    from ml_api.fetcher import FetchError
+
+    urls = [f'{base_url}/image/{i}.jpg' for i in range(images)]
+    results = {}
+
+    async def serial(urls):
+        return [await fetcher.fetch(url) for url in urls]
+
+    # Cold fetches; max-age=0 makes every later fetch revalidate
+    _, results['serial_cold_ms'] = await timed(serial(urls[: images // 2]))
+    server.max_in_flight = 0
+    bodies, results['concurrent_cold_ms'] = await timed(fetcher.fetch_many(urls[images // 2:]))
+    results['concurrent_max_in_flight'] = server.max_in_flight
+    results['per_host_limit'] = fetcher.max_per_host
+
+    before = server.not_modified
+    bodies, results['revalidate_ms'] = await timed(fetcher.fetch_many(urls))
+    results['not_modified_responses'] = server.not_modified - before
+    results['revalidated_ok'] = all(body == server.image for body in bodies)
+
+    # Fresh entries are served without a request
+    fresh_urls = [f'{base_url}/fresh/{i}.jpg' for i in range(images)]
+    await fetcher.fetch_many(fresh_urls)
+    requests_before = server.requests
+    _, results['fresh_hit_ms'] = await timed(fetcher.fetch_many(fresh_urls))
+    results['fresh_hit_requests'] = server.requests - requests_before
+
+    try:
+        await fetcher.fetch(f'{base_url}/large.bin')
+        results['size_limit_enforced'] = False
+    except FetchError:
+        results['size_limit_enforced'] = True
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--images', type=int, default=32)
+    parser.add_argument('--delay-ms', type=float, default=100)
+    parser.add_argument('--per-host', type=int, default=8)
+    args = parser.parse_args()
+
+    setup_django()
+    from ml_api.fetcher import ImageFetcher
+
+    port = free_port()
+    server = StubImageServer(port, args.delay_ms / 1000, max_body=1024 * 1024)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cache_dir = tempfile.mkdtemp(prefix='ml-fetch-')
+    # The stub server is on loopback, which the fetcher refuses by default
+    fetcher = ImageFetcher(
+        cache_dir, max_per_host=args.per_host, max_bytes=1024 * 1024, allow_private=True,
+    )
+    try:
+        results = asyncio.run(run(fetcher, server, f'http://127.0.0.1:{port}', args.images))
+    finally:
+        server.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    results['fetcher'] = fetcher.stats()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Measure server memory as gunicorn workers are added, with and without shared
+(memory-mapped) model weights.
+
+Writes synthetic kNN style-analyzer weights to a temporary model directory,
+starts gunicorn with 1, 4 and 8 workers, warms every worker with
+analyze-style requests and sums the memory of the master and its workers.
+PSS is the figure to compare: it charges shared pages once across processes,
+while the RSS sum counts them once per worker.
+
+Usage:
+    python -m benchmarks.bench_memory --references 200000 --workers 1 4 8
+"""
+
+import argparse
+import json
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .common import (
+    bench_session, child_pids, free_port, migrate, process_memory, request,
+    setup_django, start_server, stop_server,
+)
+
+CATEGORIES = ['minimalist', 'contemporary', 'casual', 'streetwear', 'bohemian', 'formal']
+
+
+def write_weights(model_dir, references, seed=0):
+    """Write random unit-length reference embeddings for style-analyzer."""
+    import numpy as np
+
+    from ml_api.similarity import EMBEDDING_DIM
+    from ml_api.weights import save_arrays
+
+    rng = np.random.default_rng(seed)
+    embeddings = np.abs(rng.standard_normal((references, EMBEDDING_DIM), dtype=np.float32))
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    labels = rng.integers(len(CATEGORIES), size=references, dtype=np.int32)
+    save_arrays(
+        Path(model_dir) / 'style-analyzer',
+        metadata={'categories': CATEGORIES, 'k': 15},
+        embeddings=embeddings, labels=labels,
+    )
+    return embeddings.nbytes + labels.nbytes
+
+
+def write_image(settings):
+    """Save a small JPEG under MEDIA_ROOT and return its media URL."""
+    from PIL import Image
+
+    directory = Path(settings.MEDIA_ROOT) / 'benchmarks'
+    directory.mkdir(parents=True, exist_ok=True)
+    Image.new('RGB', (256, 256), (180, 90, 40)).save(directory / 'memory.jpg')
+    return f'{settings.MEDIA_URL}benchmarks/memory.jpg', directory
+
+
+def measure(workers, shared, model_dir, image_url, headers):
+    """Start gunicorn, warm all workers and return the summed memory."""
+    port = free_port()
+    process = start_server('wsgi', port, workers=workers, env={
+        'ML_BACKEND': 'knn',
+        'ML_MODEL_DIR': str(model_dir),
+        'ML_SHARED_WEIGHTS': '1' if shared else '0',
+        'ML_PRELOAD': '1',
+        'GUNICORN_PRELOAD': '0',
+    })
+    try:
+        # Distinct query strings bypass the result cache, so each request
+        # scans the reference matrix in whichever worker serves it
+        def one(i):
+            return request(
+                '127.0.0.1', port, 'POST', '/api/analyze-style',
+                {'imageUrl': f'{image_url}?n={i}'}, headers,
+            )[0]
+
+        with ThreadPoolExecutor(max_workers=workers * 2) as pool:
+            statuses = list(pool.map(one, range(workers * 8)))
+        time.sleep(0.5)
+
+        pids = [process.pid, *child_pids(process.pid)]
+        usage = [process_memory(pid) for pid in pids]
+    finally:
+        stop_server(process)
+
+    mib = 2 ** 20
+    return {
+        'workers': workers,
+        'shared_weights': shared,
+        'rss_sum_mib': round(sum(u['rss'] for u in usage) / mib, 1),
+        'pss_sum_mib': round(sum(u['pss'] for u in usage) / mib, 1),
+        'uss_sum_mib': round(sum(u['uss'] for u in usage) / mib, 1),
+        'errors': sum(1 for status in statuses if status != 200),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--references', type=int, default=200000,
+                        help='Rows in the synthetic reference matrix')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    args = parser.parse_args()
+
+    migrate()
+    setup_django()
+    from django.conf import settings
+
+    headers = bench_session()
+    model_dir = Path(tempfile.mkdtemp(prefix='ml-weights-'))
+    image_url, image_dir = write_image(settings)
+    try:
+        weights_bytes = write_weights(model_dir, args.references)
+        results = [
+            measure(workers, shared, model_dir, image_url, headers)
+            for shared in (False, True)
+            for workers in args.workers
+        ]
+    finally:
+        shutil.rmtree(model_dir, ignore_errors=True)
+        shutil.rmtree(image_dir, ignore_errors=True)
+
+    print(json.dumps({
+        'weights_mib': round(weights_bytes / 2 ** 20, 1),
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark color palette extraction across image sizes.
+
+Images are synthetic gradients with colored blocks. The 'jpeg' and 'png'
+timings include decoding from memory; 'decoded' starts from a decoded PIL
+image and measures downsampling plus clustering only.
+
+Usage:
+    python -m benchmarks.bench_palette --sizes 256,512,1024,2048 --runs 20
+"""
+
+import argparse
+import io
+import json
+import statistics
+import time
+
+import numpy as np
+from PIL import Image
+
+from ml_api.palette import extract_palette
+
+from .common import percentile
+
+
+def make_image(size, seed=0):
+    """Create a size x size RGB test image with a few dominant colors."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    pixels = np.stack([x * 255, y * 255, (1 - x) * 128 + 64], axis=-1)
+    for _ in range(6):
+        top, left = rng.integers(0, size // 2, size=2)
+        pixels[top:top + size // 3, left:left + size // 3] = rng.integers(0, 256, size=3)
+    pixels += rng.normal(0, 8, size=pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def encode(image, image_format):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=90)
+    return buffer.getvalue()
+
+
+def time_extraction(source, runs):
+    timings = []
+    for _ in range(runs):
+        image = io.BytesIO(source) if isinstance(source, bytes) else source.copy()
+        started = time.perf_counter()
+        extract_palette(image)
+        timings.append(time.perf_counter() - started)
+    return {
+        'median_ms': round(statistics.median(timings) * 1000, 2),
+        'p95_ms': round(percentile(timings, 95) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='256,512,1024,2048')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    report = {}
+    for size in (int(value) for value in args.sizes.split(',')):
+        image = make_image(size)
+        report[size] = {
+            image_format.lower(): time_extraction(encode(image, image_format), args.runs)
+            for image_format in ('JPEG', 'PNG')
+        }
+        report[size]['decoded'] = time_extraction(image, args.runs)
+        print(f"{size}x{size}: {json.dumps(report[size])}")
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
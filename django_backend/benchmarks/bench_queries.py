@@ -0,0 +1,167 @@
+"""
+Benchmark the FashionItem and StyleRecommendation access patterns on a large
+synthetic catalog, and print the query plan of each.
+
+- search-icontains-{common,rare}: the admin's default search (icontains on
+  every field) for two common words, or for one rare word such as a brand
+- search-fulltext-{common,rare}: the same searches through ml_api.search
+- category-newest: items of one style category, newest first
+- newest-page: the first keyset page of all items
+- recommendations: one item's recommendations, best match first
+
+A temporary SQLite database is used unless --database-url is given, which
+is flushed first.
+
+Usage:
+    python -m benchmarks.bench_queries --items 1000000 --queries 50
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from .common import migrate, percentile, setup_django
+
+WORDS = (
+    'linen cotton wool silk denim leather cashmere velvet summer winter '
+    'tailored oversized cropped pleated floral striped vintage minimal relaxed '
+    'dress blazer coat skirt trousers shirt sweater jacket boots scarf'
+).split()
+# Rare words, e.g. brand names, one per item
+SYLLABLES = 'ka lo mi ne ru sa ti vo be da fe gi ho ju ly pa'.split()
+BRANDS = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+CATEGORIES = ('casual', 'formal', 'streetwear', 'bohemian', 'minimalist', 'vintage', 'sporty')
+
+
+def populate(items, recommendations_per_item, batch_size=10000):
+    from django.core.management import call_command
+
+    from ml_api.models import FashionItem, StyleRecommendation
+
+    call_command('flush', '--noinput', verbosity=0)
+    rng = random.Random(0)
+    for start in range(0, items, batch_size):
+        FashionItem.objects.bulk_create(
+            FashionItem(
+                title=' '.join([rng.choice(BRANDS), *rng.sample(WORDS, 3)]),
+                description=' '.join(rng.choices(WORDS, k=12)),
+                image=f'benchmark/{i}.jpg',
+                style_category=rng.choice(CATEGORIES),
+            )
+            for i in range(start, min(start + batch_size, items))
+        )
+    ids = list(FashionItem.objects.order_by('id').values_list('id', flat=True))
+    sources = ids[:min(len(ids), 20000)]
+    for start in range(0, len(sources), 1000):
+        StyleRecommendation.objects.bulk_create(
+            StyleRecommendation(
+                source_item_id=source,
+                recommended_item_id=target,
+                similarity_score=rng.random(),
+                recommendation_reason='benchmark',
+            )
+            for source in sources[start:start + 1000]
+            for target in rng.sample(ids, recommendations_per_item)
+            if target != source
+        )
+    return sources
+
+
+def explain(queryset):
+    from django.db import connection
+
+    options = {'analyze': True} if connection.vendor == 'postgresql' else {}
+    return queryset.explain(**options)
+
+
+def measure(name, build, queries, count=False):
+    """
+    Time `queries` evaluations of the querysets returned by build(i), with a
+    COUNT first if count is set, as the admin does for its result count.
+    """
+    latencies = []
+    for i in range(queries):
+        queryset = build(i)
+        started = time.perf_counter()
+        if count:
+            queryset.count()
+        list(queryset[:100])
+        latencies.append(time.perf_counter() - started)
+    plan = explain(build(0))
+    print(f'--- {name}\n{plan}', flush=True)
+    return {
+        'query': name,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--items', type=int, default=200000)
+    parser.add_argument('--recommendations', type=int, default=10, help='per source item')
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--database-url', help='database to use instead of a temporary SQLite file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = (
+            args.database_url or f"sqlite:///{Path(directory) / 'bench.sqlite3'}"
+        )
+        migrate({'DATABASE_URL': os.environ['DATABASE_URL']})
+        setup_django()
+        from django.contrib import admin
+        from django.test import RequestFactory
+
+        from ml_api.models import FashionItem, StyleRecommendation
+        from ml_api.search import search_items
+
+        started = time.perf_counter()
+        sources = populate(args.items, args.recommendations)
+        print(f'Populated {args.items} items in {time.perf_counter() - started:.1f}s', flush=True)
+
+        rng = random.Random(1)
+        common = [' '.join(rng.sample(WORDS, 2)) for _ in range(args.queries)]
+        rare = [rng.choice(BRANDS) for _ in range(args.queries)]
+        model_admin = admin.site._registry[FashionItem]
+        request = RequestFactory().get('/admin/ml_api/fashionitem/')
+        items = FashionItem.objects.order_by('-created_at', '-id')
+
+        def icontains(terms):
+            def build(i):
+                return admin.ModelAdmin.get_search_results(model_admin, request, items, terms[i])[0]
+            return build
+
+        def fulltext(terms):
+            return lambda i: search_items(items, terms[i])
+
+        reports = [
+            measure(f'search-{kind}-{name}', build(terms), args.queries, count=True)
+            for kind, build in (('icontains', icontains), ('fulltext', fulltext))
+            for name, terms in (('common', common), ('rare', rare))
+        ]
+        reports += [
+            measure(
+                'category-newest',
+                lambda i: FashionItem.objects.filter(style_category=CATEGORIES[i % len(CATEGORIES)])
+                .order_by('-created_at'),
+                args.queries,
+            ),
+            measure('newest-page', lambda i: items, args.queries),
+            measure(
+                'recommendations',
+                lambda i: StyleRecommendation.objects.filter(source_item_id=rng.choice(sources))
+                .order_by('-similarity_score'),
+                args.queries,
+            ),
+        ]
+    print(json.dumps({'items': args.items, 'results': reports}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
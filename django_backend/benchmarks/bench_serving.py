@@ -0,0 +1,77 @@
+"""
+Compare WSGI and ASGI serving throughput for the ML endpoints.
+
+Starts gunicorn once per serving mode with a single worker and fires a burst
+of concurrent generate-ideas requests at it. Every request has a distinct
+prompt, so the result cache and request coalescing cannot serve it and the
+comparison measures how each mode handles concurrent model calls.
+
+Usage:
+    python -m benchmarks.bench_serving --requests 200 --concurrency 100
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import (
+    bench_session, free_port, migrate, request, setup_django, start_server,
+    stop_server, summarize,
+)
+
+
+def run_load(port, headers, path, build, total, concurrency):
+    """
+    Send `total` requests with `concurrency` clients and summarize them.
+
+    Args:
+        build (callable): Returns the body of request i
+    """
+    def one(i):
+        started = time.perf_counter()
+        status, _ = request('127.0.0.1', port, 'POST', path, build(i), headers)
+        return status, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    summary = summarize([latency for _, latency in results], elapsed)
+    summary['errors'] = sum(1 for status, _ in results if status != 200)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--modes', default='wsgi,asgi')
+    parser.add_argument('--path', default='/api/generate-ideas')
+    args = parser.parse_args()
+
+    setup_django()
+    migrate()
+    headers = bench_session()
+
+    run_id = time.time()
+    report = {}
+    for mode in args.modes.split(','):
+        port = free_port()
+        server = start_server(mode, port, workers=1)
+        try:
+            report[mode] = run_load(
+                port, headers, args.path,
+                lambda i: {'prompt': f'sustainable summer collection {run_id} {mode} {i}'},
+                args.requests, args.concurrency,
+            )
+        finally:
+            stop_server(server)
+        print(f"{mode}: {json.dumps(report[mode])}")
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark the similar-items read path on a synthetic catalog.
+
+Compares, through Django's test client:
+
+- join: /api/recommendations/?source_id=<id>, which joins StyleRecommendation
+  to FashionItem and serializes one nested item per row
+- packed-cold: /api/fashion-items/<id>/similar_items with the neighbour cache
+  invalidated before every request
+- packed-warm: the same for --hot items whose lists are cached
+
+A temporary SQLite database is used.
+
+Usage:
+    python -m benchmarks.bench_similar_items --items 20000 --top-k 10 --requests 500
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from .common import BENCH_USERNAME, migrate, percentile, setup_django
+
+
+def populate(items, top_k):
+    from ml_api.models import FashionItem
+    from ml_api.neighbours import invalidate_all, store_neighbours
+    from ml_api.similarity import upsert_recommendations
+
+    FashionItem.objects.bulk_create(
+        FashionItem(title=f'item {i}', description='benchmark item', image=f'benchmark/{i}.jpg')
+        for i in range(items)
+    )
+    ids = list(FashionItem.objects.values_list('id', flat=True))
+    rng = random.Random(0)
+    lists = {}
+    for source in ids:
+        neighbours = rng.sample(ids, top_k + 1)
+        neighbours = [item for item in neighbours if item != source][:top_k]
+        scores = sorted((rng.random() for _ in neighbours), reverse=True)
+        lists[source] = (neighbours, scores)
+    upsert_recommendations(
+        (source, item, score)
+        for source, (neighbours, scores) in lists.items()
+        for item, score in zip(neighbours, scores)
+    )
+    store_neighbours(lists, invalidate=False)
+    invalidate_all()
+    return ids
+
+
+def run(name, client, path, ids, requests, before=None):
+    """Request random ids from `ids` and summarize latency and query counts."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    rng = random.Random(1)
+    latencies, queries = [], []
+    for _ in range(requests):
+        item_id = rng.choice(ids)
+        if before:
+            before()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(path.format(item_id))
+            latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.status_code
+        queries.append(len(captured.captured_queries))
+    return {
+        'path': name,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        # Includes the session and user lookups of every request
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--hot', type=int, default=1000, help='items requested in the warm run')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = f"sqlite:///{Path(directory) / 'bench.sqlite3'}"
+        migrate({'DATABASE_URL': os.environ['DATABASE_URL']})
+        setup_django()
+        from django.contrib.auth import get_user_model
+        from django.test import Client
+
+        from ml_api.neighbours import invalidate_all
+
+        ids = populate(args.items, args.top_k)
+        user, _ = get_user_model().objects.get_or_create(username=BENCH_USERNAME)
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+
+        reports = [
+            run('join', client, f'/api/recommendations/?source_id={{}}&page_size={args.top_k}',
+                ids, args.requests),
+            run('packed-cold', client, '/api/fashion-items/{}/similar_items/',
+                ids, args.requests, before=invalidate_all),
+        ]
+        hot = random.Random(2).sample(ids, min(args.hot, len(ids)))
+        for item_id in hot:
+            client.get(f'/api/fashion-items/{item_id}/similar_items/')
+        reports.append(run('packed-warm', client, '/api/fashion-items/{}/similar_items/',
+                           hot, args.requests))
+    print(json.dumps({'items': args.items, 'top_k': args.top_k, 'results': reports}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
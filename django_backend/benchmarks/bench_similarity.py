@@ -0,0 +1,83 @@
+"""
+Benchmark the IVF similarity index on a synthetic catalog.
+
+Reports bulk-load and training time, query latency percentiles and recall@k
+against exact brute-force search.
+
+Usage:
+    python -m benchmarks.bench_similarity --items 100000 --queries 200
+"""
+
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from .common import percentile, setup_django
+
+
+def synthetic_embeddings(count, dim, clusters=256, seed=0):
+    """Clustered, non-negative, unit-length vectors shaped like color histograms."""
+    rng = np.random.default_rng(seed)
+    centers = rng.gamma(0.3, size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=count)
+    vectors = centers[labels] * rng.uniform(0.5, 1.5, size=(count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, default=8)
+    args = parser.parse_args()
+
+    setup_django()
+    from ml_api.similarity import EMBEDDING_DIM, SimilarityIndex
+
+    vectors = synthetic_embeddings(args.items, EMBEDDING_DIM)
+    with tempfile.TemporaryDirectory() as directory:
+        index = SimilarityIndex(directory, nprobe=args.nprobe, min_train_size=args.items + 1)
+
+        started = time.perf_counter()
+        for start in range(0, args.items, 10000):
+            index.add(list(range(start, min(start + 10000, args.items))), vectors[start:start + 10000])
+        load_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index.train()
+        train_s = time.perf_counter() - started
+
+        rng = np.random.default_rng(1)
+        queries = rng.choice(args.items, size=args.queries, replace=False)
+        latencies, recalls = [], []
+        for item_id in queries:
+            started = time.perf_counter()
+            approximate = index.similar_to(int(item_id), k=args.k)
+            latencies.append(time.perf_counter() - started)
+
+            scores = vectors @ vectors[item_id]
+            scores[item_id] = -np.inf
+            exact = set(np.argpartition(-scores, args.k)[:args.k].tolist())
+            recalls.append(len(exact & {found for found, _ in approximate}) / args.k)
+
+        report = {
+            'items': args.items,
+            'nlist': len(index.centroids),
+            'nprobe': args.nprobe,
+            'load_s': round(load_s, 3),
+            'train_s': round(train_s, 3),
+            'query_p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'query_p95_ms': round(percentile(latencies, 95) * 1000, 3),
+            'query_p99_ms': round(percentile(latencies, 99) * 1000, 3),
+            f'recall_at_{args.k}': round(float(np.mean(recalls)), 4),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
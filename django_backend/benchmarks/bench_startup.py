@@ -0,0 +1,92 @@
+"""
+Measure startup cost and first-request latency of the ML API.
+
+Times `manage.py check` (the import path every management command and worker
+pays), then starts gunicorn with lazy model loading, per-worker preloading
+(ML_PRELOAD=1) and master preloading (GUNICORN_PRELOAD=1) and reports the time
+until the server answers and the latency of the first inference request.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 5 --workers 2
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from .common import (
+    BASE_DIR, bench_session, free_port, migrate, request, setup_django,
+    start_server, stop_server,
+)
+
+MODES = {
+    'lazy': {'ML_PRELOAD': '0', 'GUNICORN_PRELOAD': '0'},
+    'preload-worker': {'ML_PRELOAD': '1', 'GUNICORN_PRELOAD': '0'},
+    'preload-master': {'GUNICORN_PRELOAD': '1'},
+}
+
+
+def time_check(runs):
+    """Return the wall-clock times (seconds) of `manage.py check`."""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, 'manage.py', 'check'],
+            cwd=BASE_DIR, check=True, capture_output=True,
+        )
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def time_server(mode, env, workers, headers):
+    """Start gunicorn, then time readiness and the first inference request."""
+    port = free_port()
+    started = time.perf_counter()
+    process = start_server('wsgi', port, workers=workers, env=env)
+    ready = time.perf_counter() - started
+    try:
+        started = time.perf_counter()
+        status, _ = request(
+            '127.0.0.1', port, 'POST', '/api/generate-ideas',
+            {'prompt': 'startup benchmark'}, headers,
+        )
+        first = time.perf_counter() - started
+    finally:
+        stop_server(process)
+    return {
+        'mode': mode,
+        'ready_s': round(ready, 3),
+        'first_request_ms': round(first * 1000, 2),
+        'status': status,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    migrate()
+    setup_django()
+    headers = bench_session()
+
+    check = time_check(args.runs)
+    results = {
+        'check_s': {
+            'min': round(min(check), 3),
+            'avg': round(sum(check) / len(check), 3),
+        },
+        'servers': [
+            time_server(mode, env, args.workers, headers)
+            for mode, env in MODES.items()
+        ],
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Compare time to first byte and total latency of generate-ideas responses.
+
+Starts one ASGI worker and sends concurrent requests with distinct prompts
+(so the result cache cannot replay them) in three modes:
+
+- buffered: the JSON response, sent once every idea is generated
+- ndjson: ?stream=1, one NDJSON line per idea as it is generated
+- sse: Accept: text/event-stream, one Server-Sent Event per idea
+
+The stub backend spreads its simulated latency over the ideas it streams, as
+an incremental text generator would.
+
+Usage:
+    python -m benchmarks.bench_streaming --requests 64 --concurrency 8
+"""
+
+import argparse
+import http.client
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import (
+    bench_session, free_port, migrate, percentile, setup_django, start_server,
+    stop_server,
+)
+
+MODES = {
+    'buffered': ('/api/generate-ideas', {}),
+    'ndjson': ('/api/generate-ideas?stream=1', {}),
+    'sse': ('/api/generate-ideas', {'Accept': 'text/event-stream'}),
+}
+
+
+def post(port, path, body, headers):
+    """Send one request and return (status, seconds to first body byte, seconds to end)."""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    started = time.perf_counter()
+    try:
+        connection.request(
+            'POST', path, body=json.dumps(body).encode(),
+            headers={'Content-Type': 'application/json', **headers},
+        )
+        response = connection.getresponse()
+        response.read1()
+        first_byte = time.perf_counter() - started
+        response.read()
+        return response.status, first_byte, time.perf_counter() - started
+    finally:
+        connection.close()
+
+
+def run(port, mode, headers, requests, concurrency, run_id):
+    path, extra_headers = MODES[mode]
+
+    def one(i):
+        return post(port, path, {'prompt': f'streaming {run_id} {mode} {i}'},
+                    {**headers, **extra_headers})
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    first_bytes = [first for status, first, _ in results if status == 200]
+    totals = [total for status, _, total in results if status == 200]
+    return {
+        'mode': mode,
+        'ok': len(totals),
+        'errors': len(results) - len(totals),
+        'ttfb_p50_ms': round(percentile(first_bytes, 50) * 1000, 1),
+        'ttfb_p99_ms': round(percentile(first_bytes, 99) * 1000, 1),
+        'total_p50_ms': round(percentile(totals, 50) * 1000, 1),
+        'total_p99_ms': round(percentile(totals, 99) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency-scale', type=float, default=1.0,
+                        help='scale of the stub backend simulated latency')
+    args = parser.parse_args()
+
+    setup_django()
+    migrate()
+    session = bench_session()
+
+    port = free_port()
+    server = start_server('asgi', port, workers=1, env={
+        'ML_STUB_LATENCY_SCALE': str(args.latency_scale),
+    })
+    try:
+        run_id = time.time()
+        # Load the model before measuring
+        post(port, MODES['buffered'][0], {'prompt': f'streaming warm-up {run_id}'}, session)
+        reports = []
+        for mode in MODES:
+            reports.append(run(port, mode, session, args.requests, args.concurrency, run_id))
+            print(json.dumps(reports[-1]), flush=True)
+    finally:
+        stop_server(server)
+    print(json.dumps({'requests': args.requests, 'concurrency': args.concurrency,
+                      'results': reports}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
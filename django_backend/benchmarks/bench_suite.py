@@ -0,0 +1,269 @@
+"""
+Throughput, latency and memory benchmark suite for the ml_api endpoints.
+
+Every endpoint is driven through two transports: Django's test client inside
+this process ('client', measuring the Django stack without a server) and a
+real gunicorn process ('server', over HTTP). Each cell of the matrix
+
+    transport x endpoint x cache (cold, warm) x concurrent clients
+
+reports req/s, latency percentiles, errors and peak RSS. A cold cell sends a
+distinct input with every request, so each one misses the result cache; a warm
+cell cycles through inputs sent once beforehand. Models are loaded before the
+first cell, so cold figures do not include loading (see bench_startup).
+
+The stub backend's simulated latency is scaled by --latency-scale to keep a
+run short; compare results only between runs with the same arguments.
+Results are written as JSON for benchmarks.compare:
+
+    python -m benchmarks.bench_suite --output before.json
+    python -m benchmarks.bench_suite --output after.json
+    python -m benchmarks.compare before.json after.json
+
+Usage:
+    python -m benchmarks.bench_suite --concurrency 1 4 16 64 --requests 128
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from .common import (
+    BASE_DIR, bench_session, child_pids, free_port, git_revision, migrate,
+    peak_rss, request, setup_django, start_server, stop_server, summarize,
+)
+
+
+def prompt(tag):
+    return f'benchmark {tag} capsule collection'
+
+
+def image_url(tag):
+    return f'/media/benchmark/{tag}.jpg'
+
+
+# name -> (method, path, body builder taking a list of input tags or None,
+# inputs per request). Batch endpoints take --batch-size inputs.
+ENDPOINTS = {
+    'generate-ideas': (
+        'POST', '/api/generate-ideas', lambda tags: {'prompt': prompt(tags[0])}, 1,
+    ),
+    'generate-ideas-batch': (
+        'POST', '/api/generate-ideas/batch',
+        lambda tags: {'prompts': [prompt(tag) for tag in tags]}, 'batch',
+    ),
+    'generate-image': (
+        'POST', '/api/generate-image', lambda tags: {'prompt': prompt(tags[0])}, 1,
+    ),
+    'analyze-style': (
+        'POST', '/api/analyze-style', lambda tags: {'imageUrl': image_url(tags[0])}, 1,
+    ),
+    'analyze-style-batch': (
+        'POST', '/api/analyze-style/batch',
+        lambda tags: {'imageUrls': [image_url(tag) for tag in tags]}, 'batch',
+    ),
+    'model-status': ('GET', '/api/model-status', None, 0),
+    'fashion-items': ('GET', '/api/fashion-items/', None, 0),
+}
+
+# Distinct inputs a warm cell cycles through
+WARM_INPUTS = 16
+
+
+class ClientTransport:
+    """Django test client in this process, one client per thread."""
+
+    name = 'client'
+
+    def __init__(self):
+        from django.contrib.auth import get_user_model
+
+        from .common import BENCH_USERNAME
+
+        self.user, _ = get_user_model().objects.get_or_create(username=BENCH_USERNAME)
+        self._local = threading.local()
+
+    def send(self, method, path, body):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            from django.test import Client
+
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(self.user)
+            self._local.client = client
+        if method == 'GET':
+            response = client.get(path)
+        else:
+            response = client.post(path, body, content_type='application/json')
+        return response.status_code, response.content
+
+    def pids(self):
+        return [os.getpid()]
+
+    def close(self):
+        pass
+
+
+class ServerTransport:
+    """A gunicorn server process driven over HTTP."""
+
+    def __init__(self, mode, workers, env):
+        self.name = f'server-{mode}'
+        self.port = free_port()
+        self.process = start_server(mode, self.port, workers=workers, env=env)
+        self.headers = bench_session()
+
+    def send(self, method, path, body):
+        return request('127.0.0.1', self.port, method, path, body, self.headers)
+
+    def pids(self):
+        return [self.process.pid, *child_pids(self.process.pid)]
+
+    def close(self):
+        stop_server(self.process)
+
+
+def count_errors(status, content, batched):
+    """Count a failed request, or the failed items of a batch response."""
+    if status >= 400:
+        return 1
+    if batched:
+        return json.loads(content).get('errors', 0)
+    return 0
+
+
+def run_cell(transport, endpoint, cache, concurrency, total, batch_size):
+    """Run one cell of the matrix and summarize it."""
+    method, path, build, inputs = ENDPOINTS[endpoint]
+    size = batch_size if inputs == 'batch' else inputs
+    batched = inputs == 'batch'
+
+    if build is None:
+        bodies = [None] * total
+    elif cache == 'cold':
+        run_id = uuid.uuid4().hex[:8]
+        bodies = [
+            build([f'cold-{run_id}-{i}-{j}' for j in range(size)]) for i in range(total)
+        ]
+    else:
+        warm = [build([f'warm-{k}-{j}' for j in range(size)]) for k in range(WARM_INPUTS)]
+        for body in warm:
+            transport.send(method, path, body)
+        bodies = [warm[i % WARM_INPUTS] for i in range(total)]
+
+    def one(body):
+        started = time.perf_counter()
+        status, content = transport.send(method, path, body)
+        return time.perf_counter() - started, count_errors(status, content, batched)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, bodies))
+    elapsed = time.perf_counter() - started
+
+    summary = summarize([latency for latency, _ in results], elapsed)
+    summary.update({
+        'transport': transport.name,
+        'endpoint': endpoint,
+        'cache': cache,
+        'concurrency': concurrency,
+        'batch_size': size,
+        'errors': sum(errors for _, errors in results),
+        'items_per_s': round(summary['req_per_s'] * max(size, 1), 2),
+        # High-water mark of all transport processes since they started
+        'peak_rss_mb': round(sum(peak_rss(pid) for pid in transport.pids()) / 2**20, 1),
+    })
+    return summary
+
+
+def run_transport(transport, args):
+    """Run every cell for one transport."""
+    # Load the models so the first cold cell does not pay for it
+    for endpoint in args.endpoints:
+        method, path, build, inputs = ENDPOINTS[endpoint]
+        size = args.batch_size if inputs == 'batch' else inputs
+        transport.send(method, path, build(['preload'] * size) if build else None)
+
+    results = []
+    for endpoint in args.endpoints:
+        caches = args.caches if ENDPOINTS[endpoint][2] is not None else ['n/a']
+        for cache in caches:
+            for concurrency in args.concurrency:
+                total = max(args.requests, concurrency)
+                cell = run_cell(transport, endpoint, cache, concurrency, total, args.batch_size)
+                print(
+                    f"{cell['transport']:<12} {endpoint:<21} {cache:<4} c={concurrency:<3} "
+                    f"{cell['req_per_s']:>9.1f} req/s  p50 {cell['p50_ms']:>8.1f} ms  "
+                    f"p99 {cell['p99_ms']:>8.1f} ms  errors {cell['errors']:<4} "
+                    f"peak {cell['peak_rss_mb']:.0f} MiB",
+                    flush=True,
+                )
+                results.append(cell)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--transports', nargs='+', default=['client', 'server'],
+                        choices=['client', 'server'])
+    parser.add_argument('--server-mode', default='asgi', choices=['asgi', 'wsgi'])
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--endpoints', nargs='+', default=list(ENDPOINTS), choices=list(ENDPOINTS))
+    parser.add_argument('--caches', nargs='+', default=['cold', 'warm'], choices=['cold', 'warm'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--requests', type=int, default=128,
+                        help='requests per cell (at least one per client)')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--latency-scale', type=float, default=0.05,
+                        help='factor applied to the stub backend latency')
+    parser.add_argument('--output', help='JSON results path (default: benchmarks/results/<commit>.json)')
+    args = parser.parse_args()
+
+    # Read by the settings of this process and inherited by the server
+    os.environ['ML_STUB_LATENCY_SCALE'] = str(args.latency_scale)
+    setup_django()
+    migrate()
+
+    revision = git_revision()
+    report = {
+        'meta': {
+            **revision,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': vars(args),
+        },
+        'results': [],
+    }
+    for name in args.transports:
+        if name == 'client':
+            transport = ClientTransport()
+        else:
+            transport = ServerTransport(args.server_mode, args.workers, {
+                'ML_STUB_LATENCY_SCALE': str(args.latency_scale),
+            })
+        try:
+            report['results'] += run_transport(transport, args)
+        finally:
+            transport.close()
+
+    output = args.output
+    if output is None:
+        suffix = '-dirty' if revision['dirty'] else ''
+        output = BASE_DIR / 'benchmarks' / 'results' / f"{revision['commit'] or 'local'}{suffix}.json"
+        output.parent.mkdir(exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Wrote {len(report["results"])} results to {output}')
+
+
+if __name__ == '__main__':
+    main()
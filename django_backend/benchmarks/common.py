@@ -0,0 +1,209 @@
+"""
+Shared helpers for the ml_api benchmarks.
+Benchmarks are run from the django_backend directory, e.g.
+``python -m benchmarks.bench_serving``.
+"""
+
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+BENCH_USERNAME = 'bench'
+
+
+def setup_django():
+    """Configure Django for in-process use by a benchmark."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fashion_ml.settings')
+    sys.path.insert(0, str(BASE_DIR))
+    import django
+    django.setup()
+
+
+def percentile(values, q):
+    """Return the q-th percentile (0-100) of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed):
+    """Summarize request latencies (seconds) measured over a wall-clock span."""
+    return {
+        'requests': len(latencies),
+        'elapsed_s': round(elapsed, 3),
+        'req_per_s': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def migrate(env=None):
+    """
+    Apply migrations to the configured database.
+
+    Args:
+        env (dict, optional): Extra environment variables, e.g. DATABASE_URL
+            to migrate another database
+    """
+    subprocess.run(
+        [sys.executable, 'manage.py', 'migrate', '--noinput', '-v', '0'],
+        cwd=BASE_DIR, check=True, env=dict(os.environ, **(env or {})),
+    )
+
+
+def bench_session():
+    """
+    Create the benchmark user and an authenticated session.
+
+    Session auth is used instead of basic auth so that password hashing does
+    not dominate the measured request cost.
+
+    Returns:
+        dict: Headers authenticating a request as the benchmark user
+    """
+    from django.contrib.auth import (
+        BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model,
+    )
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.utils.crypto import get_random_string
+
+    user, _ = get_user_model().objects.get_or_create(username=BENCH_USERNAME)
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    csrf = get_random_string(32)
+    return {
+        'Cookie': f'sessionid={session.session_key}; csrftoken={csrf}',
+        'X-CSRFToken': csrf,
+    }
+
+
+def free_port():
+    """Return a free local TCP port."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, port, workers=1, env=None, extra_args=()):
+    """
+    Start gunicorn in the given serving mode and wait until it accepts requests.
+
+    Args:
+        mode (str): 'wsgi' or 'asgi'
+        port (int): Port to bind on 127.0.0.1
+        workers (int): Number of worker processes
+        env (dict, optional): Extra environment variables
+
+    Returns:
+        subprocess.Popen: The server process
+    """
+    process_env = dict(os.environ, SERVER_MODE=mode, **(env or {}))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+         '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+         '--log-level', 'warning', *extra_args],
+        cwd=BASE_DIR, env=process_env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            status, _ = request('127.0.0.1', port, 'GET', '/api/health', timeout=1)
+            if status:
+                return process
+        except OSError:
+            time.sleep(0.1)
+    stop_server(process)
+    raise RuntimeError(f'{mode} server did not start on port {port}')
+
+
+def stop_server(process):
+    """Terminate a server started by start_server."""
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def request(host, port, method, path, body=None, headers=None, timeout=120):
+    """
+    Send one HTTP request and return (status, body bytes).
+    """
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    payload = json.dumps(body).encode() if body is not None else None
+    request_headers = {'Content-Type': 'application/json', **(headers or {})}
+    try:
+        connection.request(method, path, body=payload, headers=request_headers)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def process_memory(pid):
+    """
+    Memory of one process from /proc/<pid>/smaps_rollup (Linux only).
+
+    Returns:
+        dict: 'rss', 'pss' and 'uss' in bytes. PSS splits shared pages between
+            the processes mapping them, so it sums correctly across workers.
+    """
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'uss': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def child_pids(pid):
+    """Return the pids of the direct children of a process (Linux only)."""
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(child) for child in f.read().split()]
+
+
+def peak_rss(pid):
+    """Return the peak resident set size (VmHWM) of a process in bytes (Linux only)."""
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def git_revision():
+    """
+    Describe the checked-out commit.
+
+    Returns:
+        dict: 'commit' (short hash or None outside a git checkout) and 'dirty'
+    """
+    def git(*args):
+        result = subprocess.run(
+            ['git', *args], cwd=BASE_DIR, capture_output=True, text=True,
+        )
+        return result.stdout.strip() if result.returncode == 0 else None
+
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+    }
@@ -0,0 +1,110 @@
+"""
+Compare two bench_suite result files and flag regressions.
+
+Cells are matched on transport, endpoint, cache and concurrency. A cell
+regresses when its throughput drops, or its p95/p99 latency or peak RSS grows,
+by more than --threshold percent. Exits with status 1 if any cell regressed,
+so it can gate a CI job.
+
+Usage:
+    python -m benchmarks.compare before.json after.json --threshold 10
+"""
+
+import argparse
+import json
+import sys
+
+# metric -> True if higher is better
+METRICS = {
+    'req_per_s': True,
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'peak_rss_mb': False,
+}
+
+# Metrics that count as regressions; p50 is reported but too noisy to gate on
+GATED = ('req_per_s', 'p95_ms', 'p99_ms', 'peak_rss_mb')
+
+
+def cell_key(cell):
+    return (cell['transport'], cell['endpoint'], cell['cache'], cell['concurrency'])
+
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return report['meta'], {cell_key(cell): cell for cell in report['results']}
+
+
+def run_args(meta):
+    # Arguments that affect the figures
+    return {name: value for name, value in meta.get('args', {}).items() if name != 'output'}
+
+
+def change(before, after):
+    """Relative change in percent, or None when undefined."""
+    if not before:
+        return None
+    return (after - before) / before * 100
+
+
+def compare(before, after, threshold):
+    """
+    Compare matched cells.
+
+    Returns:
+        tuple: (rows, regressions) where each row is (key, metric, before,
+            after, change %, regressed)
+    """
+    rows = []
+    regressions = 0
+    for key in sorted(before.keys() & after.keys(), key=str):
+        for metric, higher_is_better in METRICS.items():
+            old, new = before[key].get(metric), after[key].get(metric)
+            if old is None or new is None:
+                continue
+            delta = change(old, new)
+            worse = delta is not None and (-delta if higher_is_better else delta) > threshold
+            regressed = worse and metric in GATED
+            regressions += regressed
+            rows.append((key, metric, old, new, delta, regressed))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percent change counted as a regression')
+    parser.add_argument('--all', action='store_true', help='print every metric, not only regressions')
+    args = parser.parse_args()
+
+    before_meta, before = load(args.before)
+    after_meta, after = load(args.after)
+    print(f"before: {before_meta.get('commit')}  ({before_meta.get('created_at')})")
+    print(f"after:  {after_meta.get('commit')}  ({after_meta.get('created_at')})")
+    if run_args(before_meta) != run_args(after_meta):
+        print('warning: the runs used different arguments')
+    for label, keys in (('only before', before.keys() - after.keys()),
+                        ('only after', after.keys() - before.keys())):
+        if keys:
+            print(f'{len(keys)} cells {label}, skipped')
+
+    rows, regressions = compare(before, after, args.threshold)
+    for (transport, endpoint, cache, concurrency), metric, old, new, delta, regressed in rows:
+        if not (regressed or args.all):
+            continue
+        delta_text = f'{delta:+.1f}%' if delta is not None else 'n/a'
+        flag = 'REGRESSION' if regressed else ''
+        print(
+            f'{transport:<12} {endpoint:<21} {cache:<4} c={concurrency:<3} {metric:<12} '
+            f'{old:>10.1f} -> {new:>10.1f}  {delta_text:>8}  {flag}'
+        )
+    print(f'{regressions} regressions beyond {args.threshold:g}% in {len(before.keys() & after.keys())} cells')
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
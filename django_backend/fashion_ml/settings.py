@@ -1,6 +1,10 @@
 import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
+from .database import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -21,11 +25,14 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'adrf',
     'corsheaders',
     'ml_api',
 ]
 
 MIDDLEWARE = [
+    'ml_api.middleware.MetricsMiddleware',
+    'ml_api.middleware.DeadlineMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -55,13 +62,28 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'fashion_ml.wsgi.application'
+ASGI_APPLICATION = 'fashion_ml.asgi.application'
+
+# Serving mode: 'asgi' (uvicorn workers) or 'wsgi' (sync workers)
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
 
-# Database
+# Database, selected by DATABASE_URL (see fashion_ml/database.py), e.g.
+# postgres://user:password@db:5432/fashion_ml. Defaults to db.sqlite3.
+# Connections are kept open for DB_CONN_MAX_AGE seconds and health-checked
+# before reuse. Under ASGI each request may run its queries on a different
+# thread, so persistent connections are off by default there. Connections
+# are pooled by PgBouncer in transaction mode: point DATABASE_URL at it and
+# set DB_PGBOUNCER=1.
+# SQLite runs in WAL mode with synchronous=NORMAL, mmap and immediate write
+# transactions, so workers on one node can read while another writes; set
+# SQLITE_TUNED=0 for SQLite's defaults.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(
+        os.environ.get('DATABASE_URL', f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
+        conn_max_age=int(os.environ.get('DB_CONN_MAX_AGE', 0 if SERVER_MODE == 'asgi' else 60)),
+        pgbouncer=os.environ.get('DB_PGBOUNCER', '').lower() in ('1', 'true'),
+        sqlite_tuned=os.environ.get('SQLITE_TUNED', '1').lower() in ('1', 'true'),
+    )
 }
 
 # Password validation
@@ -103,6 +125,9 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",  # Vite default dev server
     "http://127.0.0.1:5173",
 ]
+# Let the frontend send request timeouts and read backoff hints
+CORS_ALLOW_HEADERS = (*default_headers, 'x-request-timeout')
+CORS_EXPOSE_HEADERS = ['Retry-After']
 
 # REST Framework settings
 REST_FRAMEWORK = {
@@ -113,4 +138,166 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
-}
\ No newline at end of file
+}
+
+# Route the ML endpoints to the async views when served over ASGI
+ML_API_ASYNC_VIEWS = SERVER_MODE == 'asgi'
+
+# Load model weights when the app starts instead of on first use
+ML_PRELOAD = os.environ.get('ML_PRELOAD', '').lower() in ('1', 'true')
+
+# ML inference settings
+ML_INFERENCE = {
+    # Default backend for every model: 'stub', 'sklearn', 'knn' or 'tensorflow'
+    'BACKEND': os.environ.get('ML_BACKEND', 'stub'),
+    # Per-model backend overrides, e.g. {'fashion-gen': 'sklearn'}
+    'BACKENDS': {},
+    'MODEL_DIR': os.environ.get('ML_MODEL_DIR', os.path.join(BASE_DIR, 'ml_models')),
+    # Memory-map weight files read-only so all workers share one copy
+    'SHARED_WEIGHTS': os.environ.get('ML_SHARED_WEIGHTS', '1').lower() in ('1', 'true'),
+    # Simulated latency in seconds for the stub backend, scaled by
+    # ML_STUB_LATENCY_SCALE (0 disables it, e.g. for benchmarks)
+    'LATENCY': {
+        model: seconds * float(os.environ.get('ML_STUB_LATENCY_SCALE', 1))
+        for model, seconds in {
+            'fashion-gen': 1.0,
+            'image-gen': 2.0,
+            'style-analyzer': 1.5,
+        }.items()
+    },
+    # Micro-batching of concurrent requests per model; per-model overrides
+    # go in 'MODELS', e.g. {'image-gen': {'MAX_BATCH_SIZE': 4}}
+    'BATCHING': {
+        'ENABLED': True,
+        'MAX_BATCH_SIZE': 16,
+        'MAX_WAIT_MS': 5,
+        'MODELS': {},
+    },
+    # Admission control per model: at most MAX_CONCURRENCY calls run at once
+    # and MAX_QUEUE wait for a slot. Further calls get 429, and calls that
+    # cannot finish within the client's X-Request-Timeout (capped at
+    # MAX_TIMEOUT seconds) get 503. Per-model overrides go in 'MODELS', e.g.
+    # {'image-gen': {'MAX_CONCURRENCY': 2, 'MAX_QUEUE': 8}}
+    'ADMISSION': {
+        'ENABLED': os.environ.get('ML_ADMISSION', '1').lower() in ('1', 'true'),
+        'MAX_CONCURRENCY': int(os.environ.get('ML_MAX_CONCURRENCY', 16)),
+        'MAX_QUEUE': int(os.environ.get('ML_MAX_QUEUE', 64)),
+        'MAX_TIMEOUT': 120,
+        'MODELS': {},
+    },
+    # Concurrent identical calls (same model, version and normalized input)
+    # share one computation. LOCK_ALIAS names an entry in CACHES with an
+    # atomic add() (e.g. Redis) used as a lock store to also coalesce across
+    # processes; the result is handed over through the shared result cache,
+    # so it requires RESULT_CACHE['ALIAS'].
+    'COALESCING': {
+        'ENABLED': True,
+        'LOCK_ALIAS': os.environ.get('ML_COALESCE_LOCK_ALIAS') or None,
+        'LOCK_TIMEOUT': 60,
+        'POLL_INTERVAL_MS': 50,
+    },
+    # Result cache keyed on model, model version and normalized input. ALIAS
+    # names an entry in CACHES to share results between processes.
+    'RESULT_CACHE': {
+        'ENABLED': True,
+        'TTL': 300,
+        'MAX_BYTES': 16 * 1024 * 1024,
+        'ALIAS': os.environ.get('ML_RESULT_CACHE_ALIAS') or None,
+    },
+}
+
+# Bearer token required to scrape /api/metrics; empty leaves it public
+ML_METRICS_TOKEN = os.environ.get('ML_METRICS_TOKEN', '')
+
+# Maximum number of inputs accepted by the batch endpoints
+ML_BATCH_MAX_ITEMS = int(os.environ.get('ML_BATCH_MAX_ITEMS', 64))
+
+# Background jobs for long-running ML requests (e.g. image generation)
+ML_JOBS = {
+    # 'thread' or 'process'
+    'EXECUTOR': os.environ.get('ML_JOB_EXECUTOR', 'thread'),
+    'WORKERS': int(os.environ.get('ML_JOB_WORKERS', 2)),
+    # Jobs queued per process before submissions are refused
+    'MAX_PENDING': 100,
+    # Seconds between heartbeats of the running jobs of a worker
+    'HEARTBEAT_INTERVAL': 10,
+    # Seconds without a heartbeat after which a running job is considered
+    # abandoned by a dead worker and requeued
+    'STALE_AFTER': 60,
+}
+
+# Processing of uploaded FashionItem images
+ML_INGESTION = {
+    # Longest side of the thumbnail stored next to each image
+    'THUMBNAIL_SIDE': 256,
+    # Side of the square float32 model-input tensor stored next to each image
+    'TENSOR_SIDE': 224,
+    # Pixel limit for formats that must be fully decoded (all but JPEG)
+    'MAX_PIXELS': 50_000_000,
+}
+
+# Directory for ML artifacts such as the embedding store
+ML_DATA_DIR = os.environ.get('ML_DATA_DIR', os.path.join(BASE_DIR, 'ml_data'))
+
+# Fetching of remote image URLs passed to analyze-style
+ML_FETCHER = {
+    'CACHE_DIR': os.path.join(ML_DATA_DIR, 'fetched'),
+    'CACHE_MAX_BYTES': 1024 * 1024 * 1024,
+    # Pooled connections across all hosts, and concurrent requests per host
+    'MAX_CONNECTIONS': 100,
+    'MAX_PER_HOST': 8,
+    # Seconds
+    'TIMEOUT': 10.0,
+    'CONNECT_TIMEOUT': 3.0,
+    'MAX_BYTES': 20 * 1024 * 1024,
+    # Seconds a fetched image is reused before it is revalidated, unless the
+    # response sets Cache-Control max-age
+    'FRESH_FOR': 300,
+    # Hosts images may be fetched from; None allows any host
+    'ALLOWED_HOSTS': None,
+    # Hosts resolving to private, loopback, link-local or reserved addresses
+    # (e.g. 169.254.169.254) are refused unless this is set
+    'ALLOW_PRIVATE_ADDRESSES': os.environ.get('ML_FETCHER_ALLOW_PRIVATE', '').lower() in ('1', 'true'),
+}
+
+# Preprocessed model-input tensors keyed by image content hash
+ML_TENSOR_CACHE = {
+    'DIR': os.path.join(ML_DATA_DIR, 'tensors'),
+    # Least recently used tensors are evicted above this size
+    'MAX_BYTES': int(os.environ.get('ML_TENSOR_CACHE_MAX_BYTES', 512 * 1024 * 1024)),
+}
+
+# Per-process cache of packed neighbour lists (about 200 bytes each with the
+# default TOP_K), sized for the hot part of a large catalog
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'neighbours': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ml-neighbours',
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    },
+}
+
+# Similar-item index over FashionItem embeddings
+ML_SIMILARITY = {
+    'DATA_DIR': os.path.join(ML_DATA_DIR, 'similarity'),
+    # Number of IVF lists; None picks sqrt(number of items)
+    'NLIST': None,
+    # Lists scanned per query; higher is more accurate and slower
+    'NPROBE': 8,
+    # Below this many items the index is searched exhaustively
+    'MIN_TRAIN_SIZE': 1000,
+    # Recommendations stored per item
+    'TOP_K': 10,
+    # Read-through cache of the packed neighbour lists served by
+    # /fashion-items/<id>/similar_items. A rebuild writes a new generation to
+    # GENERATION_FILE, which every worker checks at most once a second, so
+    # the per-process default cache is invalidated everywhere too.
+    'NEIGHBOUR_CACHE': {
+        'ALIAS': os.environ.get('ML_NEIGHBOUR_CACHE_ALIAS', 'neighbours'),
+        'TTL': 300,
+        'GENERATION_FILE': os.path.join(ML_DATA_DIR, 'similarity', 'neighbours.generation'),
+    },
+}
@@ -0,0 +1,31 @@
+"""
+SQLite backend tuned for several processes writing to one database file.
+Extra OPTIONS:
+    pragmas (dict): PRAGMAs applied to every new connection
+    transaction_mode (str): 'DEFERRED' (SQLite's default), 'IMMEDIATE' or
+        'EXCLUSIVE', used to begin transactions. With IMMEDIATE a transaction
+        takes the write lock up front, waiting up to the busy timeout for it,
+        instead of failing with "database is locked" when a transaction that
+        has already read tries to write while another process writes.
+Django 5.1 supports transaction_mode natively.
+"""
+
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
@@ -0,0 +1,75 @@
+"""
+Gunicorn configuration for the Fashion ML Backend.
+SERVER_MODE selects between the ASGI entry point on uvicorn workers and the
+WSGI entry point on sync workers.
+"""
+
+import gc
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+
+# GUNICORN_PRELOAD=1 imports the app, and loads the ML models, once in the
+# master. Workers are forked afterwards and share the weights copy-on-write.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0') == '1'
+if preload_app:
+    os.environ.setdefault('ML_PRELOAD', '1')
+
+# Workers write Prometheus samples here and /api/metrics aggregates them. The
+# config is loaded by the master, so the pid keeps concurrent servers apart.
+# It is emptied here rather than in a hook because preload_app imports the app,
+# which opens the sample files, before any server hook runs.
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), f'fashion-ml-metrics-{os.getpid()}'),
+)
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir, exist_ok=True)
+
+# Imported after PROMETHEUS_MULTIPROC_DIR is set, which the client reads at
+# import time, and not in child_exit, which runs inside a signal handler
+from prometheus_client import multiprocess  # noqa: E402
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'fashion_ml.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'fashion_ml.wsgi:application'
+    worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+    threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the GC's reach, so collections in
+    # the workers do not write to (and un-share) the preloaded pages
+    if preload_app:
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    from ml_api.fetcher import get_fetcher
+    from ml_api.jobs import job_runner
+    from ml_api.tensor_cache import get_tensor_cache
+
+    # Size the disk caches now, off the request path, rather than in the
+    # first request or model-status call that needs them
+    get_tensor_cache().scan_in_background()
+    get_fetcher().cache.scan_in_background()
+    # Requeue jobs of dead workers and start heartbeating this worker's jobs
+    job_runner.start()
+
+
+def child_exit(server, worker):
+    # Drop the live gauges (in-flight, queue depth) of a dead worker
+    multiprocess.mark_process_dead(worker.pid, metrics_dir)
+
+
+def on_exit(server):
+    shutil.rmtree(metrics_dir, ignore_errors=True)
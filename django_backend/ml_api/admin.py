@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import FashionItem, StyleRecommendation
+from .models import FashionItem, InferenceJob, StyleRecommendation
+from .search import search_items
 
 @admin.register(FashionItem)
 class FashionItemAdmin(admin.ModelAdmin):
@@ -7,8 +8,22 @@ class FashionItemAdmin(admin.ModelAdmin):
     search_fields = ('title', 'description', 'style_category')
     list_filter = ('style_category', 'created_at')
 
+    def get_search_results(self, request, queryset, search_term):
+        # Full-text search where the database has it; icontains otherwise
+        results = search_items(queryset, search_term)
+        if results is None:
+            return super().get_search_results(request, queryset, search_term)
+        return results, False
+
 @admin.register(StyleRecommendation)
 class StyleRecommendationAdmin(admin.ModelAdmin):
     list_display = ('source_item', 'recommended_item', 'similarity_score', 'created_at')
     list_filter = ('created_at',)
-    search_fields = ('source_item__title', 'recommended_item__title', 'recommendation_reason')
\ No newline at end of file
+    search_fields = ('source_item__title', 'recommended_item__title', 'recommendation_reason')
+
+
+@admin.register(InferenceJob)
+class InferenceJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'user', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status', 'created_at')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'owner', 'heartbeat_at')
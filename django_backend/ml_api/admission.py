@@ -0,0 +1,238 @@
+"""
+Admission control for model calls.
+Each model has a limit on concurrent calls and a bounded queue of calls waiting
+for a slot. Calls that cannot be served in time are refused straight away
+instead of queueing without bound, so latency stays bounded under overload.
+Result cache hits never reach admission control.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import math
+import time
+from collections import Counter, deque
+
+from .metrics import ADMISSION_REJECTIONS, ADMISSION_WAITING
+
+# Request header with the client's timeout in seconds
+TIMEOUT_HEADER = 'X-Request-Timeout'
+
+# Weight of the newest sample in the moving average of slot hold times
+SERVICE_TIME_ALPHA = 0.2
+
+# Absolute time.monotonic() deadline of the current request, if any
+_deadline = contextvars.ContextVar('ml_request_deadline', default=None)
+
+
+class Overloaded(Exception):
+    """
+    A model call was refused to keep latency bounded.
+
+    Attributes:
+        status_code (int): HTTP status to answer with
+        retry_after (int): Seconds after which the client may retry
+    """
+
+    status_code = 503
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFull(Overloaded):
+    """Raised when a model's wait queue is full."""
+
+    status_code = 429
+
+
+class DeadlineExceeded(Overloaded):
+    """Raised when a request's deadline passed or would pass before it is served."""
+
+
+def set_timeout(seconds):
+    """
+    Set the deadline of the current request to `seconds` from now.
+
+    Returns:
+        contextvars.Token: Token for reset_timeout
+    """
+    return _deadline.set(time.monotonic() + seconds)
+
+
+def reset_timeout(token):
+    """Restore the deadline that was current before set_timeout."""
+    _deadline.reset(token)
+
+
+def time_remaining():
+    """Return the seconds left before the current deadline, or None without one."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+async def _with_deadline(coroutine, deadline):
+    _deadline.set(deadline)
+    return await coroutine
+
+
+def bind_deadline(coroutine):
+    """
+    Carry the caller's deadline into a coroutine that will run as a task on
+    another thread's event loop, where the caller's context is not visible.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return coroutine
+    return _with_deadline(coroutine, deadline)
+
+
+class AdmissionController:
+    """
+    Concurrency limit and bounded wait queue for one model.
+
+    Must be used from a single event loop (the inference engine loop). A
+    caller is refused with QueueFull when the queue is full, and with
+    DeadlineExceeded when its deadline has passed, is expected to pass before
+    its call would finish, or passes while it holds a slot.
+
+    Args:
+        model (str): Model key, used in errors and metrics
+        max_concurrency (int): Calls allowed to run at once
+        max_queue (int): Calls allowed to wait for a slot
+    """
+
+    def __init__(self, model, max_concurrency=16, max_queue=64):
+        self.model = model
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = Counter()
+        # Moving average of how long a call holds its slot, in seconds
+        self.service_time = None
+        self._waiters = deque()
+        self._waiting_gauge = ADMISSION_WAITING.labels(model)
+
+    @property
+    def queue_depth(self):
+        """Number of calls waiting for a slot."""
+        return len(self._waiters)
+
+    def expected_latency(self, position):
+        """
+        Estimate the seconds until a caller joining the queue at a position
+        has been served: the wait for a slot plus its own call.
+        """
+        if self.service_time is None:
+            return 0.0
+        return self.service_time * (position // self.max_concurrency + 2)
+
+    def retry_after(self):
+        """Seconds a refused client should wait: the time to drain the backlog."""
+        backlog = self.in_flight + len(self._waiters)
+        service_time = self.service_time if self.service_time is not None else 1.0
+        return max(1, math.ceil(service_time * backlog / self.max_concurrency))
+
+    def _reject(self, error_class, reason, message):
+        self.rejected[reason] += 1
+        ADMISSION_REJECTIONS.labels(self.model, reason).inc()
+        return error_class(message, retry_after=self.retry_after())
+
+    async def _acquire(self, remaining):
+        if remaining is not None and remaining <= 0:
+            raise self._reject(
+                DeadlineExceeded, 'deadline', f"Request deadline passed before {self.model} ran"
+            )
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject(
+                QueueFull, 'queue_full', f"Too many requests queued for {self.model}"
+            )
+        # Only callers that would queue are refused on the estimate. The
+        # estimate is refreshed by the calls holding the busy slots, so it
+        # cannot get stuck refusing everyone.
+        if remaining is not None and self.expected_latency(len(self._waiters)) > remaining:
+            raise self._reject(
+                DeadlineExceeded, 'deadline',
+                f"{self.model} cannot finish within the request deadline"
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._waiting_gauge.inc()
+        try:
+            async with asyncio.timeout(remaining):
+                await waiter
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over as the wait ended; pass it on
+                self._release_slot()
+            else:
+                self._waiters.remove(waiter)
+            if isinstance(e, TimeoutError):
+                raise self._reject(
+                    DeadlineExceeded, 'deadline',
+                    f"Request deadline passed while waiting for {self.model}"
+                ) from None
+            raise
+        finally:
+            self._waiting_gauge.dec()
+
+    def _release_slot(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Hand the slot straight to the next caller
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """
+        Hold one of the model's slots for the duration of the block.
+
+        Raises:
+            QueueFull: If no slot is free and the queue is full
+            DeadlineExceeded: If the current deadline passes before or while
+                the block runs
+        """
+        remaining = time_remaining()
+        await self._acquire(remaining)
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            async with asyncio.timeout(time_remaining()) as timeout:
+                yield
+        except TimeoutError:
+            if not timeout.expired():
+                raise
+            raise self._reject(
+                DeadlineExceeded, 'deadline', f"Request deadline passed while {self.model} ran"
+            ) from None
+        finally:
+            elapsed = time.monotonic() - started
+            if self.service_time is None:
+                self.service_time = elapsed
+            else:
+                self.service_time += SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+            self._release_slot()
+
+    def stats(self):
+        return {
+            'in_flight': self.in_flight,
+            'queue_depth': len(self._waiters),
+            'max_concurrency': self.max_concurrency,
+            'max_queue': self.max_queue,
+            'admitted': self.admitted,
+            'rejected': dict(self.rejected),
+            'avg_service_ms': (
+                round(self.service_time * 1000, 3) if self.service_time is not None else None
+            ),
+        }
@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_migrate
 
 
 class MlApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'ml_api'
\ No newline at end of file
+    name = 'ml_api'
+
+    def ready(self):
+        from .search import install_search
+        post_migrate.connect(install_search, sender=self)
+
+        # Load model weights at startup instead of on the first request. With
+        # gunicorn preload_app this runs once in the master, and forked
+        # workers share the loaded weights copy-on-write.
+        if settings.ML_PRELOAD:
+            from .ml_service import ml_service
+            ml_service.preload()
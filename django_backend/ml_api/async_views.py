@@ -0,0 +1,234 @@
+"""
+Async variants of the ml_api views.
+These are routed instead of the sync views when the API is served over ASGI
+(settings.ML_API_ASYNC_VIEWS), so a request awaits the ML service rather than
+holding a worker thread.
+"""
+
+import json
+
+from adrf.decorators import api_view
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.decorators import permission_classes, renderer_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .admission import Overloaded
+from .ml_service import ml_service
+from .renderers import STREAMING_RENDERERS
+from .views import (
+    batch_inputs, batch_response, done_event, overloaded_response, stream_chunk,
+    streaming_response, submit_job, wants_event_stream, wants_job, wants_stream,
+)
+
+
+def ndjson_response(items):
+    """Stream batch items from an async iterator as newline-delimited JSON."""
+    async def lines():
+        async for item in items:
+            yield json.dumps(item) + '\n'
+
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+
+def idea_stream_response(first, ideas, sse):
+    """Async variant of views.idea_stream_response over an async iterator."""
+    async def chunks():
+        count = 0
+        idea = first
+        try:
+            while idea is not None:
+                yield stream_chunk('idea', {'index': count, 'idea': idea}, sse)
+                count += 1
+                idea = await anext(ideas, None)
+        except Exception as e:
+            yield stream_chunk('error', {'error': str(e)}, sse)
+            return
+        yield stream_chunk('done', done_event(count), sse)
+
+    return streaming_response(chunks(), sse)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes(STREAMING_RENDERERS)
+async def generate_ideas(request):
+    """
+    Generate fashion design ideas based on a text prompt.
+
+    With ?stream=1 the ideas are streamed as NDJSON as they are generated,
+    or as Server-Sent Events with Accept: text/event-stream.
+    """
+    prompt = request.data.get('prompt')
+
+    if not prompt:
+        return Response(
+            {'error': 'Prompt is required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    sse = wants_event_stream(request)
+    if sse or wants_stream(request):
+        ideas = ml_service.astream_ideas(prompt)
+        # Failures before the first idea still get a status code
+        try:
+            first = await anext(ideas, None)
+        except Overloaded as e:
+            return overloaded_response(e)
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        return idea_stream_response(first, ideas, sse)
+
+    try:
+        result = await ml_service.agenerate_ideas(prompt)
+        return Response(result, status=status.HTTP_200_OK)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes(STREAMING_RENDERERS)
+async def generate_ideas_batch(request):
+    """
+    Generate fashion design ideas for a list of prompts.
+
+    Results are returned in input order, or streamed as NDJSON in completion
+    order with ?stream=1.
+    """
+    prompts, error = batch_inputs(request, 'prompts')
+    if error:
+        return error
+
+    if wants_stream(request):
+        return ndjson_response(ml_service.aiter_batch('generate_ideas', prompts))
+
+    try:
+        items = await ml_service.agenerate_ideas_batch(prompts)
+        return Response(batch_response(items), status=status.HTTP_200_OK)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+async def generate_image(request):
+    """
+    Generate a fashion design image based on a text prompt.
+
+    Pass ?mode=job (or "async": true) to get a job id back immediately and
+    poll /api/jobs/<id> for the result.
+    """
+    prompt = request.data.get('prompt')
+
+    if not prompt:
+        return Response(
+            {'error': 'Prompt is required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if wants_job(request):
+        return await sync_to_async(submit_job)(request, 'generate-image', {'prompt': prompt})
+
+    try:
+        result = await ml_service.agenerate_image(prompt)
+        return Response(result, status=status.HTTP_200_OK)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+async def analyze_style(request):
+    """
+    Analyze the style of a fashion design from an image URL.
+    """
+    image_url = request.data.get('imageUrl')
+
+    if not image_url:
+        return Response(
+            {'error': 'Image URL is required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        result = await ml_service.aanalyze_style(image_url)
+        return Response(result, status=status.HTTP_200_OK)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes(STREAMING_RENDERERS)
+async def analyze_style_batch(request):
+    """
+    Analyze the style of a list of fashion images.
+
+    Results are returned in input order, or streamed as NDJSON in completion
+    order with ?stream=1.
+    """
+    image_urls, error = batch_inputs(request, 'imageUrls')
+    if error:
+        return error
+
+    if wants_stream(request):
+        return ndjson_response(ml_service.aiter_batch('analyze_style', image_urls))
+
+    try:
+        items = await ml_service.aanalyze_style_batch(image_urls)
+        return Response(batch_response(items), status=status.HTTP_200_OK)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+async def model_status(request):
+    """
+    Get the status of all ML models.
+    """
+    try:
+        # Collecting the stats takes locks shared with the worker threads
+        result = await sync_to_async(ml_service.get_model_status)()
+        return Response(result, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+# Public endpoint for health check
+@api_view(['GET'])
+async def health_check(request):
+    """
+    Health check endpoint for the ML API.
+    """
+    return Response(
+        {'status': 'healthy', 'service': 'fashion-ml-api'},
+        status=status.HTTP_200_OK
+    )
@@ -0,0 +1,126 @@
+"""
+Dynamic micro-batching for model calls.
+Concurrent requests for the same model are collected for a short window and
+run as a single batched backend call.
+"""
+
+import asyncio
+import time
+
+from .metrics import BATCH_QUEUE_DEPTH
+
+
+class BatchStats:
+    """Running batch size and queue-wait metrics for one model."""
+
+    def __init__(self):
+        self.batches = 0
+        self.items = 0
+        self.max_batch_size = 0
+        self.last_batch_size = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    def record(self, batch_size, waits):
+        self.batches += 1
+        self.items += batch_size
+        self.last_batch_size = batch_size
+        self.max_batch_size = max(self.max_batch_size, batch_size)
+        self.queue_wait_total += sum(waits)
+        self.queue_wait_max = max(self.queue_wait_max, max(waits))
+
+    def as_dict(self):
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+            'max_batch_size': self.max_batch_size,
+            'last_batch_size': self.last_batch_size,
+            'avg_queue_wait_ms': (
+                round(self.queue_wait_total / self.items * 1000, 3) if self.items else 0.0
+            ),
+            'max_queue_wait_ms': round(self.queue_wait_max * 1000, 3),
+        }
+
+
+class MicroBatcher:
+    """
+    Collects single inputs into batches for one model.
+
+    A batch is dispatched as soon as it holds ``max_batch_size`` inputs or when
+    the oldest queued input has waited ``max_wait_ms``. The batcher must be
+    used from a single event loop (the inference engine loop).
+
+    Args:
+        run_batch (callable): Coroutine function taking a list of inputs and
+            returning a list of outputs in the same order
+        max_batch_size (int): Upper bound on inputs per backend call
+        max_wait_ms (float): How long the first queued input may wait for
+            others to join its batch
+    """
+
+    def __init__(self, run_batch, max_batch_size=16, max_wait_ms=5.0, name=None):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.stats = BatchStats()
+        self._pending = []
+        self._timer = None
+        self._depth_gauge = BATCH_QUEUE_DEPTH.labels(name) if name else None
+
+    @property
+    def queue_depth(self):
+        """Number of inputs waiting for a batch."""
+        return len(self._pending)
+
+    async def submit(self, item):
+        """
+        Queue one input and wait for its output.
+
+        Args:
+            item: A single model input
+
+        Returns:
+            The model output for this input
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.monotonic()))
+        if self._depth_gauge is not None:
+            self._depth_gauge.inc()
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            if self._depth_gauge is not None:
+                self._depth_gauge.dec(len(batch))
+            asyncio.ensure_future(self._dispatch(batch))
+
+    async def _dispatch(self, batch):
+        now = time.monotonic()
+        self.stats.record(len(batch), [now - enqueued for _, _, enqueued in batch])
+        try:
+            outputs = await self.run_batch([item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), output in zip(batch, outputs):
+            if future.done():
+                continue
+            # Backends fail a single input by returning an exception for it
+            if isinstance(output, Exception):
+                future.set_exception(output)
+            else:
+                future.set_result(output)
@@ -0,0 +1,269 @@
+"""
+Result cache for ML model outputs.
+Results are keyed on the model name, the model version and a digest of the
+normalized input, and kept as JSON in an in-process LRU tier with an optional
+Django cache-framework tier behind it. The engine reads and writes the shared
+tier off its event loop (aget_many/aset_many), since a file or Redis cache
+call blocks for a disk or network round trip.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_input(value):
+    """
+    Normalize a model input before it is hashed.
+
+    Prompts are case-folded with whitespace collapsed; image URLs keep their
+    case but are stripped.
+    """
+    if isinstance(value, str):
+        if value.startswith(('http://', 'https://', '/')):
+            return value.strip()
+        return ' '.join(value.split()).casefold()
+    return value
+
+
+def make_key(model, version, value):
+    """
+    Build a content-addressed cache key.
+
+    Args:
+        model (str): Model key
+        version (str): Model version
+        value: Model input (str or bytes)
+
+    Returns:
+        str: Cache key
+    """
+    if isinstance(value, bytes):
+        digest = hashlib.sha256(value).hexdigest()
+    else:
+        payload = json.dumps(normalize_input(value), sort_keys=True, default=str)
+        digest = hashlib.sha256(payload.encode()).hexdigest()
+    return f'ml:{model}:{version}:{digest}'
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache bounded by total entry size in bytes.
+    """
+
+    def __init__(self, max_bytes, ttl=None):
+        self.max_bytes = int(max_bytes)
+        self.ttl = ttl
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.size -= size
+
+
+class ResultCache:
+    """
+    Two-tier cache for model results.
+
+    Args:
+        ttl (int): Seconds a result stays valid
+        max_bytes (int): Size cap of the in-process tier (serialized JSON size)
+        alias (str, optional): Django cache alias for the shared tier, e.g. a
+            locmem, file-based or Redis cache configured in CACHES
+    """
+
+    def __init__(self, ttl=300, max_bytes=16 * 1024 * 1024, alias=None):
+        self.ttl = ttl
+        self.alias = alias
+        self.local = LRUCache(max_bytes, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.model_hits = Counter()
+        self.model_misses = Counter()
+
+    @property
+    def shared(self):
+        if not self.alias:
+            return None
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def get(self, key, model=None):
+        """
+        Return a cached result or None, counting the lookup against a model.
+
+        Every call returns a new copy, so callers may modify the result. The
+        shared tier is read on the calling thread; code on an event loop
+        uses aget_many instead.
+        """
+        payload = self.local.get(key)
+        if payload is None:
+            payload = self._get_shared_payloads([key])[0]
+        return self._count(payload, model)
+
+    async def aget_many(self, keys, model=None):
+        """
+        Return the cached results of several keys, None for misses.
+
+        The local tier is read inline and the shared tier, for the keys the
+        local tier misses, in one call off the event loop, so a slow shared
+        cache does not stall other work on the loop.
+        """
+        payloads = [self.local.get(key) for key in keys]
+        missing = [i for i, payload in enumerate(payloads) if payload is None]
+        if missing and self.shared is not None:
+            found = await asyncio.to_thread(self._get_shared_payloads, [keys[i] for i in missing])
+            for i, payload in zip(missing, found):
+                payloads[i] = payload
+        return [self._count(payload, model) for payload in payloads]
+
+    async def aget(self, key, model=None):
+        """Async variant of get, see aget_many."""
+        return (await self.aget_many([key], model))[0]
+
+    def get_shared(self, key):
+        """
+        Return a result from the shared tier only, or None, without counting
+        a lookup. Used to pick up results computed by other processes.
+        """
+        if self.shared is None:
+            return None
+        payload = self.shared.get(key)
+        if payload is None:
+            return None
+        self.local.set(key, payload, len(payload))
+        return json.loads(payload)
+
+    def set(self, key, value):
+        """
+        Store a JSON-serializable result in both tiers.
+
+        Both tiers keep the serialized result, so later changes to value do
+        not reach the cache. The shared tier is written on the calling
+        thread; code on an event loop uses aset_many instead.
+        """
+        self._set_shared_payloads(self._set_local([(key, value)]))
+
+    async def aset_many(self, items):
+        """
+        Store (key, value) pairs in both tiers, writing the shared tier in
+        one call off the event loop.
+        """
+        payloads = self._set_local(items)
+        if self.shared is not None and payloads:
+            await asyncio.to_thread(self._set_shared_payloads, payloads)
+
+    async def aset(self, key, value):
+        """Async variant of set, see aset_many."""
+        await self.aset_many([(key, value)])
+
+    def _count(self, payload, model):
+        # Count a lookup and decode its payload
+        if payload is None:
+            self.misses += 1
+            self.model_misses[model] += 1
+            return None
+        self.hits += 1
+        self.model_hits[model] += 1
+        return json.loads(payload)
+
+    def _get_shared_payloads(self, keys):
+        # Blocking: one round trip to the shared tier, hits are kept locally
+        shared = self.shared
+        if shared is None:
+            return [None] * len(keys)
+        try:
+            found = shared.get_many(keys)
+        except Exception as e:
+            logger.warning(f"Shared result cache unavailable: {e}")
+            return [None] * len(keys)
+        for key, payload in found.items():
+            self.local.set(key, payload, len(payload))
+            self.shared_hits += 1
+        return [found.get(key) for key in keys]
+
+    def _set_local(self, items):
+        # Store serialized values in the local tier and return {key: payload}
+        payloads = {}
+        for key, value in items:
+            payload = json.dumps(value)
+            self.local.set(key, payload, len(payload))
+            payloads[key] = payload
+        return payloads
+
+    def _set_shared_payloads(self, payloads):
+        # Blocking: one round trip to the shared tier
+        shared = self.shared
+        if shared is None:
+            return
+        try:
+            shared.set_many(payloads, timeout=self.ttl)
+        except Exception as e:
+            logger.warning(f"Shared result cache unavailable: {e}")
+
+    def clear(self):
+        self.local.clear()
+
+    def model_stats(self, model):
+        """Return hit/miss counters for one model."""
+        hits, misses = self.model_hits[model], self.model_misses[model]
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        }
+
+    def stats(self):
+        """Return hit/miss counters and tier sizes."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'shared_hits': self.shared_hits,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'entries': len(self.local),
+            'size_bytes': self.local.size,
+            'max_bytes': self.local.max_bytes,
+            'shared_alias': self.alias,
+        }
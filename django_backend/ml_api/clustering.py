@@ -0,0 +1,73 @@
+"""
+Vectorized clustering helpers shared by the palette and similarity engines.
+"""
+
+import numpy as np
+
+
+def squared_distances(points, centers):
+    """Return the (n, k) matrix of squared distances between points and centers."""
+    # |p - c|^2 = |p|^2 - 2 p.c + |c|^2, computed for all pairs at once
+    return (
+        (points * points).sum(axis=1)[:, None]
+        - 2.0 * points @ centers.T
+        + (centers * centers).sum(axis=1)[None, :]
+    )
+
+
+def assign(points, centers, chunk_size=16384):
+    """Return the index of the nearest center for every point, in chunks."""
+    labels = np.empty(len(points), dtype=np.int64)
+    for start in range(0, len(points), chunk_size):
+        block = points[start:start + chunk_size]
+        labels[start:start + chunk_size] = squared_distances(block, centers).argmin(axis=1)
+    return labels
+
+
+def kmeans(points, k=5, iterations=20, batch_size=1024, seed=0):
+    """
+    Mini-batch k-means.
+
+    Args:
+        points (numpy.ndarray): (n, d) float32 points, e.g. RGB pixels
+        k (int): Number of clusters
+        iterations (int): Mini-batch updates
+        batch_size (int): Points sampled per update
+        seed (int): Random seed, so results are reproducible
+
+    Returns:
+        tuple: (centers of shape (k, d), proportions of shape (k,))
+    """
+    rng = np.random.default_rng(seed)
+    n = len(points)
+    k = min(k, n)
+
+    # k-means++ seeding on a sample
+    sample = points[rng.choice(n, size=min(n, batch_size), replace=False)]
+    centers = np.empty((k, points.shape[1]), dtype=np.float32)
+    centers[0] = sample[rng.integers(len(sample))]
+    closest = squared_distances(sample, centers[:1]).ravel()
+    for i in range(1, k):
+        weights = np.maximum(closest, 0).astype(np.float64)
+        total = weights.sum()
+        index = rng.choice(len(sample), p=weights / total) if total > 0 else rng.integers(len(sample))
+        centers[i] = sample[index]
+        closest = np.minimum(closest, squared_distances(sample, centers[i:i + 1]).ravel())
+
+    counts = np.zeros(k, dtype=np.float32)
+    for _ in range(iterations):
+        batch = points[rng.integers(0, n, size=min(n, batch_size))]
+        labels = squared_distances(batch, centers).argmin(axis=1)
+        batch_counts = np.bincount(labels, minlength=k).astype(np.float32)
+        one_hot = np.zeros((len(batch), k), dtype=np.float32)
+        one_hot[np.arange(len(batch)), labels] = 1.0
+        sums = one_hot.T @ batch
+        counts += batch_counts
+        # Per-center learning rate 1/count, as in mini-batch k-means
+        moved = batch_counts > 0
+        rate = (batch_counts[moved] / counts[moved])[:, None]
+        centers[moved] += rate * (sums[moved] / batch_counts[moved, None] - centers[moved])
+
+    labels = assign(points, centers)
+    proportions = np.bincount(labels, minlength=k).astype(np.float32) / n
+    return centers, proportions
@@ -0,0 +1,204 @@
+"""
+Single-flight coalescing of identical model calls.
+Concurrent calls for the same result cache key share one computation. Within a
+process the duplicates await the first caller's result on the engine loop.
+With a lock store configured, processes also coordinate through a lock per key
+in a Django cache: one process computes, and the others pick the result up
+from the shared result cache tier.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import Counter
+
+from .admission import Overloaded
+from .metrics import COALESCED_CALLS
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls by key.
+
+    Must be used from a single event loop (the inference engine loop).
+
+    Args:
+        lock_alias (str, optional): Django cache alias used as the lock store
+            for coalescing across processes
+        lookup (callable, optional): Function returning the result of a key
+            from the shared result cache, or None. Required with lock_alias.
+        lock_timeout (float): Seconds a lock is held at most, which bounds how
+            long other processes wait for its result
+        poll_interval (float): Seconds between checks for a result computed
+            by another process
+    """
+
+    def __init__(self, lock_alias=None, lookup=None, lock_timeout=60, poll_interval=0.05):
+        if lock_alias and lookup is None:
+            logger.warning(
+                "Cross-process coalescing needs the shared result cache tier "
+                "(RESULT_CACHE['ALIAS']); coalescing within processes only"
+            )
+            lock_alias = None
+        self.lock_alias = lock_alias
+        self.lookup = lookup
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.counts = Counter()
+        self._flights = {}
+
+    @property
+    def locks(self):
+        if not self.lock_alias:
+            return None
+        from django.core.cache import caches
+        return caches[self.lock_alias]
+
+    async def run(self, model, keys, compute):
+        """
+        Compute results for keys, sharing in-flight work with other callers.
+
+        Args:
+            model (str): Model key, used in metrics
+            keys (list): Result cache keys, one per input
+            compute (callable): Coroutine function taking a list of positions
+                in `keys` and returning their outputs in the same order
+
+        Returns:
+            list: One output per key
+        """
+        loop = asyncio.get_running_loop()
+        futures = []
+        leading = []
+        for position, key in enumerate(keys):
+            future = self._flights.get(key)
+            if future is None:
+                future = loop.create_future()
+                self._flights[key] = future
+                leading.append(position)
+            else:
+                self.counts['local'] += 1
+                COALESCED_CALLS.labels(model, 'local').inc()
+            futures.append(future)
+        self.counts['leader'] += len(leading)
+
+        if leading:
+            try:
+                outputs = await self._lead(model, keys, leading, compute)
+            except BaseException as e:
+                for position in leading:
+                    self._finish(keys[position], futures[position], error=e)
+                raise
+            for position, output in zip(leading, outputs):
+                self._finish(keys[position], futures[position], output)
+
+        results = [None] * len(keys)
+        leading = set(leading)
+        for position, future in enumerate(futures):
+            if position in leading:
+                results[position] = future.result()
+            else:
+                results[position] = await self._follow(model, keys, position, future, compute)
+        return results
+
+    async def _follow(self, model, keys, position, future, compute):
+        # asyncio.wait does not cancel the shared future if this caller is
+        # cancelled, unlike awaiting it directly
+        await asyncio.wait([future])
+        if future.cancelled() or isinstance(future.exception(), Overloaded):
+            # The first caller was cancelled or refused (e.g. its deadline
+            # passed), which says nothing about this caller; try again
+            return (await self.run(model, [keys[position]], lambda _: compute([position])))[0]
+        return future.result()
+
+    def _finish(self, key, future, output=None, error=None):
+        if self._flights.get(key) is future:
+            del self._flights[key]
+        if future.done():
+            return
+        if isinstance(error, asyncio.CancelledError):
+            future.cancel()
+        elif error is not None:
+            future.set_exception(error)
+            # Followers may not exist; do not log the error as unretrieved
+            future.exception()
+        else:
+            future.set_result(output)
+
+    async def _lead(self, model, keys, positions, compute):
+        locks = self.locks
+        if locks is None:
+            return await compute(positions)
+
+        token = uuid.uuid4().hex
+        held, remote = [], []
+        for position in positions:
+            acquired = await asyncio.to_thread(self._acquire, locks, keys[position], token)
+            (held if acquired else remote).append(position)
+
+        async def compute_held():
+            try:
+                return await compute(held) if held else []
+            finally:
+                await asyncio.to_thread(self._release, locks, [keys[p] for p in held], token)
+
+        local_outputs, remote_outputs = await asyncio.gather(
+            compute_held(),
+            asyncio.gather(*(self._wait_remote(model, keys, p, compute) for p in remote)),
+        )
+        outputs = dict(zip(held, local_outputs))
+        outputs.update(zip(remote, remote_outputs))
+        return [outputs[position] for position in positions]
+
+    async def _wait_remote(self, model, keys, position, compute):
+        """Wait for another process to publish the result of a key."""
+        key = keys[position]
+        lock_key = self._lock_key(key)
+        locks = self.locks
+        deadline = time.monotonic() + self.lock_timeout
+        try:
+            while time.monotonic() < deadline:
+                result = await asyncio.to_thread(self.lookup, key)
+                if result is not None:
+                    self.counts['remote'] += 1
+                    COALESCED_CALLS.labels(model, 'remote').inc()
+                    return result
+                if await asyncio.to_thread(locks.get, lock_key) is None:
+                    # Released without a result: the other process failed
+                    break
+                await asyncio.sleep(self.poll_interval)
+        except Exception as e:
+            logger.warning(f"Coalescing lock store unavailable: {e}")
+        return (await compute([position]))[0]
+
+    def _lock_key(self, key):
+        return f'{key}:lock'
+
+    def _acquire(self, locks, key, token):
+        try:
+            return locks.add(self._lock_key(key), token, self.lock_timeout)
+        except Exception as e:
+            # Without the lock store, compute locally rather than fail
+            logger.warning(f"Coalescing lock store unavailable: {e}")
+            return True
+
+    def _release(self, locks, keys, token):
+        for key in keys:
+            lock_key = self._lock_key(key)
+            try:
+                if locks.get(lock_key) == token:
+                    locks.delete(lock_key)
+            except Exception as e:
+                logger.warning(f"Could not release coalescing lock {lock_key}: {e}")
+
+    def stats(self):
+        return {
+            'in_flight': len(self._flights),
+            'leaders': self.counts['leader'],
+            'coalesced_local': self.counts['local'],
+            'coalesced_remote': self.counts['remote'],
+            'cross_process': bool(self.lock_alias),
+        }
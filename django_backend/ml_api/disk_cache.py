@@ -0,0 +1,187 @@
+"""
+Size-capped, least-recently-used file cache shared by worker processes.
+Used for preprocessed tensors and fetched image bodies.
+"""
+
+import fcntl
+import logging
+import os
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class DiskLRU:
+    """
+    Directory of cache files with a size cap and LRU eviction.
+
+    Recency is the file mtime, refreshed on every hit, so all processes share
+    one LRU order. Each process tracks the cache size from its last scan plus
+    its own writes; when that passes max_bytes the directory is rescanned
+    under a file lock and the oldest entries are evicted down to
+    low_watermark * max_bytes. The first scan walks the whole directory, so
+    workers start it in the background with scan_in_background().
+
+    Args:
+        directory: Cache directory
+        max_bytes (int): Size cap
+        suffix (str): File suffix of entries, e.g. '.npy'
+        low_watermark (float): Fraction of max_bytes kept after an eviction
+    """
+
+    def __init__(self, directory, max_bytes, suffix, low_watermark=0.9):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.low_watermark = low_watermark
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = None
+        self._entries = None
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self._scan_pid = None
+
+    def path_for(self, key):
+        return self.directory / key[:2] / f'{key}{self.suffix}'
+
+    def hit(self, path):
+        """Record a hit on an entry and mark it most recently used."""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def write(self, key, write_to):
+        """
+        Atomically write an entry, evicting old entries if over the cap.
+
+        Args:
+            key (str): Entry key
+            write_to (callable): Writes the entry to the given binary file
+
+        Returns:
+            Path: Path of the entry
+        """
+        self._ensure_scanned()
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            with open(temp_path, 'wb') as f:
+                write_to(f)
+            size = temp_path.stat().st_size
+            try:
+                replaced = path.stat().st_size
+            except FileNotFoundError:
+                replaced = None
+            os.replace(temp_path, path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            if replaced is None:
+                self._size += size
+                self._entries += 1
+            else:
+                self._size += size - replaced
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+        return path
+
+    def evict(self):
+        """Remove least recently used entries until under the low watermark."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / 'lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                entries = self._scan()
+                size = sum(entry_size for _, _, entry_size in entries)
+                target = self.max_bytes * self.low_watermark
+                evicted = 0
+                if size > self.max_bytes:
+                    for _, path, entry_size in sorted(entries):
+                        if size <= target:
+                            break
+                        path.unlink(missing_ok=True)
+                        size -= entry_size
+                        evicted += 1
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        with self._lock:
+            self._size = size
+            self._entries = len(entries) - evicted
+            self.evictions += evicted
+        if evicted:
+            logger.info(f"Evicted {evicted} entries from {self.directory}")
+
+    def _scan(self):
+        # (mtime, path, size) of every entry
+        entries = []
+        if not self.directory.exists():
+            return entries
+        for subdirectory in os.scandir(self.directory):
+            if not subdirectory.is_dir():
+                continue
+            for entry in os.scandir(subdirectory.path):
+                if entry.name.endswith(self.suffix):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime_ns, Path(entry.path), stat.st_size))
+        return entries
+
+    def _ensure_scanned(self):
+        if self._size is not None:
+            return
+        # Callers that arrive during a scan wait for it instead of rescanning
+        with self._scan_lock:
+            if self._size is not None:
+                return
+            entries = self._scan()
+            with self._lock:
+                self._size = sum(entry_size for _, _, entry_size in entries)
+                self._entries = len(entries)
+
+    def scan_in_background(self):
+        """Start the first scan of the directory in a thread, once per process."""
+        with self._lock:
+            # A scan started before a fork does not run in the child
+            if self._size is not None or self._scan_pid == os.getpid():
+                return
+            self._scan_pid = os.getpid()
+        threading.Thread(
+            target=self._ensure_scanned, name=f'scan-{self.directory.name}', daemon=True,
+        ).start()
+
+    def stats(self):
+        """
+        Return size and hit statistics (hits/misses are per process).
+
+        Only reads counters held in memory: entries and size_bytes are None
+        until the first scan of the directory, which this starts if needed,
+        has finished.
+        """
+        if self._size is None:
+            self.scan_in_background()
+        lookups = self.hits + self.misses
+        return {
+            'entries': self._entries,
+            'size_bytes': self._size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+        }
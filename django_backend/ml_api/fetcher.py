@@ -0,0 +1,312 @@
+"""
+Remote image fetcher for the ML backends.
+Images are downloaded over a pooled async HTTP client on the engine loop, with
+per-host connection limits, timeouts and a body size limit. Bodies are cached
+on disk and revalidated with conditional GETs (ETag / Last-Modified) once
+stale.
+"""
+
+import asyncio
+import hashlib
+import ipaddress
+import json
+import logging
+import socket
+import threading
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from .disk_cache import DiskLRU
+
+logger = logging.getLogger(__name__)
+
+
+# Errors returned to clients are generic, so the fetcher cannot be used to
+# probe hosts; the details are logged
+FETCH_FAILED = 'Could not fetch image'
+HOST_NOT_ALLOWED = 'Image host not allowed'
+
+
+class FetchError(ValueError):
+    """Raised when an image URL cannot be fetched."""
+
+
+def is_public_address(address):
+    """
+    Return True if an IP address is globally routable, i.e. not private,
+    loopback, link-local, multicast or reserved.
+    """
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+class ImageFetcher:
+    """
+    Pooled, caching HTTP fetcher for image URLs.
+
+    Each cache entry is one file: a JSON header line (validators, freshness)
+    followed by the raw body.
+
+    Args:
+        cache_dir: Directory of the body cache
+        cache_max_bytes (int): Size cap of the body cache
+        max_connections (int): Connections in the pool, across hosts
+        max_per_host (int): Concurrent requests to a single host
+        timeout (float): Read/write/pool timeout in seconds
+        connect_timeout (float): Connect timeout in seconds
+        max_bytes (int): Largest body accepted
+        fresh_for (int): Seconds a response is served from cache without
+            revalidation, unless it sends Cache-Control max-age
+        allowed_hosts (list, optional): Hosts that may be fetched; None allows
+            any host
+        allow_private (bool): Also fetch from hosts that resolve to private,
+            loopback, link-local or reserved addresses
+    """
+
+    def __init__(self, cache_dir, cache_max_bytes=1024 ** 3, max_connections=100,
+                 max_per_host=8, timeout=10.0, connect_timeout=3.0,
+                 max_bytes=20 * 1024 * 1024, fresh_for=300, allowed_hosts=None,
+                 allow_private=False):
+        self.cache = DiskLRU(cache_dir, cache_max_bytes, '.body')
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_bytes = max_bytes
+        self.fresh_for = fresh_for
+        self.allowed_hosts = set(allowed_hosts) if allowed_hosts is not None else None
+        self.allow_private = allow_private
+        self.requests = 0
+        self.not_modified = 0
+        self.errors = 0
+        self._client = None
+        self._loop = None
+        self._host_limits = {}
+
+    def _get_client(self):
+        # The client and its connections belong to one event loop, which
+        # changes when the engine loop is restarted after a fork
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                follow_redirects=True,
+                max_redirects=3,
+                event_hooks={'request': [self._check_request]},
+                headers={'User-Agent': 'fashion-ml-fetcher/1.0'},
+            )
+            self._loop = loop
+            self._host_limits = {}
+        return self._client
+
+    @asynccontextmanager
+    async def _host_slot(self, host):
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(self.max_per_host)
+        async with limit:
+            yield
+
+    def check_url(self, url):
+        """
+        Validate a URL before fetching it.
+
+        Raises:
+            FetchError: If the scheme is not http(s) or the host is not allowed
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise FetchError(f"Unsupported image URL: {url}")
+        if self.allowed_hosts is not None and parts.hostname not in self.allowed_hosts:
+            logger.warning(f"Refused image host {parts.hostname}: not in ALLOWED_HOSTS")
+            raise FetchError(HOST_NOT_ALLOWED)
+
+    async def check_address(self, host):
+        """
+        Resolve a host and refuse it if any of its addresses is not public.
+
+        Raises:
+            FetchError: If the host does not resolve or is not public
+        """
+        if self.allow_private:
+            return
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(
+                host, None, type=socket.SOCK_STREAM
+            )
+        except OSError as e:
+            logger.info(f"Cannot resolve image host {host}: {e}")
+            raise FetchError(FETCH_FAILED) from e
+        for *_, sockaddr in infos:
+            if not is_public_address(sockaddr[0]):
+                logger.warning(f"Refused image host {host}: resolves to {sockaddr[0]}")
+                raise FetchError(HOST_NOT_ALLOWED)
+
+    async def _check_request(self, request):
+        # Runs for every request httpx sends, so redirect targets are checked too
+        self.check_url(str(request.url))
+        await self.check_address(request.url.host)
+
+    async def fetch(self, url):
+        """
+        Return the body of an image URL, from cache when fresh.
+
+        Args:
+            url (str): http(s) URL
+
+        Returns:
+            bytes: Response body
+
+        Raises:
+            FetchError: On invalid URLs, HTTP errors, timeouts and bodies over
+                max_bytes
+        """
+        self.check_url(url)
+        key = hashlib.sha256(url.encode()).hexdigest()
+        entry = await asyncio.to_thread(self._read, key)
+        if entry is not None:
+            header, body = entry
+            if time.time() - header['fetched_at'] < header['fresh_for']:
+                return body
+
+        import httpx
+
+        request_headers = {}
+        if entry is not None:
+            if entry[0].get('etag'):
+                request_headers['If-None-Match'] = entry[0]['etag']
+            if entry[0].get('last_modified'):
+                request_headers['If-Modified-Since'] = entry[0]['last_modified']
+
+        self.requests += 1
+        try:
+            async with self._host_slot(urlsplit(url).hostname):
+                async with self._get_client().stream('GET', url, headers=request_headers) as response:
+                    if response.status_code == 304 and entry is not None:
+                        self.not_modified += 1
+                        header, body = entry
+                        header.update(fetched_at=time.time(), fresh_for=self._fresh_for(response))
+                        await asyncio.to_thread(self._write, key, header, body)
+                        return body
+                    if response.status_code >= 400:
+                        logger.info(f"HTTP {response.status_code} fetching {url}")
+                        raise FetchError(FETCH_FAILED)
+                    body = await self._read_body(response, url)
+        except httpx.HTTPError as e:
+            self.errors += 1
+            logger.info(f"Error fetching {url}: {e}")
+            raise FetchError(FETCH_FAILED) from e
+        except FetchError:
+            self.errors += 1
+            raise
+
+        if 'no-store' not in response.headers.get('Cache-Control', ''):
+            header = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'content_type': response.headers.get('Content-Type'),
+                'fetched_at': time.time(),
+                'fresh_for': self._fresh_for(response),
+            }
+            await asyncio.to_thread(self._write, key, header, body)
+        return body
+
+    async def fetch_many(self, urls):
+        """
+        Fetch several URLs concurrently.
+
+        Returns:
+            list: One body or FetchError per URL, in input order
+        """
+        return await asyncio.gather(*(self.fetch(url) for url in urls), return_exceptions=True)
+
+    async def _read_body(self, response, url):
+        length = response.headers.get('Content-Length')
+        too_large = f"Image is larger than {self.max_bytes} bytes"
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            logger.info(f"Image at {url} is larger than {self.max_bytes} bytes")
+            raise FetchError(too_large)
+        chunks, size = [], 0
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+            if size > self.max_bytes:
+                logger.info(f"Image at {url} is larger than {self.max_bytes} bytes")
+                raise FetchError(too_large)
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def _fresh_for(self, response):
+        for directive in response.headers.get('Cache-Control', '').split(','):
+            name, _, value = directive.strip().partition('=')
+            if name == 'no-cache':
+                return 0
+            if name == 'max-age' and value.isdigit():
+                return int(value)
+        return self.fresh_for
+
+    def _read(self, key):
+        path = self.cache.path_for(key)
+        try:
+            with open(path, 'rb') as f:
+                header = json.loads(f.readline())
+                body = f.read()
+        except (FileNotFoundError, ValueError):
+            self.cache.miss()
+            return None
+        self.cache.hit(path)
+        return header, body
+
+    def _write(self, key, header, body):
+        def write_to(f):
+            f.write(json.dumps(header).encode() + b'\n')
+            f.write(body)
+
+        self.cache.write(key, write_to)
+
+    def stats(self):
+        """Return request and cache statistics for this process."""
+        return {
+            'requests': self.requests,
+            'not_modified': self.not_modified,
+            'errors': self.errors,
+            'cache': self.cache.stats(),
+        }
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher():
+    """Return the process-wide image fetcher configured in settings."""
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                config = getattr(settings, 'ML_FETCHER', {})
+                _fetcher = ImageFetcher(
+                    config.get('CACHE_DIR', Path(settings.BASE_DIR) / 'ml_data' / 'fetched'),
+                    cache_max_bytes=config.get('CACHE_MAX_BYTES', 1024 ** 3),
+                    max_connections=config.get('MAX_CONNECTIONS', 100),
+                    max_per_host=config.get('MAX_PER_HOST', 8),
+                    timeout=config.get('TIMEOUT', 10.0),
+                    connect_timeout=config.get('CONNECT_TIMEOUT', 3.0),
+                    max_bytes=config.get('MAX_BYTES', 20 * 1024 * 1024),
+                    fresh_for=config.get('FRESH_FOR', 300),
+                    allowed_hosts=config.get('ALLOWED_HOSTS'),
+                    allow_private=config.get('ALLOW_PRIVATE_ADDRESSES', False),
+                )
+    return _fetcher
@@ -0,0 +1,1080 @@
+"""
+Inference engine for the Fashion ML Service.
+This module provides the pluggable model backends used by FashionMLService and
+the background event loop they run on.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from .admission import AdmissionController, bind_deadline
+from .batching import MicroBatcher
+from .cache import ResultCache, make_key
+from .coalescing import SingleFlight
+from .status import SlidingRate, process_rss
+
+logger = logging.getLogger(__name__)
+
+# Model keys served by the engine (mirrors FashionMLService.models)
+MODEL_KEYS = ('fashion-gen', 'style-analyzer', 'image-gen')
+
+PLACEHOLDER_IMAGE_URL = "https://placehold.co/600x800/png?text=AI+Generated+Fashion+Design"
+
+# Idea corpus shared by the deterministic and retrieval backends
+IDEA_CORPUS = {
+    'sustainable': [
+        "Eco-friendly linen blazer with recycled button details",
+        "Organic cotton wrap dress with natural dye coloration",
+        "Upcycled denim collection with minimal water usage"
+    ],
+    'summer': [
+        "Lightweight cotton sundress with adjustable straps",
+        "Breathable linen shorts with drawstring waist",
+        "Oversized beach shirt with UV protection"
+    ],
+    'default': [
+        "Contemporary silhouette with architectural influence",
+        "Textured fabric with contrasting color accents",
+        "Versatile design suitable for multiple occasions"
+    ],
+}
+
+_BACKENDS = {}
+
+# Marks the end of a stream handed between the engine loop and its consumer
+_END = object()
+
+
+def register_backend(name):
+    """
+    Register an inference backend class under a name.
+
+    Args:
+        name (str): Name used in the ML_INFERENCE settings
+
+    Returns:
+        callable: Class decorator
+    """
+    def decorator(cls):
+        cls.name = name
+        _BACKENDS[name] = cls
+        return cls
+    return decorator
+
+
+def get_backend_class(name):
+    """
+    Look up a registered backend class.
+
+    Args:
+        name (str): Registered backend name
+
+    Returns:
+        type: The backend class
+    """
+    try:
+        return _BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown inference backend '{name}'. "
+            f"Available backends: {', '.join(sorted(_BACKENDS))}"
+        )
+
+
+def available_backends():
+    """Return the names of all registered backends."""
+    return sorted(_BACKENDS)
+
+
+class LatencyModel:
+    """
+    Explicit latency model for a model call.
+
+    The cost of a call is ``base`` seconds plus ``per_item`` seconds for every
+    input after the first. Waiting is done with ``asyncio.sleep`` on the engine
+    loop, so a simulated call never pins a worker thread.
+    """
+
+    def __init__(self, base=0.0, per_item=0.0):
+        self.base = float(base)
+        self.per_item = float(per_item)
+
+    @classmethod
+    def from_setting(cls, value):
+        """Build a latency model from a number or a {'base', 'per_item'} dict."""
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, dict):
+            return cls(value.get('base', 0.0), value.get('per_item', 0.0))
+        return cls(value or 0.0)
+
+    def delay(self, batch_size=1):
+        """Return the simulated duration in seconds for a batch."""
+        return self.base + self.per_item * max(batch_size - 1, 0)
+
+    async def wait(self, batch_size=1):
+        """Yield to the event loop for the simulated duration."""
+        seconds = self.delay(batch_size)
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+
+class InferenceBackend:
+    """
+    Base class for inference backends.
+
+    Backends are batch-oriented: ``predict`` receives a list of inputs for one
+    model and returns a list of outputs in the same order.
+    """
+
+    name = None
+    supported_models = MODEL_KEYS
+
+    def __init__(self, model_dir=None, latency=None, options=None, shared_weights=True):
+        self.model_dir = Path(model_dir) if model_dir else None
+        self.latency = {
+            model: LatencyModel.from_setting(value)
+            for model, value in (latency or {}).items()
+        }
+        self.options = options or {}
+        # Memory-map weight files so worker processes share one copy
+        self.shared_weights = shared_weights
+
+    def supports(self, model):
+        """Return True if this backend can serve the given model key."""
+        return model in self.supported_models
+
+    def load(self, model):
+        """
+        Load weights for a model. Backends without weights do nothing.
+
+        Called once per model by the engine, from a worker thread, before the
+        first prediction.
+        """
+
+    def model_version(self, model):
+        """
+        Return a version string for a model's weights.
+
+        Used in result cache keys, so it must change whenever outputs can.
+        """
+        return f'{self.name}-1'
+
+    def _weights_version(self, path):
+        try:
+            return f'{self.name}-{int(path.stat().st_mtime)}'
+        except OSError:
+            return f'{self.name}-1'
+
+    async def predict(self, model, inputs):
+        """
+        Run a model over a batch of inputs.
+
+        Args:
+            model (str): Model key, e.g. 'fashion-gen'
+            inputs (list): Prompts or image URLs
+
+        Returns:
+            list: One output per input. An output may be an exception
+                instance, which fails that input only.
+        """
+        raise NotImplementedError
+
+    async def stream(self, model, value):
+        """
+        Yield the output of one input in parts, as they are produced.
+
+        A part is one element of a list output, e.g. one fashion-gen idea.
+        This runs predict and yields every part at once; backends whose
+        models generate incrementally override it.
+
+        Args:
+            model (str): Model key
+            value: Prompt or image URL
+        """
+        output = (await self.predict(model, [value]))[0]
+        if isinstance(output, Exception):
+            raise output
+        for part in output:
+            yield part
+
+    async def simulate_latency(self, model, batch_size):
+        """Wait for the configured latency of a model, if any."""
+        latency = self.latency.get(model)
+        if latency is not None:
+            await latency.wait(batch_size)
+
+
+@register_backend('stub')
+class StubBackend(InferenceBackend):
+    """
+    Deterministic backend returning canned results.
+
+    This is the default backend and reproduces the behaviour the API has always
+    had, including its simulated processing time.
+    """
+
+    async def predict(self, model, inputs):
+        await self.simulate_latency(model, len(inputs))
+        if model == 'fashion-gen':
+            return [self._ideas(prompt) for prompt in inputs]
+        if model == 'image-gen':
+            return [PLACEHOLDER_IMAGE_URL for _ in inputs]
+        if model == 'style-analyzer':
+            return [self._analysis(image_url) for image_url in inputs]
+        raise ValueError(f"Unsupported model '{model}'")
+
+    async def stream(self, model, value):
+        if model != 'fashion-gen':
+            async for part in super().stream(model, value):
+                yield part
+            return
+        # The simulated latency is spread over the ideas, as if a generator
+        # produced them one at a time
+        ideas = self._ideas(value)
+        latency = self.latency.get(model)
+        for idea in ideas:
+            if latency is not None:
+                await asyncio.sleep(latency.delay(1) / len(ideas))
+            yield idea
+
+    def _ideas(self, prompt):
+        if "sustainable" in prompt.lower():
+            return list(IDEA_CORPUS['sustainable'])
+        if "summer" in prompt.lower():
+            return list(IDEA_CORPUS['summer'])
+        return list(IDEA_CORPUS['default'])
+
+    def _analysis(self, image_url):
+        return {
+            'style_categories': ['minimalist', 'contemporary', 'casual'],
+            'color_palette': ['#f5f5f5', '#333333', '#a0a0a0'],
+            'fabric_suggestions': ['cotton', 'linen', 'silk blend'],
+            'similar_styles': ['Scandinavian minimalism', 'Japanese contemporary']
+        }
+
+
+@register_backend('sklearn')
+class SklearnBackend(InferenceBackend):
+    """
+    Local scikit-learn/NumPy backend.
+
+    'fashion-gen' is served by TF-IDF retrieval over an idea corpus. A fitted
+    vectorizer and corpus can be supplied as ``<model_dir>/fashion-gen.joblib``
+    (a dict with 'vectorizer' and 'ideas'); otherwise one is fitted on the
+    built-in corpus.
+
+    'style-analyzer' is served by the style classifier over image embeddings
+    saved as ``<model_dir>/style-analyzer.joblib`` (see style_classifier.py;
+    ``manage.py classify_items --train`` writes it).
+    """
+
+    supported_models = ('fashion-gen', 'style-analyzer')
+
+    def supports(self, model):
+        if model == 'style-analyzer':
+            return self.model_dir is not None and (self.model_dir / f'{model}.joblib').exists()
+        return super().supports(model)
+
+    def model_version(self, model):
+        if self.model_dir is None:
+            return super().model_version(model)
+        return self._weights_version(self.model_dir / f'{model}.joblib')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._vectorizer = None
+        self._ideas = None
+        self._matrix = None
+        self._classifier = None
+        self._lock = threading.Lock()
+
+    def load(self, model):
+        if model == 'style-analyzer':
+            self._load_classifier(model)
+            return
+        with self._lock:
+            if self._vectorizer is not None:
+                return
+            path = self.model_dir / f'{model}.joblib' if self.model_dir else None
+            if path is not None and path.exists():
+                from .weights import load_joblib
+                bundle = load_joblib(path, shared=self.shared_weights)
+                vectorizer, ideas = bundle['vectorizer'], list(bundle['ideas'])
+                matrix = vectorizer.transform(ideas)
+            else:
+                from sklearn.feature_extraction.text import TfidfVectorizer
+                ideas = [idea for group in IDEA_CORPUS.values() for idea in group]
+                vectorizer = TfidfVectorizer(stop_words='english')
+                matrix = vectorizer.fit_transform(ideas)
+            self._ideas, self._matrix = ideas, matrix
+            self._vectorizer = vectorizer
+            logger.info(f"Loaded sklearn model for {model} ({len(ideas)} ideas)")
+
+    def _load_classifier(self, model):
+        with self._lock:
+            if self._classifier is not None:
+                return
+            from .style_classifier import StyleClassifier
+
+            classifier = StyleClassifier.load(
+                self.model_dir / f'{model}.joblib', shared=self.shared_weights
+            )
+            self._classifier = classifier
+            logger.info(
+                f"Loaded {classifier.kind} style classifier for {model} "
+                f"({len(classifier.categories)} categories)"
+            )
+
+    async def predict(self, model, inputs):
+        if model == 'style-analyzer':
+            await self.simulate_latency(model, len(inputs))
+            sources = await asyncio.gather(
+                *(_image_source(image_url) for image_url in inputs), return_exceptions=True
+            )
+            return await asyncio.to_thread(self._analyze, sources)
+        if model != 'fashion-gen':
+            raise ValueError(f"Unsupported model '{model}'")
+        await self.simulate_latency(model, len(inputs))
+        return await asyncio.to_thread(self._retrieve, inputs)
+
+    def _analyze(self, sources):
+        outputs, positions, vectors = _embed_sources(sources)
+        if positions:
+            for i, output in zip(positions, self._classifier.analyze(vectors)):
+                outputs[i] = output
+        return outputs
+
+    def _retrieve(self, prompts, top_k=3):
+        import numpy as np
+
+        scores = (self._vectorizer.transform(prompts) @ self._matrix.T).toarray()
+        top = np.argsort(-scores, axis=1)[:, :top_k]
+        return [[self._ideas[i] for i in row] for row in top]
+
+
+def _media_path(image_url):
+    """
+    Map a MEDIA_URL image URL to its file under MEDIA_ROOT.
+
+    The URL may be relative or absolute with one of this site's hosts
+    (settings.ALLOWED_HOSTS).
+
+    Returns:
+        Path: The local file, or None if the URL is not a local media URL
+
+    Raises:
+        ValueError: If the URL is a local media URL without a file
+    """
+    from urllib.parse import unquote, urlparse
+
+    from django.conf import settings
+    from django.http.request import validate_host
+
+    parts = urlparse(image_url)
+    if parts.hostname and not validate_host(parts.hostname, settings.ALLOWED_HOSTS):
+        return None
+    url_path = unquote(parts.path)
+    if not url_path.startswith(settings.MEDIA_URL):
+        if parts.hostname:
+            return None
+        raise ValueError(f"Not a media URL: {image_url}")
+    media_root = Path(settings.MEDIA_ROOT).resolve()
+    path = (media_root / url_path[len(settings.MEDIA_URL):]).resolve()
+    if media_root not in path.parents or not path.is_file():
+        raise ValueError(f"Image not found: {image_url}")
+    return path
+
+
+async def _image_source(image_url):
+    """Return the local media file of an image URL, or the bytes of a remote image."""
+    path = _media_path(image_url)
+    if path is not None:
+        return path
+    from .fetcher import get_fetcher
+    return await get_fetcher().fetch(image_url)
+
+
+def _embed_source(source):
+    from .ingestion import load_tensor, tensor_path
+    from .similarity import embed_tensor
+    from .tensor_cache import tensor_for_bytes
+
+    # Ingested images have a stored tensor; anything else is preprocessed
+    # once and then served from the tensor cache
+    if isinstance(source, bytes):
+        return embed_tensor(tensor_for_bytes(source))
+    stored = tensor_path(source)
+    if stored is not None:
+        return embed_tensor(load_tensor(stored))
+    return embed_tensor(tensor_for_bytes(source.read_bytes()))
+
+
+def _embed_sources(sources):
+    """
+    Embed the images returned by _image_source.
+
+    Args:
+        sources (list): Paths or bytes; exceptions for images that could not
+            be fetched
+
+    Returns:
+        tuple: (outputs, positions, vectors) where outputs holds an exception
+            for every image that failed, positions the indices of the images
+            that were embedded and vectors their (n, d) embeddings
+    """
+    import numpy as np
+
+    outputs = list(sources)
+    positions, vectors = [], []
+    for i, source in enumerate(sources):
+        if isinstance(source, Exception):
+            continue
+        try:
+            vectors.append(_embed_source(source))
+            positions.append(i)
+        except (OSError, ValueError) as e:
+            outputs[i] = ValueError(f"Cannot read image: {e}")
+    return outputs, positions, np.stack(vectors) if vectors else None
+
+
+@register_backend('knn')
+class KNNBackend(InferenceBackend):
+    """
+    Nearest-neighbour style classifier over image embeddings.
+
+    'style-analyzer' is served from ``<model_dir>/style-analyzer/``:
+
+    - embeddings.npy: (n, d) float32 unit-length reference embeddings, in the
+      format of similarity.embed_image
+    - labels.npy: (n,) int32 category index of each reference
+    - metadata.json: {'categories': [...], 'k': 15}
+
+    The reference matrix is memory-mapped when weights are shared, so all
+    workers use the same physical pages however large it grows. Images on
+    other hosts are downloaded concurrently through the image fetcher.
+    """
+
+    supported_models = ('style-analyzer',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def supports(self, model):
+        return (
+            model in self.supported_models
+            and self.model_dir is not None
+            and (self.model_dir / model / 'embeddings.npy').exists()
+        )
+
+    def model_version(self, model):
+        return self._weights_version(self.model_dir / model / 'embeddings.npy')
+
+    def load(self, model):
+        with self._lock:
+            if model in self._models:
+                return
+            from .weights import load_arrays, load_metadata, nbytes
+
+            directory = self.model_dir / model
+            arrays = load_arrays(directory, shared=self.shared_weights)
+            metadata = load_metadata(directory)
+            self._models[model] = {
+                'embeddings': arrays['embeddings'],
+                'labels': arrays['labels'],
+                'categories': metadata['categories'],
+                'k': metadata.get('k', 15),
+            }
+            logger.info(
+                f"Loaded kNN model for {model} ({len(arrays['labels'])} references, "
+                f"{nbytes(arrays) / 2**20:.1f} MiB, shared={self.shared_weights})"
+            )
+
+    async def predict(self, model, inputs):
+        if model != 'style-analyzer':
+            raise ValueError(f"Unsupported model '{model}'")
+        await self.simulate_latency(model, len(inputs))
+        sources = await asyncio.gather(
+            *(_image_source(image_url) for image_url in inputs), return_exceptions=True
+        )
+        return await asyncio.to_thread(self._classify, model, sources)
+
+    def _classify(self, model, sources, top_n=3):
+        import numpy as np
+
+        outputs, positions, vectors = _embed_sources(sources)
+        if not positions:
+            return outputs
+
+        weights = self._models[model]
+        scores = vectors @ weights['embeddings'].T
+        k = min(weights['k'], scores.shape[1])
+        neighbours = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        # Similarity-weighted vote of the k nearest references
+        categories = weights['categories']
+        votes = np.zeros((len(vectors), len(categories)), dtype=np.float32)
+        rows = np.arange(len(vectors))[:, None]
+        np.add.at(
+            votes,
+            (rows, weights['labels'][neighbours]),
+            np.take_along_axis(scores, neighbours, axis=1),
+        )
+        votes /= np.maximum(votes.sum(axis=1, keepdims=True), 1e-12)
+        for i, row in zip(positions, votes):
+            order = np.argsort(-row)[:top_n]
+            outputs[i] = {
+                'style_categories': [categories[c] for c in order if row[c] > 0],
+                'scores': {categories[c]: round(float(row[c]), 4) for c in order if row[c] > 0},
+            }
+        return outputs
+
+
+@register_backend('tensorflow')
+class TensorFlowBackend(InferenceBackend):
+    """
+    TensorFlow SavedModel backend.
+
+    Each model is loaded from ``<model_dir>/<model>`` and called through its
+    ``serving_default`` signature with a string tensor of inputs:
+
+    - 'fashion-gen' returns an 'ideas' string tensor of shape (batch, n)
+    - 'image-gen' returns an 'images' uint8 tensor of shape (batch, h, w, 3),
+      which is written under MEDIA_ROOT/generated/
+    - 'style-analyzer' returns a 'style_categories' string tensor of shape
+      (batch, n)
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def supports(self, model):
+        return (
+            model in self.supported_models
+            and self.model_dir is not None
+            and (self.model_dir / model).exists()
+        )
+
+    def model_version(self, model):
+        return self._weights_version(self.model_dir / model)
+
+    def load(self, model):
+        with self._lock:
+            if model in self._models:
+                return
+            import tensorflow as tf
+
+            path = self.model_dir / model
+            self._models[model] = tf.saved_model.load(str(path))
+            logger.info(f"Loaded TensorFlow model for {model} from {path}")
+
+    async def predict(self, model, inputs):
+        await self.simulate_latency(model, len(inputs))
+        return await asyncio.to_thread(self._run, model, inputs)
+
+    def _run(self, model, inputs):
+        import tensorflow as tf
+
+        outputs = self._models[model].signatures['serving_default'](tf.constant(inputs))
+        if model == 'fashion-gen':
+            return [[idea.decode() for idea in row] for row in outputs['ideas'].numpy()]
+        if model == 'image-gen':
+            return [
+                self._save_image(prompt, pixels)
+                for prompt, pixels in zip(inputs, outputs['images'].numpy())
+            ]
+        categories = outputs['style_categories'].numpy()
+        return [
+            {'style_categories': [category.decode() for category in row]}
+            for row in categories
+        ]
+
+    def _save_image(self, prompt, pixels):
+        from django.conf import settings
+        from PIL import Image
+
+        name = hashlib.sha256(prompt.encode()).hexdigest()[:16] + '.png'
+        directory = Path(settings.MEDIA_ROOT) / 'generated'
+        directory.mkdir(parents=True, exist_ok=True)
+        Image.fromarray(pixels).save(directory / name)
+        return f"{settings.MEDIA_URL}generated/{name}"
+
+
+class ModelHandle:
+    """
+    Load state and live usage counters of one model.
+
+    Weights are loaded at most once per process: concurrent callers wait on a
+    lock while the first one loads.
+    """
+
+    UNLOADED = 'unloaded'
+    LOADING = 'loading'
+    LOADED = 'loaded'
+    FAILED = 'failed'
+
+    def __init__(self, name, backend):
+        self.name = name
+        self.backend = backend
+        self.state = self.UNLOADED
+        self.load_time = None
+        self.loaded_at = None
+        self.error = None
+        self.load_rss_delta = None
+        self.requests = SlidingRate()
+        self.errors = 0
+        self.last_error = None
+        self.last_error_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.state == self.LOADED
+
+    def load(self):
+        """Load the model's weights unless they are already loaded."""
+        if self.loaded:
+            return
+        with self._lock:
+            if self.loaded:
+                return
+            self.state = self.LOADING
+            started = time.perf_counter()
+            rss_before = process_rss()
+            try:
+                self.backend.load(self.name)
+            except Exception as e:
+                self.state = self.FAILED
+                self.error = str(e)
+                raise
+            self.load_time = time.perf_counter() - started
+            rss_after = process_rss()
+            if rss_before is not None and rss_after is not None:
+                # Memory-mapped weights are only counted once their pages are read
+                self.load_rss_delta = max(rss_after - rss_before, 0)
+            self.loaded_at = time.time()
+            self.error = None
+            self.state = self.LOADED
+
+    def record_error(self, error):
+        """Remember the most recent failure of this model."""
+        self.errors += 1
+        self.last_error = f'{type(error).__name__}: {error}'
+        self.last_error_at = time.time()
+
+    def as_dict(self):
+        return {
+            'load_state': self.state,
+            'load_time_s': round(self.load_time, 4) if self.load_time is not None else None,
+            'loaded_at': self.loaded_at,
+            'load_error': self.error,
+            'load_rss_delta_bytes': self.load_rss_delta,
+            'requests': self.requests.total,
+            'requests_per_second': self.requests.rates(),
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'last_error_at': self.last_error_at,
+        }
+
+
+class InferenceEngine:
+    """
+    Routes model calls to backends and runs them on a background event loop.
+
+    All inference runs on one asyncio loop owned by the engine. Sync callers
+    block on a future while async callers await it, so waiting backends yield
+    instead of tying up a thread each.
+    """
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.default_backend = config.get('BACKEND', 'stub')
+        self.model_backends = dict(config.get('BACKENDS', {}))
+        model_dir = config.get('MODEL_DIR')
+        latency = config.get('LATENCY', {})
+        options = config.get('OPTIONS', {})
+        shared_weights = config.get('SHARED_WEIGHTS', True)
+
+        self._backends = {}
+        for name in {self.default_backend, 'stub', *self.model_backends.values()}:
+            self._backends[name] = get_backend_class(name)(
+                model_dir=model_dir,
+                # Simulated latency only applies to the stub backend
+                latency=latency if name == 'stub' else {},
+                options=options.get(name, {}),
+                shared_weights=shared_weights,
+            )
+
+        self.batching = dict(config.get('BATCHING', {}))
+        self.admission = dict(config.get('ADMISSION', {}))
+        self.coalescing = dict(config.get('COALESCING', {}))
+        cache_config = config.get('RESULT_CACHE', {})
+        self.cache = None
+        if cache_config.get('ENABLED', True):
+            self.cache = ResultCache(
+                ttl=cache_config.get('TTL', 300),
+                max_bytes=cache_config.get('MAX_BYTES', 16 * 1024 * 1024),
+                alias=cache_config.get('ALIAS'),
+            )
+        self._batchers = {}
+        self._admission = {}
+        self._flights = None
+        self._routes = {}
+        self._handles = {}
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def backend_for(self, model):
+        """
+        Return the backend serving a model.
+
+        Falls back to the stub backend when the configured backend cannot serve
+        the model (e.g. no weights on disk).
+        """
+        backend = self._routes.get(model)
+        if backend is None:
+            name = self.model_backends.get(model, self.default_backend)
+            backend = self._backends[name]
+            if not backend.supports(model):
+                logger.warning(f"Backend '{name}' cannot serve {model}, using stub backend")
+                backend = self._backends['stub']
+            self._routes[model] = backend
+        return backend
+
+    def handle(self, model):
+        """Return the load-state handle of a model."""
+        handle = self._handles.get(model)
+        if handle is None:
+            with self._lock:
+                handle = self._handles.get(model)
+                if handle is None:
+                    handle = ModelHandle(model, self.backend_for(model))
+                    self._handles[model] = handle
+        return handle
+
+    def preload(self, models=MODEL_KEYS):
+        """
+        Load the weights of the given models in the calling thread.
+
+        Does not start the engine loop, so it is safe to call in a gunicorn
+        master before workers are forked.
+        """
+        for model in models:
+            self.handle(model).load()
+
+    @property
+    def loop(self):
+        """The engine event loop, started on first use and after a fork."""
+        if self._loop is None or self._pid != os.getpid():
+            with self._lock:
+                if self._loop is None or self._pid != os.getpid():
+                    self._start_loop()
+        return self._loop
+
+    def _start_loop(self):
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(ready.set)
+            loop.run_forever()
+
+        thread = threading.Thread(target=run, name='ml-inference-loop', daemon=True)
+        thread.start()
+        ready.wait()
+        self._loop, self._thread, self._pid = loop, thread, os.getpid()
+        # Batchers, admission queues and flights are bound to the loop they were
+        # created on
+        self._batchers = {}
+        self._admission = {}
+        self._flights = None
+
+    def batcher_for(self, model):
+        """
+        Return the micro-batcher for a model, or None if batching is disabled.
+
+        Must be called on the engine loop.
+        """
+        if not self.batching.get('ENABLED', True):
+            return None
+        batcher = self._batchers.get(model)
+        if batcher is None:
+            options = {**self.batching, **self.batching.get('MODELS', {}).get(model, {})}
+            backend = self.backend_for(model)
+
+            async def run_batch(inputs):
+                return await backend.predict(model, inputs)
+
+            batcher = MicroBatcher(
+                run_batch,
+                max_batch_size=options.get('MAX_BATCH_SIZE', 16),
+                max_wait_ms=options.get('MAX_WAIT_MS', 5),
+                name=model,
+            )
+            self._batchers[model] = batcher
+        return batcher
+
+    def admission_for(self, model):
+        """
+        Return the admission controller for a model, or None if admission
+        control is disabled.
+
+        Must be called on the engine loop.
+        """
+        if not self.admission.get('ENABLED', True):
+            return None
+        controller = self._admission.get(model)
+        if controller is None:
+            options = {**self.admission, **self.admission.get('MODELS', {}).get(model, {})}
+            controller = AdmissionController(
+                model,
+                max_concurrency=options.get('MAX_CONCURRENCY', 16),
+                max_queue=options.get('MAX_QUEUE', 64),
+            )
+            self._admission[model] = controller
+        return controller
+
+    @property
+    def flights(self):
+        """
+        The single-flight group coalescing identical calls, or None if
+        coalescing is disabled.
+
+        Must be used on the engine loop.
+        """
+        if not self.coalescing.get('ENABLED', True):
+            return None
+        if self._flights is None:
+            shared = self.cache is not None and self.cache.shared is not None
+            self._flights = SingleFlight(
+                lock_alias=self.coalescing.get('LOCK_ALIAS'),
+                lookup=self.cache.get_shared if shared else None,
+                lock_timeout=self.coalescing.get('LOCK_TIMEOUT', 60),
+                poll_interval=self.coalescing.get('POLL_INTERVAL_MS', 50) / 1000,
+            )
+        return self._flights
+
+    def coalescing_stats(self):
+        """Return coalescing counters, or None before the first model call."""
+        return self._flights.stats() if self._flights is not None else None
+
+    def admission_stats(self, model):
+        """Return concurrency, queue and rejection counts for a model."""
+        controller = self._admission.get(model)
+        return controller.stats() if controller is not None else None
+
+    def batch_stats(self, model):
+        """Return batch size and queue-wait metrics for a model."""
+        batcher = self._batchers.get(model)
+        if batcher is None:
+            return None
+        return {**batcher.stats.as_dict(), 'queue_depth': batcher.queue_depth}
+
+    def model_version(self, model):
+        """Return the version of the weights serving a model."""
+        return self.backend_for(model).model_version(model)
+
+    async def _predict(self, model, inputs):
+        inputs = list(inputs)
+        handle = self.handle(model)
+        handle.requests.record(len(inputs))
+        try:
+            return await self._cached_predict(model, inputs)
+        except Exception as e:
+            handle.record_error(e)
+            raise
+
+    async def _cached_predict(self, model, inputs):
+        flights = self.flights
+        if self.cache is None and flights is None:
+            return await self._infer(model, inputs)
+
+        version = self.model_version(model)
+        keys = [make_key(model, version, item) for item in inputs]
+        if self.cache is not None:
+            results = await self.cache.aget_many(keys, model)
+        else:
+            results = [None] * len(keys)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+
+        async def compute(positions):
+            indexes = [missing[position] for position in positions]
+            outputs = await self._infer(model, [inputs[i] for i in indexes])
+            if self.cache is not None:
+                await self.cache.aset_many(
+                    [(keys[i], output) for i, output in zip(indexes, outputs)]
+                )
+            return outputs
+
+        if flights is None:
+            outputs = await compute(range(len(missing)))
+        else:
+            # Identical calls already in flight, here or in another process,
+            # are awaited instead of computed again
+            outputs = await flights.run(model, [keys[i] for i in missing], compute)
+        for i, output in zip(missing, outputs):
+            results[i] = output
+        return results
+
+    async def _infer(self, model, inputs):
+        admission = self.admission_for(model)
+        if admission is None:
+            return await self._call_model(model, inputs)
+        async with admission.slot():
+            return await self._call_model(model, inputs)
+
+    async def _call_model(self, model, inputs):
+        handle = self.handle(model)
+        if not handle.loaded:
+            # Load off the loop so other models keep serving meanwhile
+            await asyncio.to_thread(handle.load)
+        batcher = self.batcher_for(model)
+        if batcher is None:
+            outputs = await self.backend_for(model).predict(model, list(inputs))
+            for output in outputs:
+                if isinstance(output, Exception):
+                    raise output
+            return outputs
+        return list(await asyncio.gather(*(batcher.submit(item) for item in inputs)))
+
+    def submit(self, coro):
+        """
+        Schedule a coroutine on the engine loop and return a concurrent future.
+
+        The caller's request deadline, if any, applies to the coroutine.
+        """
+        return asyncio.run_coroutine_threadsafe(bind_deadline(coro), self.loop)
+
+    def run(self, coro):
+        """Run a coroutine on the engine loop, blocking the calling thread."""
+        return self.submit(coro).result()
+
+    async def arun(self, coro):
+        """
+        Await a coroutine on the engine loop from any event loop.
+
+        Coroutines awaited from the engine loop itself run inline.
+        """
+        if asyncio.get_running_loop() is self._loop:
+            return await coro
+        return await asyncio.wrap_future(self.submit(coro))
+
+    def predict(self, model, inputs):
+        """
+        Run a model over a batch of inputs, blocking the calling thread.
+
+        Args:
+            model (str): Model key
+            inputs (list): Model inputs
+
+        Returns:
+            list: One output per input
+        """
+        return self.run(self._predict(model, inputs))
+
+    async def apredict(self, model, inputs):
+        """Async variant of predict that awaits the engine loop."""
+        return await self.arun(self._predict(model, inputs))
+
+    async def _stream(self, model, value):
+        # One input is streamed on its own: parts are not micro-batched or
+        # coalesced, but a cached result is replayed and a finished stream
+        # fills the cache for later calls
+        handle = self.handle(model)
+        handle.requests.record(1)
+        key = None
+        if self.cache is not None:
+            key = make_key(model, self.model_version(model), value)
+            cached = await self.cache.aget(key, model)
+            if cached is not None:
+                for part in cached:
+                    yield part
+                return
+        parts = []
+        try:
+            if not handle.loaded:
+                await asyncio.to_thread(handle.load)
+            admission = self.admission_for(model)
+            async with admission.slot() if admission is not None else contextlib.nullcontext():
+                async for part in self.backend_for(model).stream(model, value):
+                    parts.append(part)
+                    yield part
+        except Exception as e:
+            handle.record_error(e)
+            raise
+        if key is not None:
+            await self.cache.aset(key, parts)
+
+    async def _pump(self, model, value, put):
+        # Run a stream on the engine loop, handing (part, error) pairs to put
+        try:
+            async for part in self._stream(model, value):
+                put((part, None))
+        except Exception as e:
+            put((_END, e))
+        else:
+            put((_END, None))
+
+    def stream(self, model, value):
+        """
+        Iterate over the output parts of a model for one input as they are
+        produced, blocking the calling thread between parts.
+
+        Args:
+            model (str): Model key
+            value: Model input
+
+        Yields:
+            Output parts, e.g. ideas
+        """
+        parts = queue.Queue()
+        future = self.submit(self._pump(model, value, parts.put))
+        try:
+            while True:
+                part, error = parts.get()
+                if error is not None:
+                    raise error
+                if part is _END:
+                    return
+                yield part
+        finally:
+            # The client went away or the stream ended; stop generating
+            future.cancel()
+
+    async def astream(self, model, value):
+        """Async variant of stream that awaits parts from any event loop."""
+        if asyncio.get_running_loop() is self._loop:
+            async for part in self._stream(model, value):
+                yield part
+            return
+        loop = asyncio.get_running_loop()
+        parts = asyncio.Queue()
+        future = self.submit(
+            self._pump(model, value, lambda item: loop.call_soon_threadsafe(parts.put_nowait, item))
+        )
+        try:
+            while True:
+                part, error = await parts.get()
+                if error is not None:
+                    raise error
+                if part is _END:
+                    return
+                yield part
+        finally:
+            future.cancel()
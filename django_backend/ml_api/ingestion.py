@@ -0,0 +1,182 @@
+"""
+Image ingestion for FashionItem uploads.
+Each upload is decoded once, at reduced scale where the format allows it, into
+a JPEG thumbnail and a fixed-size float32 model-input tensor. Both are stored
+next to the original so analysis never decodes the full-resolution image again.
+"""
+
+import io
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'ML_INGESTION', {})
+
+# Longest side of the stored thumbnail
+THUMBNAIL_SIDE = _config.get('THUMBNAIL_SIDE', 256)
+# Side of the square (side, side, 3) model-input tensor
+TENSOR_SIDE = _config.get('TENSOR_SIDE', 224)
+# Largest image, in pixels, accepted in formats Pillow cannot decode at
+# reduced scale; JPEGs are decoded at up to 1/8 scale instead
+MAX_PIXELS = _config.get('MAX_PIXELS', 50_000_000)
+
+
+def derivative_names(name):
+    """
+    Storage names of the derivatives of an image.
+
+    Args:
+        name (str): Storage name of the original, e.g. 'fashion_items/a.png'
+
+    Returns:
+        dict: {'thumbnail': 'fashion_items/a.png.thumb.jpg',
+            'tensor': 'fashion_items/a.png.tensor.npy'}
+    """
+    # The original extension is kept so a.jpg and a.png do not collide
+    return {
+        'thumbnail': f'{name}.thumb.jpg',
+        'tensor': f'{name}.tensor.npy',
+    }
+
+
+def process_image(source):
+    """
+    Decode an image once into a thumbnail and a model-input tensor.
+
+    Only the header is read before the decode size is chosen. JPEGs are then
+    decoded directly at the smallest DCT scale that still covers the outputs,
+    so peak memory follows the output size rather than the upload size.
+
+    Args:
+        source: A path or file object
+
+    Returns:
+        tuple: (thumbnail PIL image, float32 array of shape
+            (TENSOR_SIDE, TENSOR_SIDE, 3) with values in [0, 1])
+
+    Raises:
+        ValueError: If the image is too large to decode in its format
+    """
+    side = max(THUMBNAIL_SIDE, TENSOR_SIDE)
+    with Image.open(source) as image:
+        if image.format == 'JPEG':
+            image.draft('RGB', (side, side))
+        elif image.width * image.height > MAX_PIXELS:
+            raise ValueError(
+                f"{image.format} image of {image.width}x{image.height} exceeds "
+                f"{MAX_PIXELS} pixels"
+            )
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    # Reduce by an integer factor before resampling, like Image.thumbnail
+    factor = min(image.width, image.height) // (2 * side)
+    if factor > 1:
+        image = image.reduce(factor)
+
+    tensor_image = ImageOps.fit(image, (TENSOR_SIDE, TENSOR_SIDE), Image.Resampling.BILINEAR)
+    tensor = np.asarray(tensor_image, dtype=np.float32) / 255.0
+    image.thumbnail((THUMBNAIL_SIDE, THUMBNAIL_SIDE), Image.Resampling.BILINEAR)
+    return image, tensor
+
+
+def ingest(item):
+    """
+    Create the thumbnail and tensor of a FashionItem's image.
+
+    Existing derivatives are replaced, so this also refreshes them after the
+    image changes.
+
+    Returns:
+        dict: Storage names of the derivatives, as derivative_names
+    """
+    storage = item.image.storage
+    with item.image.open('rb') as image_file:
+        thumbnail, tensor = process_image(image_file)
+
+    names = derivative_names(item.image.name)
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format='JPEG', quality=90)
+    _replace(storage, names['thumbnail'], buffer.getvalue())
+    buffer = io.BytesIO()
+    np.save(buffer, tensor, allow_pickle=False)
+    _replace(storage, names['tensor'], buffer.getvalue())
+    logger.info(f"Ingested image for item {item.pk}")
+    return names
+
+
+def _replace(storage, name, content):
+    # Storage.save renames on collision; derivative names must stay fixed
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, ContentFile(content))
+
+
+def has_derivatives(item):
+    """Return True if the item's thumbnail and tensor exist."""
+    storage = item.image.storage
+    return all(storage.exists(name) for name in derivative_names(item.image.name).values())
+
+
+def delete_derivatives(item):
+    """Remove the thumbnail and tensor of an item, if any."""
+    storage = item.image.storage
+    for name in derivative_names(item.image.name).values():
+        if storage.exists(name):
+            storage.delete(name)
+
+
+def open_analysis_image(item):
+    """
+    Open the image analysis should decode: the thumbnail if it exists,
+    otherwise the original.
+
+    Returns:
+        File: An open binary file, to be used as a context manager
+    """
+    storage = item.image.storage
+    name = derivative_names(item.image.name)['thumbnail']
+    if storage.exists(name):
+        return storage.open(name, 'rb')
+    return item.image.open('rb')
+
+
+def item_tensor(item):
+    """
+    Return the model-input tensor of a FashionItem's image.
+
+    Uses the tensor stored at ingestion, and otherwise preprocesses the
+    original through the tensor cache.
+
+    Returns:
+        numpy.ndarray: (TENSOR_SIDE, TENSOR_SIDE, 3) float32 tensor
+    """
+    from .tensor_cache import tensor_for_bytes
+
+    storage = item.image.storage
+    name = derivative_names(item.image.name)['tensor']
+    if storage.exists(name):
+        with storage.open(name, 'rb') as tensor_file:
+            return np.load(tensor_file, allow_pickle=False)
+    with item.image.open('rb') as image_file:
+        return tensor_for_bytes(image_file.read())
+
+
+def tensor_path(image_path):
+    """
+    Return the tensor file stored next to a local image file, or None.
+
+    Args:
+        image_path (Path): Path of an original image under MEDIA_ROOT
+    """
+    path = image_path.with_name(f'{image_path.name}.tensor.npy')
+    return path if path.is_file() else None
+
+
+def load_tensor(path):
+    """Memory-map a stored model-input tensor read-only."""
+    return np.load(path, mmap_mode='r', allow_pickle=False)
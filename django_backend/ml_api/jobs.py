@@ -0,0 +1,328 @@
+"""
+Background job runner for long-running ML requests.
+Jobs are persisted as InferenceJob rows and executed by a bounded thread or
+process pool, so a request can return a job id immediately and clients poll
+for the result. Each worker records itself as the owner of the jobs it runs
+and refreshes their heartbeat; jobs whose heartbeat stops are requeued by the
+other workers.
+"""
+
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .metrics import JOBS_PENDING
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Raised when the job runner has no room for another pending job."""
+
+
+TRAIN_SIMILARITY_INDEX = 'train-similarity-index'
+
+
+def _generate_image(prompt):
+    from .ml_service import ml_service
+    return ml_service.generate_image(prompt)
+
+
+def _train_similarity_index():
+    from .similarity import get_similarity_index
+
+    index = get_similarity_index()
+    trained = index.train_if_needed()
+    return {'trained': trained, 'items': len(index.store)}
+
+
+# Job kind -> callable taking the job payload as keyword arguments
+JOB_HANDLERS = {
+    'generate-image': _generate_image,
+    TRAIN_SIMILARITY_INDEX: _train_similarity_index,
+}
+
+
+def _init_process_worker():
+    import django
+    django.setup()
+
+
+def worker_id():
+    """Return the '<host>:<pid>' identifying this process as a job owner."""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def execute_job(job_id, owner):
+    """
+    Claim and run a single job.
+
+    Only a pending job can be claimed, so a job recovered by several workers
+    still runs once, and a job cancelled while queued is skipped.
+
+    Args:
+        job_id (UUID): Primary key of the InferenceJob
+        owner (str): worker_id() of the runner whose heartbeat keeps the job
+            alive; with the process executor, the process that queued it
+    """
+    from .models import InferenceJob
+
+    close_old_connections()
+    try:
+        now = timezone.now()
+        claimed = InferenceJob.objects.filter(
+            id=job_id, status=InferenceJob.STATUS_PENDING
+        ).update(
+            status=InferenceJob.STATUS_RUNNING,
+            started_at=now,
+            owner=owner,
+            heartbeat_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if not claimed:
+            return
+
+        job = InferenceJob.objects.get(id=job_id)
+        try:
+            result = JOB_HANDLERS[job.kind](**job.payload)
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed")
+            InferenceJob.objects.filter(
+                id=job_id, status=InferenceJob.STATUS_RUNNING
+            ).update(
+                status=InferenceJob.STATUS_FAILED,
+                error=str(e),
+                finished_at=timezone.now(),
+            )
+            return
+
+        # A job cancelled while running keeps its cancelled status
+        InferenceJob.objects.filter(
+            id=job_id, status=InferenceJob.STATUS_RUNNING
+        ).update(
+            status=InferenceJob.STATUS_SUCCEEDED,
+            result=result,
+            finished_at=timezone.now(),
+        )
+    finally:
+        close_old_connections()
+
+
+class JobRunner:
+    """
+    Bounded pool executing InferenceJob rows.
+
+    start() runs once per worker process: it requeues the jobs left behind by
+    dead workers and starts a thread that refreshes the heartbeat of the jobs
+    this process runs and requeues jobs whose heartbeat has gone stale.
+
+    Args:
+        executor (str): 'thread' or 'process'
+        workers (int): Pool size
+        max_pending (int): Maximum jobs queued or running in this process
+        stale_after (int): Seconds without a heartbeat after which a running
+            job is considered abandoned by a dead worker and requeued
+        heartbeat_interval (int): Seconds between heartbeats
+    """
+
+    def __init__(self, executor='thread', workers=2, max_pending=100, stale_after=60,
+                 heartbeat_interval=10):
+        self.executor_type = executor
+        self.workers = workers
+        self.max_pending = max_pending
+        self.stale_after = stale_after
+        self.heartbeat_interval = heartbeat_interval
+        self.owner = None
+        self._pool = None
+        self._started_pid = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    if self.executor_type == 'process':
+                        self._pool = ProcessPoolExecutor(
+                            max_workers=self.workers,
+                            mp_context=multiprocessing.get_context('spawn'),
+                            initializer=_init_process_worker,
+                        )
+                    else:
+                        self._pool = ThreadPoolExecutor(
+                            max_workers=self.workers,
+                            thread_name_prefix='ml-job',
+                        )
+        return self._pool
+
+    def submit(self, kind, payload, user=None):
+        """
+        Persist a new job and queue it for execution.
+
+        Args:
+            kind (str): Job kind, a key of JOB_HANDLERS
+            payload (dict): Keyword arguments for the handler
+            user (User, optional): Owner of the job
+
+        Returns:
+            InferenceJob: The pending job
+
+        Raises:
+            JobQueueFull: If max_pending jobs are already queued
+        """
+        from .models import InferenceJob
+
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        # Normally already started when the worker started
+        self.start()
+        if not self._slots.acquire(blocking=False):
+            raise JobQueueFull('Too many pending jobs, try again later')
+        try:
+            job = InferenceJob.objects.create(kind=kind, payload=payload, user=user)
+        except Exception:
+            self._slots.release()
+            raise
+        self._enqueue(job.id)
+        return job
+
+    def cancel(self, job):
+        """
+        Cancel a pending or running job.
+
+        A running job cannot be interrupted; its result is discarded instead.
+
+        Returns:
+            bool: True if the job was cancelled
+        """
+        from .models import InferenceJob
+
+        return bool(InferenceJob.objects.filter(
+            id=job.id,
+            status__in=[InferenceJob.STATUS_PENDING, InferenceJob.STATUS_RUNNING],
+        ).update(status=InferenceJob.STATUS_CANCELLED, finished_at=timezone.now()))
+
+    def start(self):
+        """
+        Recover abandoned jobs and start the heartbeat thread, once per process.
+
+        Called from the gunicorn post_worker_init hook, and by submit() in
+        servers without it.
+        """
+        with self._lock:
+            # The pool and the thread of a preloading master do not survive
+            # the fork, so each worker starts its own
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            self.owner = worker_id()
+            self._pool = None
+        try:
+            self.recover()
+        except Exception:
+            logger.exception('Could not recover ML jobs')
+        finally:
+            close_old_connections()
+        threading.Thread(target=self._heartbeat_loop, name='ml-job-heartbeat', daemon=True).start()
+
+    def recover(self):
+        """
+        Requeue the pending jobs and the running jobs of dead workers.
+
+        Running jobs whose heartbeat is older than stale_after are reset to
+        pending first. Another worker may queue the same jobs; only one of
+        them claims each job.
+        """
+        from .models import InferenceJob
+
+        self.requeue_stale()
+        pending = InferenceJob.objects.filter(
+            status=InferenceJob.STATUS_PENDING
+        ).order_by('created_at').values_list('id', flat=True)
+        recovered = self._enqueue_all(pending.iterator())
+        if recovered:
+            logger.info(f"Queued {recovered} pending ML jobs")
+
+    def requeue_stale(self):
+        """
+        Reset running jobs without a recent heartbeat to pending.
+
+        Returns:
+            list: Ids of the jobs found stale
+        """
+        from .models import InferenceJob
+
+        cutoff = timezone.now() - timedelta(seconds=self.stale_after)
+        stale = InferenceJob.objects.filter(
+            Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+            status=InferenceJob.STATUS_RUNNING,
+        )
+        job_ids = list(stale.values_list('id', flat=True))
+        if job_ids:
+            stale.filter(id__in=job_ids).update(
+                status=InferenceJob.STATUS_PENDING, started_at=None, owner='', heartbeat_at=None,
+            )
+            logger.warning(f"Requeued {len(job_ids)} ML jobs abandoned by dead workers")
+        return job_ids
+
+    def heartbeat(self):
+        """Refresh the heartbeat of the jobs this process is running."""
+        from .models import InferenceJob
+
+        InferenceJob.objects.filter(
+            status=InferenceJob.STATUS_RUNNING, owner=self.owner
+        ).update(heartbeat_at=timezone.now())
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                self.heartbeat()
+                self._enqueue_all(self.requeue_stale())
+            except Exception:
+                logger.exception('ML job heartbeat failed')
+            finally:
+                close_old_connections()
+
+    def _enqueue_all(self, job_ids):
+        queued = 0
+        for job_id in job_ids:
+            if not self._slots.acquire(blocking=False):
+                break
+            self._enqueue(job_id)
+            queued += 1
+        return queued
+
+    def _enqueue(self, job_id):
+        JOBS_PENDING.inc()
+        future = self.pool.submit(execute_job, job_id, self.owner)
+        future.add_done_callback(self._job_done)
+
+    def _job_done(self, future):
+        JOBS_PENDING.dec()
+        self._slots.release()
+        if future.exception() is not None:
+            logger.error(f"ML job crashed: {future.exception()}")
+
+
+_config = getattr(settings, 'ML_JOBS', {})
+
+# Create a singleton instance
+job_runner = JobRunner(
+    executor=_config.get('EXECUTOR', 'thread'),
+    workers=_config.get('WORKERS', 2),
+    max_pending=_config.get('MAX_PENDING', 100),
+    stale_after=_config.get('STALE_AFTER', 60),
+    heartbeat_interval=_config.get('HEARTBEAT_INTERVAL', 10),
+)
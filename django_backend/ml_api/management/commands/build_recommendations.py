@@ -0,0 +1,236 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from ml_api.ingestion import item_tensor
+from ml_api.models import FashionItem
+from ml_api.neighbours import invalidate_all, store_neighbours
+from ml_api.similarity import embed_tensor, get_similarity_index, replace_recommendations
+
+
+def embed_missing(index, batch_size=256, on_error=None):
+    """
+    Embed and index items whose images are not in the store yet.
+
+    Args:
+        index: Similarity index to add the embeddings to
+        batch_size (int): Items read and added per batch
+        on_error (callable, optional): Called with a message for every image
+            that cannot be read
+
+    Returns:
+        int: Number of items embedded
+    """
+    indexed = set(int(item_id) for item_id in index.store.ids if item_id >= 0)
+    item_ids, vectors = [], []
+    added = 0
+    for item in FashionItem.objects.only('id', 'image').iterator(chunk_size=batch_size):
+        if item.pk in indexed or not item.image:
+            continue
+        try:
+            vectors.append(embed_tensor(item_tensor(item)))
+        except (OSError, ValueError) as e:
+            if on_error:
+                on_error(f'Skipping item {item.pk}: {e}')
+            continue
+        item_ids.append(item.pk)
+        if len(item_ids) >= batch_size:
+            index.add(item_ids, np.stack(vectors))
+            added += len(item_ids)
+            item_ids, vectors = [], []
+    if item_ids:
+        index.add(item_ids, np.stack(vectors))
+        added += len(item_ids)
+    return added
+
+
+def block_top_k(block, vectors, valid, k, offset, column_chunk=65536):
+    """
+    Exact top-k neighbours for a block of rows.
+
+    Scores are computed against the whole matrix in column chunks, keeping a
+    running top-k per row, so memory stays at len(block) x column_chunk.
+
+    Args:
+        block (numpy.ndarray): (b, d) source embeddings
+        vectors (numpy.ndarray): (n, d) all embeddings
+        valid (numpy.ndarray): (n,) mask of rows that may be recommended
+        k (int): Neighbours per row
+        offset (int): Row index of block[0] in vectors, to skip self matches
+
+    Returns:
+        tuple: (indices, scores), both of shape (b, k), best match first
+    """
+    rows = np.arange(len(block))
+    best_index = np.full((len(block), 0), -1, dtype=np.int64)
+    best_score = np.full((len(block), 0), -np.inf, dtype=np.float32)
+
+    for start in range(0, len(vectors), column_chunk):
+        chunk = vectors[start:start + column_chunk]
+        scores = block @ chunk.T
+        scores[:, ~valid[start:start + len(chunk)]] = -np.inf
+        self_columns = rows + offset - start
+        inside = (self_columns >= 0) & (self_columns < len(chunk))
+        scores[rows[inside], self_columns[inside]] = -np.inf
+
+        candidates = np.concatenate([best_score, scores], axis=1)
+        indices = np.concatenate(
+            [best_index, np.broadcast_to(np.arange(start, start + len(chunk)), scores.shape)],
+            axis=1,
+        )
+        keep = min(k, candidates.shape[1])
+        top = np.argpartition(-candidates, keep - 1, axis=1)[:, :keep]
+        best_score = np.take_along_axis(candidates, top, axis=1)
+        best_index = np.take_along_axis(indices, top, axis=1)
+
+    order = np.argsort(-best_score, axis=1)
+    return np.take_along_axis(best_index, order, axis=1), np.take_along_axis(best_score, order, axis=1)
+
+
+def build_block(start, stop, top_k, chunk_size):
+    """
+    Compute and store the recommendations and packed neighbour lists of rows
+    [start, stop) of the store, replacing their previous recommendations.
+
+    Runs in the command process or in a pool worker.
+
+    Returns:
+        int: Number of rows written
+    """
+    store = get_similarity_index().store
+    vectors, ids = store.vectors, store.ids
+    valid = ids >= 0
+    indices, scores = block_top_k(
+        np.ascontiguousarray(vectors[start:stop]), vectors, valid, top_k, start
+    )
+
+    lists = {}
+    for row in range(stop - start):
+        if ids[start + row] < 0:
+            continue
+        found = np.isfinite(scores[row])
+        lists[int(ids[start + row])] = (ids[indices[row][found]], scores[row][found])
+    # Pairs that fell out of a source's new top k are deleted
+    replace_recommendations(lists, batch_size=chunk_size)
+    # The cache is invalidated once the whole build is done
+    store_neighbours(lists, batch_size=chunk_size, invalidate=False)
+    return sum(len(item_ids) for item_ids, _ in lists.values())
+
+
+class Checkpoint:
+    """
+    Set of finished blocks, saved after each block so a run can resume.
+
+    A checkpoint only applies to the run parameters it was written for.
+    """
+
+    def __init__(self, path, fingerprint):
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+        self.done = set()
+        if self.path.exists():
+            data = json.loads(self.path.read_text())
+            if data.get('fingerprint') == fingerprint:
+                self.done = set(data['done'])
+
+    def mark(self, block):
+        self.done.add(block)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix('.tmp')
+        temp_path.write_text(json.dumps({
+            'fingerprint': self.fingerprint, 'done': sorted(self.done),
+        }))
+        os.replace(temp_path, self.path)
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+class Command(BaseCommand):
+    help = 'Precompute StyleRecommendation rows for every indexed fashion item'
+
+    def add_arguments(self, parser):
+        config = getattr(settings, 'ML_SIMILARITY', {})
+        parser.add_argument('--top-k', type=int, default=config.get('TOP_K', 10),
+                            help='Recommendations per item')
+        parser.add_argument('--block-size', type=int, default=256,
+                            help='Source items scored per vectorized block')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Rows per bulk upsert statement')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes computing blocks in parallel')
+        parser.add_argument('--checkpoint',
+                            default=os.path.join(settings.ML_DATA_DIR, 'build_recommendations.json'),
+                            help='Checkpoint file used to resume an interrupted run')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore any existing checkpoint')
+        parser.add_argument('--embed-missing', action='store_true',
+                            help='Embed items that are not in the similarity index first')
+
+    def handle(self, *args, **options):
+        index = get_similarity_index()
+        if options['embed_missing']:
+            self.embed_missing(index)
+        if index.train_if_needed():
+            self.stdout.write(f'Trained the similarity index on {len(index.store)} items')
+
+        count = len(index.store.vectors)
+        if count == 0:
+            self.stdout.write('No indexed items; run with --embed-missing first.')
+            return
+
+        block_size = options['block_size']
+        blocks = [
+            (block, start, min(start + block_size, count))
+            for block, start in enumerate(range(0, count, block_size))
+        ]
+        checkpoint = Checkpoint(options['checkpoint'], {
+            'rows': count, 'top_k': options['top_k'], 'block_size': block_size,
+        })
+        if options['restart']:
+            checkpoint.done.clear()
+        pending = [block for block in blocks if block[0] not in checkpoint.done]
+        self.stdout.write(
+            f'{count} items, {len(blocks)} blocks, {len(blocks) - len(pending)} already done'
+        )
+
+        started = time.perf_counter()
+        written = 0
+        arguments = (options['top_k'], options['chunk_size'])
+        if options['workers'] > 1:
+            # Workers are forked and open their own database connections
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=options['workers'],
+                mp_context=multiprocessing.get_context('fork'),
+            ) as pool:
+                futures = {
+                    pool.submit(build_block, start, stop, *arguments): block
+                    for block, start, stop in pending
+                }
+                for future in as_completed(futures):
+                    written += future.result()
+                    checkpoint.mark(futures[future])
+        else:
+            for block, start, stop in pending:
+                written += build_block(start, stop, *arguments)
+                checkpoint.mark(block)
+
+        checkpoint.clear()
+        invalidate_all()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} recommendations in {elapsed:.1f}s'
+        ))
+
+    def embed_missing(self, index, batch_size=256):
+        added = embed_missing(index, batch_size, on_error=self.stderr.write)
+        self.stdout.write(f'Embedded {added} items')
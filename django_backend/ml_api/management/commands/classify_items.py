@@ -0,0 +1,122 @@
+import time
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_api.management.commands.build_recommendations import embed_missing
+from ml_api.models import FashionItem
+from ml_api.similarity import get_similarity_index
+from ml_api.style_classifier import CLASSIFIERS, StyleClassifier, labelled_items, reference_set
+
+
+def chunked(iterable, size):
+    """Yield lists of up to `size` consecutive elements."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = 'Set style_category on fashion items with the style classifier'
+
+    def add_arguments(self, parser):
+        model_dir = Path(settings.ML_INFERENCE['MODEL_DIR'])
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Items read, classified and written per batch')
+        parser.add_argument('--model', default=str(model_dir / 'style-analyzer.joblib'),
+                            help='Classifier bundle, also served by the sklearn backend')
+        parser.add_argument('--train', choices=['references', 'items'],
+                            help='Fit and save the classifier first, on the knn reference set '
+                                 'or on the items that already have a style_category')
+        parser.add_argument('--references', default=str(model_dir / 'style-analyzer'),
+                            help='Reference set directory (embeddings.npy, labels.npy, metadata.json)')
+        parser.add_argument('--classifier', choices=CLASSIFIERS, default='logistic')
+        parser.add_argument('--all', action='store_true',
+                            help='Also reclassify items that already have a style_category')
+        parser.add_argument('--embed-missing', action='store_true',
+                            help='Embed and index items that are not in the similarity index')
+
+    def handle(self, *args, **options):
+        path = Path(options['model'])
+        index = get_similarity_index()
+        if options['embed_missing']:
+            added = embed_missing(index, on_error=self.stderr.write)
+            self.stdout.write(f'Embedded {added} items')
+        if options['train']:
+            self.train(options, path)
+        if not path.exists():
+            raise CommandError(f'No classifier at {path}; run with --train first')
+        classifier = StyleClassifier.load(path, shared=False)
+
+        batch_size = options['batch_size']
+        # Items are streamed in primary key order and filtered here rather
+        # than in SQL: on SQLite the cursor stays open while batches are
+        # written back, and rows must not move in the index being scanned
+        items = (
+            FashionItem.objects.only('id', 'image', 'style_category')
+            .order_by('pk')
+            .iterator(chunk_size=batch_size)
+        )
+        if not options['all']:
+            items = (item for item in items if not item.style_category)
+
+        started = time.perf_counter()
+        classified = updated = skipped = 0
+        for batch in chunked(items, batch_size):
+            positions, vectors = index.store.lookup([item.pk for item in batch])
+            found = [batch[i] for i in positions]
+            skipped += len(batch) - len(found)
+            if not found:
+                continue
+            changed = []
+            for item, category in zip(found, classifier.predict(vectors)):
+                if item.style_category != category:
+                    item.style_category = category
+                    changed.append(item)
+            FashionItem.objects.bulk_update(changed, ['style_category'], batch_size=batch_size)
+            classified += len(found)
+            updated += len(changed)
+
+        elapsed = time.perf_counter() - started
+        rate = classified / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f'Classified {classified} items ({updated} changed) in {elapsed:.1f}s, '
+            f'{rate:.0f} items/s'
+        ))
+        if skipped:
+            self.stdout.write(
+                f'Skipped {skipped} items without an embedding; '
+                'run with --embed-missing to embed them'
+            )
+
+    def train(self, options, path):
+        if options['train'] == 'references':
+            directory = Path(options['references'])
+            if not (directory / 'embeddings.npy').exists():
+                raise CommandError(f'No reference set in {directory}')
+            vectors, labels, categories = reference_set(directory)
+        else:
+            vectors, labels, categories = labelled_items(options['batch_size'])
+        if len(set(labels.tolist())) < 2:
+            raise CommandError('Training needs labelled embeddings of at least two categories')
+
+        if len(labels) >= 50:
+            from sklearn.model_selection import train_test_split
+
+            train_x, test_x, train_y, test_y = train_test_split(
+                vectors, labels, test_size=0.2, random_state=0
+            )
+            holdout = StyleClassifier.train(train_x, train_y, categories, kind=options['classifier'])
+            accuracy = float(np.mean(holdout.predict_proba(test_x).argmax(axis=1) == test_y))
+            self.stdout.write(f'Held-out accuracy: {accuracy:.3f} on {len(test_y)} embeddings')
+
+        started = time.perf_counter()
+        classifier = StyleClassifier.train(vectors, labels, categories, kind=options['classifier'])
+        classifier.save(path)
+        self.stdout.write(
+            f'Trained {options["classifier"]} classifier on {len(labels)} embeddings, '
+            f'{len(categories)} categories, in {time.perf_counter() - started:.1f}s; saved to {path}'
+        )
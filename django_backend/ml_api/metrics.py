@@ -0,0 +1,296 @@
+"""
+Prometheus metrics for the ML API.
+Views are timed by MetricsMiddleware and FashionMLService methods by the
+instrument decorator. When PROMETHEUS_MULTIPROC_DIR is set (gunicorn.conf.py
+sets it) each worker process writes its samples to memory-mapped files in that
+directory and /api/metrics aggregates all of them, so every scrape sees the
+whole server rather than whichever worker answered it.
+"""
+
+import asyncio
+import functools
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+# Seconds; spans cache hits (<1ms) to image generation (several seconds)
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0, 60.0,
+)
+
+# Quantiles estimated from the histograms at scrape time
+QUANTILES = (0.5, 0.95, 0.99)
+
+REQUEST_LATENCY = Histogram(
+    'ml_api_request_duration_seconds',
+    'Time to produce a response for an ml_api view',
+    ['view', 'method'],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    'ml_api_requests',
+    'ml_api responses by view, method and status code',
+    ['view', 'method', 'status'],
+)
+REQUEST_ERRORS = Counter(
+    'ml_api_request_errors',
+    'ml_api requests that failed with a 5xx status or an unhandled exception',
+    ['view', 'method'],
+)
+STREAM_FIRST_CHUNK = Histogram(
+    'ml_api_stream_first_chunk_seconds',
+    'Time from the start of a streamed ml_api request to its first body chunk',
+    ['view'],
+    buckets=LATENCY_BUCKETS,
+)
+STREAM_DURATION = Histogram(
+    'ml_api_stream_duration_seconds',
+    'Time from the start of a streamed ml_api request to the end of its body',
+    ['view'],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'ml_api_requests_in_flight',
+    'ml_api requests currently being handled',
+    multiprocess_mode='livesum',
+)
+
+SERVICE_LATENCY = Histogram(
+    'ml_service_call_duration_seconds',
+    'Duration of FashionMLService calls',
+    ['method'],
+    buckets=LATENCY_BUCKETS,
+)
+SERVICE_ERRORS = Counter(
+    'ml_service_call_errors',
+    'FashionMLService calls that raised',
+    ['method'],
+)
+SERVICE_IN_FLIGHT = Gauge(
+    'ml_service_calls_in_flight',
+    'FashionMLService calls currently running',
+    ['method'],
+    multiprocess_mode='livesum',
+)
+
+BATCH_QUEUE_DEPTH = Gauge(
+    'ml_batch_queue_depth',
+    'Model inputs waiting for a micro-batch',
+    ['model'],
+    multiprocess_mode='livesum',
+)
+ADMISSION_WAITING = Gauge(
+    'ml_admission_waiting',
+    'Model calls waiting for an admission slot',
+    ['model'],
+    multiprocess_mode='livesum',
+)
+ADMISSION_REJECTIONS = Counter(
+    'ml_admission_rejections',
+    'Model calls refused by admission control',
+    ['model', 'reason'],
+)
+COALESCED_CALLS = Counter(
+    'ml_coalesced_calls',
+    'Model inputs served by an identical in-flight call (scope: local or remote process)',
+    ['model', 'scope'],
+)
+JOBS_PENDING = Gauge(
+    'ml_jobs_pending',
+    'Background jobs queued or running',
+    multiprocess_mode='livesum',
+)
+
+
+def instrument(name):
+    """
+    Decorator recording latency, errors and in-flight calls of a function.
+
+    Works on plain and coroutine functions. Labelled children are bound once
+    at decoration time, so a call only pays for the observations.
+
+    Args:
+        name (str): Value of the 'method' label
+    """
+    latency = SERVICE_LATENCY.labels(name)
+    errors = SERVICE_ERRORS.labels(name)
+    in_flight = SERVICE_IN_FLIGHT.labels(name)
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                in_flight.inc()
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    errors.inc()
+                    raise
+                finally:
+                    latency.observe(time.perf_counter() - started)
+                    in_flight.dec()
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                in_flight.inc()
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                except Exception:
+                    errors.inc()
+                    raise
+                finally:
+                    latency.observe(time.perf_counter() - started)
+                    in_flight.dec()
+        return wrapper
+    return decorator
+
+
+def record_request(view, method, status, duration):
+    """Record one finished ml_api request."""
+    REQUEST_LATENCY.labels(view, method).observe(duration)
+    REQUESTS.labels(view, method, str(status)).inc()
+    if status >= 500:
+        REQUEST_ERRORS.labels(view, method).inc()
+
+
+def timed_stream(content, view, started):
+    """
+    Wrap the body of a streamed response to record its time to first chunk
+    and total duration, both measured from `started` (time.perf_counter()).
+
+    Args:
+        content: Sync or async iterator of body chunks
+        view (str): Value of the 'view' label
+        started (float): Start of the request
+
+    Returns:
+        An iterator of the same kind yielding the same chunks
+    """
+    first_chunk = STREAM_FIRST_CHUNK.labels(view)
+    duration = STREAM_DURATION.labels(view)
+
+    if hasattr(content, '__aiter__'):
+        async def chunks():
+            first = True
+            try:
+                async for chunk in content:
+                    if first:
+                        first_chunk.observe(time.perf_counter() - started)
+                        first = False
+                    yield chunk
+            finally:
+                duration.observe(time.perf_counter() - started)
+    else:
+        def chunks():
+            first = True
+            try:
+                for chunk in content:
+                    if first:
+                        first_chunk.observe(time.perf_counter() - started)
+                        first = False
+                    yield chunk
+            finally:
+                duration.observe(time.perf_counter() - started)
+    return chunks()
+
+
+def estimate_quantile(buckets, q):
+    """
+    Estimate a quantile from cumulative histogram buckets.
+
+    Interpolates linearly inside the bucket holding the quantile, like
+    PromQL's histogram_quantile.
+
+    Args:
+        buckets (list): [(upper_bound, cumulative_count), ...] sorted by bound,
+            ending with +Inf
+        q (float): Quantile in [0, 1]
+
+    Returns:
+        float: The estimate, or None without observations
+    """
+    total = buckets[-1][1] if buckets else 0
+    if not total:
+        return None
+    rank = q * total
+    lower_bound, lower_count = 0.0, 0.0
+    for upper_bound, count in buckets:
+        if count >= rank:
+            if upper_bound == float('inf'):
+                # Past the last finite bucket; report its bound
+                return lower_bound
+            if count == lower_count:
+                return upper_bound
+            return lower_bound + (upper_bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+        lower_bound, lower_count = upper_bound, count
+    return lower_bound
+
+
+def quantile_families(families):
+    """
+    Build '<histogram>_quantile' gauges with p50/p95/p99 estimates for every
+    histogram in a list of collected metric families.
+    """
+    estimates = []
+    for family in families:
+        if family.type != 'histogram':
+            continue
+        series = {}
+        for sample in family.samples:
+            if not sample.name.endswith('_bucket'):
+                continue
+            labels = {k: v for k, v in sample.labels.items() if k != 'le'}
+            key = tuple(sorted(labels.items()))
+            series.setdefault(key, []).append((float(sample.labels['le']), sample.value))
+        if not series:
+            continue
+        label_names = [name for name, _ in next(iter(series))]
+        gauge = GaugeMetricFamily(
+            f'{family.name}_quantile',
+            f'Estimated quantiles of {family.name} since server start',
+            labels=[*label_names, 'quantile'],
+        )
+        for key, buckets in series.items():
+            buckets.sort()
+            for q in QUANTILES:
+                value = estimate_quantile(buckets, q)
+                if value is not None:
+                    gauge.add_metric([value for _, value in key] + [str(q)], value)
+        estimates.append(gauge)
+    return estimates
+
+
+class _Snapshot:
+    # Minimal registry-like object for generate_latest
+    def __init__(self, families):
+        self.families = families
+
+    def collect(self):
+        return self.families
+
+
+def render():
+    """
+    Render all metrics in the Prometheus text exposition format.
+
+    Returns:
+        tuple: (body bytes, content type)
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    families = list(registry.collect())
+    families += quantile_families(families)
+    return generate_latest(_Snapshot(families)), CONTENT_TYPE_LATEST
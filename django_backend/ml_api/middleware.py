@@ -0,0 +1,148 @@
+"""
+Middleware for the ml_api app.
+"""
+
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+
+from . import admission, metrics
+
+# Only requests under this prefix are handled
+API_PREFIX = '/api/'
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    # Unresolved paths share one label so they cannot blow up cardinality
+    return match.url_name if match is not None and match.url_name else 'unmatched'
+
+
+class MetricsMiddleware:
+    """
+    Record latency, status and in-flight counts of every ml_api request.
+
+    Latency is measured until the view returns its response, so for streamed
+    responses it is the time to the headers; their time to first chunk and
+    total duration are recorded as the body is sent. Works under WSGI and ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not request.path_info.startswith(API_PREFIX):
+            return self.get_response(request)
+
+        metrics.REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            self._time_stream(request, response, started)
+            return response
+        finally:
+            metrics.REQUESTS_IN_FLIGHT.dec()
+            metrics.record_request(
+                _view_name(request), request.method, status, time.perf_counter() - started
+            )
+
+    async def __acall__(self, request):
+        if not request.path_info.startswith(API_PREFIX):
+            return await self.get_response(request)
+
+        metrics.REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await self.get_response(request)
+            status = response.status_code
+            self._time_stream(request, response, started)
+            return response
+        finally:
+            metrics.REQUESTS_IN_FLIGHT.dec()
+            metrics.record_request(
+                _view_name(request), request.method, status, time.perf_counter() - started
+            )
+
+    def _time_stream(self, request, response, started):
+        if response.streaming:
+            response.streaming_content = metrics.timed_stream(
+                response.streaming_content, _view_name(request), started
+            )
+
+
+class DeadlineMiddleware:
+    """
+    Apply the client's X-Request-Timeout (seconds) as a deadline to the model
+    calls made for an ml_api request.
+
+    Admission control refuses calls that cannot finish before the deadline.
+    The timeout is capped at ML_INFERENCE['ADMISSION']['MAX_TIMEOUT'].
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        config = getattr(settings, 'ML_INFERENCE', {}).get('ADMISSION', {})
+        self.max_timeout = config.get('MAX_TIMEOUT')
+
+    def _timeout(self, request):
+        """Return (seconds or None, error response or None)."""
+        value = request.headers.get(admission.TIMEOUT_HEADER)
+        if value is None or not request.path_info.startswith(API_PREFIX):
+            return None, None
+        try:
+            seconds = float(value)
+        except ValueError:
+            seconds = None
+        if seconds is None or not 0 < seconds < float('inf'):
+            return None, JsonResponse(
+                {'error': f'{admission.TIMEOUT_HEADER} must be a positive number of seconds'},
+                status=400
+            )
+        if self.max_timeout is not None:
+            seconds = min(seconds, self.max_timeout)
+        return seconds, None
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        seconds, error = self._timeout(request)
+        if error is not None:
+            return error
+        if seconds is None:
+            return self.get_response(request)
+        token = admission.set_timeout(seconds)
+        try:
+            return self.get_response(request)
+        finally:
+            admission.reset_timeout(token)
+
+    async def __acall__(self, request):
+        seconds, error = self._timeout(request)
+        if error is not None:
+            return error
+        if seconds is None:
+            return await self.get_response(request)
+        token = admission.set_timeout(seconds)
+        try:
+            return await self.get_response(request)
+        finally:
+            admission.reset_timeout(token)
@@ -5,9 +5,19 @@ This module provides machine learning services for fashion design generation and
 
 import os
 import json
+import asyncio
 import logging
+import time
+from concurrent.futures import as_completed
 from datetime import datetime
 
+from django.conf import settings
+
+from .admission import Overloaded
+from .inference import InferenceEngine
+from .metrics import instrument
+from .status import process_rss
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,25 +27,35 @@ class FashionMLService:
     Service class for fashion-related machine learning operations.
     """
     
-    def __init__(self):
-        """Initialize the ML service with model configurations."""
+    def __init__(self, config=None):
+        """
+        Initialize the ML service with model configurations.
+
+        Args:
+            config (dict, optional): Inference settings, defaults to
+                settings.ML_INFERENCE
+        """
+        if config is None:
+            config = getattr(settings, 'ML_INFERENCE', {})
+        self.engine = InferenceEngine(config)
         self.models = {
             'fashion-gen': {
-                'status': 'active',
                 'type': 'text',
                 'description': 'Generates fashion design ideas and descriptions'
             },
             'style-analyzer': {
-                'status': 'active',
                 'type': 'text',
                 'description': 'Analyzes fashion styles from text descriptions'
             },
             'image-gen': {
-                'status': 'active',
                 'type': 'image',
                 'description': 'Generates fashion design images from descriptions'
             }
         }
+        for name, model in self.models.items():
+            model['backend'] = self.engine.backend_for(name).name
+            model['version'] = self.engine.model_version(name)
+        self.started_at = time.time()
         logger.info("Fashion ML Service initialized")
     
     def generate_ideas(self, prompt):
@@ -48,34 +68,14 @@ class FashionMLService:
         Returns:
             dict: Generated ideas and metadata
         """
+        return self.engine.run(self.agenerate_ideas(prompt))
+    
+    @instrument('generate_ideas')
+    async def agenerate_ideas(self, prompt):
+        """Async variant of generate_ideas for ASGI views."""
         logger.info(f"Generating ideas for prompt: {prompt[:50]}...")
         
-        # In a real implementation, this would call an actual ML model
-        # For now, we'll return a simulated response
-        
-        # Simulate processing time in a real application
-        import time
-        time.sleep(1)
-        
-        # Generate a response based on the prompt
-        if "sustainable" in prompt.lower():
-            ideas = [
-                "Eco-friendly linen blazer with recycled button details",
-                "Organic cotton wrap dress with natural dye coloration",
-                "Upcycled denim collection with minimal water usage"
-            ]
-        elif "summer" in prompt.lower():
-            ideas = [
-                "Lightweight cotton sundress with adjustable straps",
-                "Breathable linen shorts with drawstring waist",
-                "Oversized beach shirt with UV protection"
-            ]
-        else:
-            ideas = [
-                "Contemporary silhouette with architectural influence",
-                "Textured fabric with contrasting color accents",
-                "Versatile design suitable for multiple occasions"
-            ]
+        ideas = (await self.engine.apredict('fashion-gen', [prompt]))[0]
             
         return {
             'ideas': ideas,
@@ -83,6 +83,24 @@ class FashionMLService:
             'model': 'fashion-gen'
         }
     
+    def stream_ideas(self, prompt):
+        """
+        Generate fashion design ideas, yielding each as soon as it is produced.
+        
+        Args:
+            prompt (str): Text description of the desired fashion concept
+            
+        Returns:
+            iterator: Ideas (str), in the order generate_ideas returns them
+        """
+        logger.info(f"Streaming ideas for prompt: {prompt[:50]}...")
+        return self.engine.stream('fashion-gen', prompt)
+    
+    def astream_ideas(self, prompt):
+        """Async variant of stream_ideas for ASGI streaming responses."""
+        logger.info(f"Streaming ideas for prompt: {prompt[:50]}...")
+        return self.engine.astream('fashion-gen', prompt)
+    
     def generate_image(self, prompt):
         """
         Generate a fashion design image based on a text prompt.
@@ -93,17 +111,14 @@ class FashionMLService:
         Returns:
             dict: URL to the generated image and metadata
         """
+        return self.engine.run(self.agenerate_image(prompt))
+    
+    @instrument('generate_image')
+    async def agenerate_image(self, prompt):
+        """Async variant of generate_image for ASGI views."""
         logger.info(f"Generating image for prompt: {prompt[:50]}...")
         
-        # In a real implementation, this would call an image generation model
-        # For now, we'll return a placeholder image URL
-        
-        # Simulate processing time
-        import time
-        time.sleep(2)
-        
-        # In a real implementation, this would be the URL to a generated image
-        image_url = "https://placehold.co/600x800/png?text=AI+Generated+Fashion+Design"
+        image_url = (await self.engine.apredict('image-gen', [prompt]))[0]
         
         return {
             'image_url': image_url,
@@ -122,22 +137,14 @@ class FashionMLService:
         Returns:
             dict: Style analysis results
         """
+        return self.engine.run(self.aanalyze_style(image_url))
+    
+    @instrument('analyze_style')
+    async def aanalyze_style(self, image_url):
+        """Async variant of analyze_style for ASGI views."""
         logger.info(f"Analyzing style for image: {image_url[:50]}...")
         
-        # In a real implementation, this would call a computer vision model
-        # For now, we'll return simulated analysis results
-        
-        # Simulate processing time
-        import time
-        time.sleep(1.5)
-        
-        # Simulated style analysis
-        analysis = {
-            'style_categories': ['minimalist', 'contemporary', 'casual'],
-            'color_palette': ['#f5f5f5', '#333333', '#a0a0a0'],
-            'fabric_suggestions': ['cotton', 'linen', 'silk blend'],
-            'similar_styles': ['Scandinavian minimalism', 'Japanese contemporary']
-        }
+        analysis = (await self.engine.apredict('style-analyzer', [image_url]))[0]
         
         return {
             'analysis': analysis,
@@ -145,16 +152,158 @@ class FashionMLService:
             'model': 'style-analyzer'
         }
     
+    def generate_ideas_batch(self, prompts):
+        """
+        Generate ideas for many prompts concurrently.
+        
+        Args:
+            prompts (list): Text prompts
+            
+        Returns:
+            list: One item per prompt, in input order, holding either
+                'result' or 'error'
+        """
+        return self.engine.run(self.agenerate_ideas_batch(prompts))
+    
+    @instrument('generate_ideas_batch')
+    async def agenerate_ideas_batch(self, prompts):
+        """Async variant of generate_ideas_batch."""
+        return await self._run_batch(self.agenerate_ideas, prompts)
+    
+    def analyze_style_batch(self, image_urls):
+        """
+        Analyze many images concurrently.
+        
+        Args:
+            image_urls (list): URLs to fashion images
+            
+        Returns:
+            list: One item per image, in input order, holding either
+                'result' or 'error'
+        """
+        return self.engine.run(self.aanalyze_style_batch(image_urls))
+    
+    @instrument('analyze_style_batch')
+    async def aanalyze_style_batch(self, image_urls):
+        """Async variant of analyze_style_batch."""
+        return await self._run_batch(self.aanalyze_style, image_urls)
+    
+    def iter_batch(self, method, inputs):
+        """
+        Run a batch and yield items as each input completes.
+        
+        Args:
+            method (str): 'generate_ideas' or 'analyze_style'
+            inputs (list): Prompts or image URLs
+            
+        Yields:
+            dict: Batch items in completion order
+        """
+        coroutine_function = self._batch_method(method)
+        futures = {
+            self.engine.submit(coroutine_function(value)): index
+            for index, value in enumerate(inputs)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            yield self._batch_item(index, inputs[index], future.exception() or future.result())
+    
+    async def aiter_batch(self, method, inputs):
+        """Async variant of iter_batch for ASGI streaming responses."""
+        coroutine_function = self._batch_method(method)
+        
+        async def run(index, value):
+            try:
+                result = await coroutine_function(value)
+            except Exception as e:
+                result = e
+            return self._batch_item(index, value, result)
+        
+        for next_item in asyncio.as_completed([run(i, v) for i, v in enumerate(inputs)]):
+            yield await next_item
+    
+    def _batch_method(self, method):
+        return {
+            'generate_ideas': self.agenerate_ideas,
+            'analyze_style': self.aanalyze_style,
+        }[method]
+    
+    async def _run_batch(self, coroutine_function, inputs):
+        results = await asyncio.gather(
+            *(coroutine_function(value) for value in inputs),
+            return_exceptions=True
+        )
+        # A batch shed as a whole is refused like a single request
+        if results and all(isinstance(result, Overloaded) for result in results):
+            raise results[0]
+        return [
+            self._batch_item(index, value, result)
+            for index, (value, result) in enumerate(zip(inputs, results))
+        ]
+    
+    def _batch_item(self, index, value, result):
+        if isinstance(result, Exception):
+            return {'index': index, 'input': value, 'error': str(result)}
+        return {'index': index, 'input': value, 'result': result}
+    
+    def preload(self):
+        """
+        Load the weights of every model now instead of on first use.
+        """
+        started = datetime.now()
+        self.engine.preload(list(self.models))
+        logger.info(f"Preloaded ML models in {(datetime.now() - started).total_seconds():.2f}s")
+    
+    # Reported 'status' of each ModelHandle load state
+    STATUS_BY_LOAD_STATE = {
+        'unloaded': 'idle',
+        'loading': 'loading',
+        'loaded': 'active',
+        'failed': 'error',
+    }
+    
+    @instrument('get_model_status')
     def get_model_status(self):
         """
-        Get the status of all ML models.
+        Get the live status of all ML models in this worker process.
+        
+        Reports each model's load state and load time, request rates over
+        sliding windows, average batch size, result cache hit rate and last
+        error, plus the process's resident memory. Every figure is read from
+        a running counter, so the call is cheap enough to poll.
         
         Returns:
             dict: Status information for all models
         """
-        logger.info("Getting model status")
+        from .fetcher import get_fetcher
+        from .tensor_cache import get_tensor_cache
+
+        models = {}
+        for name, info in self.models.items():
+            handle = self.engine.handle(name).as_dict()
+            batching = self.engine.batch_stats(name)
+            cache = self.engine.cache.model_stats(name) if self.engine.cache else None
+            models[name] = {
+                **info,
+                'status': self.STATUS_BY_LOAD_STATE[handle['load_state']],
+                **handle,
+                'avg_batch_size': batching['avg_batch_size'] if batching else None,
+                'cache_hit_rate': cache['hit_rate'] if cache else None,
+                'admission': self.engine.admission_stats(name),
+                'batching': batching,
+                'cache': cache,
+            }
         return {
-            'models': self.models,
+            'models': models,
+            'process': {
+                'pid': os.getpid(),
+                'rss_bytes': process_rss(),
+                'uptime_s': round(time.time() - self.started_at, 1),
+            },
+            'cache': self.engine.cache.stats() if self.engine.cache else None,
+            'coalescing': self.engine.coalescing_stats(),
+            'tensor_cache': get_tensor_cache().stats(),
+            'fetcher': get_fetcher().stats(),
             'timestamp': datetime.now().isoformat()
         }
 
@@ -1,3 +1,6 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
 
 
@@ -12,7 +15,17 @@ class FashionItem(models.Model):
     style_category = models.CharField(max_length=100, blank=True)
     color_palette = models.JSONField(default=dict, blank=True)
     similarity_score = models.FloatField(null=True, blank=True)
-    
+
+    class Meta:
+        indexes = [
+            # Admin filters by category and date; the newest first
+            models.Index(fields=['style_category', '-created_at'], name='fashionitem_style_created'),
+            # Keyset pages (CreatedAtCursorPagination)
+            models.Index(fields=['-created_at', '-id'], name='fashionitem_created_id'),
+        ]
+        # Full-text search over title, description and style_category is
+        # installed after migrate, see search.py
+
     def __str__(self):
         return self.title
 
@@ -20,9 +33,11 @@ class FashionItem(models.Model):
 class StyleRecommendation(models.Model):
     """Model for style recommendations generated by ML algorithms"""
     source_item = models.ForeignKey(
-        FashionItem, 
+        FashionItem,
         on_delete=models.CASCADE,
-        related_name='recommendations'
+        related_name='recommendations',
+        # Covered by unique_together and the score index, which lead with it
+        db_index=False,
     )
     recommended_item = models.ForeignKey(
         FashionItem,
@@ -35,6 +50,72 @@ class StyleRecommendation(models.Model):
     
     class Meta:
         unique_together = ('source_item', 'recommended_item')
-        
+        indexes = [
+            # An item's recommendations, best match first
+            models.Index(fields=['source_item', '-similarity_score'], name='recommendation_source_score'),
+        ]
+
+    def __str__(self):
+        return f"{self.source_item.title} → {self.recommended_item.title}"
+
+
+class ItemNeighbours(models.Model):
+    """Precomputed top-k neighbours of a fashion item, packed for fast reads (see neighbours.py)"""
+    item = models.OneToOneField(
+        FashionItem,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='neighbours'
+    )
+    # int64 item ids followed by float16 scores, best match first
+    packed = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Neighbours of {self.item_id}"
+
+
+class InferenceJob(models.Model):
+    """Model for long-running ML jobs executed outside the request cycle"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+    FINISHED_STATUSES = (STATUS_SUCCEEDED, STATUS_FAILED, STATUS_CANCELLED)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    payload = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ml_jobs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # '<host>:<pid>' of the worker running the job, which refreshes
+    # heartbeat_at while it is alive
+    owner = models.CharField(max_length=255, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED_STATUSES
+
     def __str__(self):
-        return f"{self.source_item.title} → {self.recommended_item.title}"
\ No newline at end of file
+        return f"{self.kind} {self.id} ({self.status})"
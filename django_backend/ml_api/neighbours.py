@@ -0,0 +1,212 @@
+"""
+Packed neighbour lists for the similar-items read path.
+Each item's top-k neighbours are stored in one ItemNeighbours row as int64 item
+ids followed by float16 scores, best match first, and read through a cache, so
+a similar-items request costs a cache lookup plus one query for the items.
+Lists are written when recommendations are built and the cache is invalidated
+by changing a generation that is part of every key. The generation is kept in
+a file under ML_DATA_DIR rather than in the cache, so a rebuild run in its own
+process invalidates every worker even with a per-process cache.
+"""
+
+import logging
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+ID_DTYPE = np.dtype('<i8')
+SCORE_DTYPE = np.dtype('<f2')
+ENTRY_SIZE = ID_DTYPE.itemsize + SCORE_DTYPE.itemsize
+
+# Seconds a process reuses the generation it last read from its file
+GENERATION_REFRESH = 1.0
+
+# (generation, time.monotonic() it was read)
+_generation = (None, 0.0)
+
+
+def pack(ids, scores):
+    """
+    Pack neighbour ids and scores, best match first, into bytes.
+
+    Returns:
+        bytes: len(ids) int64 ids followed by as many float16 scores
+    """
+    return (
+        np.asarray(ids, dtype=ID_DTYPE).tobytes()
+        + np.asarray(scores, dtype=SCORE_DTYPE).tobytes()
+    )
+
+
+def unpack(data):
+    """
+    Unpack bytes written by pack.
+
+    Returns:
+        tuple: (ids, scores) arrays
+    """
+    count = len(data) // ENTRY_SIZE
+    ids = np.frombuffer(data, dtype=ID_DTYPE, count=count)
+    scores = np.frombuffer(data, dtype=SCORE_DTYPE, count=count, offset=count * ID_DTYPE.itemsize)
+    return ids, scores
+
+
+def _config():
+    return getattr(settings, 'ML_SIMILARITY', {}).get('NEIGHBOUR_CACHE', {})
+
+
+def _cache():
+    from django.core.cache import caches
+    return caches[_config().get('ALIAS', 'default')]
+
+
+def _generation_file():
+    path = _config().get('GENERATION_FILE')
+    if path:
+        return Path(path)
+    return Path(settings.ML_DATA_DIR) / 'similarity' / 'neighbours.generation'
+
+
+def _current_generation():
+    global _generation
+    generation, read_at = _generation
+    now = time.monotonic()
+    if generation is None or now - read_at > GENERATION_REFRESH:
+        try:
+            generation = _generation_file().read_text().strip() or '0'
+        except FileNotFoundError:
+            generation = '0'
+        _generation = (generation, now)
+    return generation
+
+
+def _key(cache, item_id):
+    return f'ml:neighbours:{_current_generation()}:{item_id}'
+
+
+def load_packed(item_id, k=None):
+    """
+    Read an item's packed neighbours from the database.
+
+    Items without a stored list, e.g. recommended before lists were stored,
+    get one built from their StyleRecommendation rows.
+    """
+    from .models import ItemNeighbours, StyleRecommendation
+
+    packed = ItemNeighbours.objects.filter(item_id=item_id).values_list('packed', flat=True).first()
+    if packed is not None:
+        return bytes(packed)
+    k = k or getattr(settings, 'ML_SIMILARITY', {}).get('TOP_K', 10)
+    rows = list(
+        StyleRecommendation.objects
+        .filter(source_item_id=item_id)
+        .order_by('-similarity_score')
+        .values_list('recommended_item_id', 'similarity_score')[:k]
+    )
+    return pack([item for item, _ in rows], [score for _, score in rows])
+
+
+def get_neighbours(item_id):
+    """
+    Return an item's neighbours through the cache.
+
+    Returns:
+        tuple: (ids, scores) arrays, best match first; empty for items
+            without recommendations
+    """
+    try:
+        cache = _cache()
+        key = _key(cache, item_id)
+        packed = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Neighbour cache unavailable: {e}")
+        return unpack(load_packed(item_id))
+    if packed is None:
+        packed = load_packed(item_id)
+        try:
+            cache.set(key, packed, _config().get('TTL', 300))
+        except Exception as e:
+            logger.warning(f"Neighbour cache unavailable: {e}")
+    return unpack(packed)
+
+
+def store_neighbours(lists, batch_size=1000, invalidate=True):
+    """
+    Write packed neighbour lists.
+
+    Args:
+        lists (dict): {item_id: (ids, scores)}, best match first
+        batch_size (int): Rows per upsert statement
+        invalidate (bool): Drop the items' cached lists. Bulk rebuilds skip
+            this and call invalidate_all once at the end.
+    """
+    from .models import ItemNeighbours
+
+    ItemNeighbours.objects.bulk_create(
+        [
+            ItemNeighbours(item_id=item_id, packed=pack(ids, scores))
+            for item_id, (ids, scores) in lists.items()
+        ],
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['item'],
+        update_fields=['packed', 'updated_at'],
+    )
+    if invalidate:
+        try:
+            cache = _cache()
+            cache.delete_many([_key(cache, item_id) for item_id in lists])
+        except Exception as e:
+            logger.warning(f"Could not invalidate cached neighbours: {e}")
+
+
+def refresh_neighbours(item_ids, k=None):
+    """
+    Rebuild the packed lists of items from their StyleRecommendation rows.
+
+    Args:
+        item_ids (iterable): Source item ids
+        k (int, optional): Neighbours kept per item, defaults to settings TOP_K
+    """
+    from .models import StyleRecommendation
+
+    k = k or getattr(settings, 'ML_SIMILARITY', {}).get('TOP_K', 10)
+    lists = {item_id: ([], []) for item_id in item_ids}
+    rows = (
+        StyleRecommendation.objects
+        .filter(source_item_id__in=list(lists))
+        .order_by('source_item_id', '-similarity_score')
+        .values_list('source_item_id', 'recommended_item_id', 'similarity_score')
+    )
+    for source_id, item_id, score in rows:
+        ids, scores = lists[source_id]
+        if len(ids) < k:
+            ids.append(item_id)
+            scores.append(score)
+    store_neighbours(lists)
+
+
+def invalidate_all():
+    """
+    Invalidate every cached neighbour list, e.g. after a rebuild.
+
+    Writes a new generation to the generation file, which every process
+    reads at most GENERATION_REFRESH seconds later.
+    """
+    global _generation
+    path = _generation_file()
+    temp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path.write_text(f'{time.time_ns()}-{os.getpid()}')
+        os.replace(temp_path, path)
+    except OSError as e:
+        temp_path.unlink(missing_ok=True)
+        logger.warning(f"Could not invalidate cached neighbours: {e}")
+    # Pick the new generation up in this process straight away
+    _generation = (None, 0.0)
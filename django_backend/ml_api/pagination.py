@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination on (created_at, id).
+
+    Pages are fetched with a WHERE clause on the last seen row instead of an
+    OFFSET, so deep pages cost the same as the first one and no COUNT query
+    is issued.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,78 @@
+"""
+Color palette extraction for fashion images.
+Images are downsampled with Pillow and clustered with a vectorized mini-batch
+k-means over float32 RGB pixels.
+"""
+
+import numpy as np
+from PIL import Image
+
+from .clustering import kmeans
+
+# Longest side of the image the clustering runs on
+SAMPLE_SIDE = 128
+
+
+def load_pixels(image, max_side=SAMPLE_SIDE):
+    """
+    Decode an image into a (n, 3) float32 array of RGB pixels.
+
+    JPEGs are decoded at reduced scale through Pillow's draft mode, so a large
+    photo is never fully decoded.
+
+    Args:
+        image: A path, file object or PIL image
+        max_side (int): Longest side after downsampling
+
+    Returns:
+        numpy.ndarray: Pixel array of shape (n, 3)
+    """
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    if image.format == 'JPEG':
+        image.draft('RGB', (max_side, max_side))
+    # Reduce by an integer factor first, then resample the small image
+    image.thumbnail((max_side, max_side), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    image = image.convert('RGB')
+    return np.asarray(image, dtype=np.float32).reshape(-1, 3)
+
+
+def to_hex(color):
+    """Convert an RGB triple to a #rrggbb string."""
+    r, g, b = (int(round(min(max(channel, 0), 255))) for channel in color)
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+def extract_palette(image, k=5):
+    """
+    Extract the dominant colors of an image.
+
+    Args:
+        image: A path, file object or PIL image
+        k (int): Number of colors
+
+    Returns:
+        list: [{'color': '#rrggbb', 'proportion': float}, ...], most dominant
+            first
+    """
+    centers, proportions = kmeans(load_pixels(image), k=k)
+    order = np.argsort(-proportions)
+    return [
+        {'color': to_hex(centers[i]), 'proportion': round(float(proportions[i]), 4)}
+        for i in order
+        if proportions[i] > 0
+    ]
+
+
+def palette_for_item(item, k=5):
+    """
+    Build the color_palette value for a FashionItem from its thumbnail, or
+    its image if it has not been ingested.
+
+    Returns:
+        dict: {'colors': [...]} in the format of extract_palette
+    """
+    from .ingestion import open_analysis_image
+
+    with open_analysis_image(item) as image_file:
+        return {'colors': extract_palette(image_file, k=k)}
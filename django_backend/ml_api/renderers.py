@@ -0,0 +1,49 @@
+"""
+Renderers for the streaming media types of the ml_api views.
+Streamed bodies are written by the views themselves; these renderers let
+content negotiation accept the streaming Accept headers and render the
+responses that are not streamed, such as validation errors, in the same
+format.
+"""
+
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+
+def sse_event(event, data):
+    """Encode one Server-Sent Event with a JSON payload."""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Render a response as a single line of newline-delimited JSON."""
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (json.dumps(data) + '\n').encode()
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Render a response as a single Server-Sent Event, 'error' for 4xx/5xx."""
+
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        response = (renderer_context or {}).get('response')
+        event = 'error' if response is not None and response.status_code >= 400 else 'message'
+        return sse_event(event, data).encode()
+
+
+# Renderers of the views that can stream, JSON first so it stays the default
+STREAMING_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer, EventStreamRenderer]
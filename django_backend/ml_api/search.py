@@ -0,0 +1,162 @@
+"""
+Full-text search over FashionItem title, description and style_category.
+On PostgreSQL a GIN index over the items' tsvector serves the search; on
+SQLite an FTS5 table kept in sync by triggers does. Both are created after
+migrate, since they are specific to the database vendor. Elsewhere, or when
+SQLite lacks FTS5, callers fall back to icontains lookups.
+"""
+
+import logging
+import re
+
+from django.db import DatabaseError, connections
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+
+from .models import FashionItem
+
+logger = logging.getLogger(__name__)
+
+SEARCH_COLUMNS = ('title', 'description', 'style_category')
+
+# Text search configuration for stemming and stop words (PostgreSQL)
+SEARCH_CONFIG = 'english'
+
+# Aliases known to have the search structures installed
+_installed = {}
+
+
+def _table():
+    return FashionItem._meta.db_table
+
+
+def _document_sql(table=None):
+    # Must match the indexed expression exactly for PostgreSQL to use the index
+    prefix = f'"{table}".' if table else ''
+    columns = " || ' ' || ".join(f"coalesce({prefix}\"{column}\", '')" for column in SEARCH_COLUMNS)
+    return f"to_tsvector('{SEARCH_CONFIG}', {columns})"
+
+
+def _postgres_statements():
+    table = _table()
+    return [
+        f'CREATE INDEX IF NOT EXISTS "{table}_search" ON "{table}" '
+        f'USING gin ({_document_sql()})',
+    ]
+
+
+def _sqlite_statements():
+    table = _table()
+    fts = f'{table}_fts'
+    columns = ', '.join(SEARCH_COLUMNS)
+    new = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+    old = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS)
+    delete_old = (
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old});"
+    )
+    insert_new = f'INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new});'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{columns}, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN {insert_new} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN {delete_old} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {columns} ON {table} '
+        f'BEGIN {delete_old} {insert_new} END',
+    ]
+
+
+def _sqlite_triggers(cursor):
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [_table()]
+    )
+    return {name for (name,) in cursor.fetchall()}
+
+
+def install_search(using='default', **kwargs):
+    """
+    Create the full-text search structures on a database.
+
+    Connected to post_migrate. Idempotent. On SQLite the FTS table is rebuilt
+    from the items whenever its triggers had to be (re)created, e.g. after a
+    migration rebuilt the items table, which drops its triggers.
+    """
+    connection = connections[using]
+    table = _table()
+    if table not in connection.introspection.table_names():
+        return
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                for statement in _postgres_statements():
+                    cursor.execute(statement)
+            elif connection.vendor == 'sqlite':
+                statements = _sqlite_statements()
+                before = _sqlite_triggers(cursor)
+                for statement in statements:
+                    cursor.execute(statement)
+                if _sqlite_triggers(cursor) - before:
+                    cursor.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+                    logger.info(f"Indexed {table} for full-text search")
+            else:
+                return
+    except DatabaseError as e:
+        # e.g. SQLite built without FTS5
+        logger.warning(f"Full-text search not installed on {connection.vendor}: {e}")
+        return
+    _installed[using] = True
+
+
+def search_available(using='default'):
+    """Return whether full-text search is installed on a database."""
+    if using not in _installed:
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, _table())
+            available = f'{_table()}_search' in constraints
+        elif connection.vendor == 'sqlite':
+            available = f'{_table()}_fts' in connection.introspection.table_names()
+        else:
+            available = False
+        _installed[using] = available
+    return _installed[using]
+
+
+def fts_query(terms):
+    """
+    Turn user input into an FTS5 query matching items that contain every
+    word, each as a prefix, like a chain of icontains lookups would.
+    """
+    words = re.findall(r'\w+', terms)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_items(queryset, terms):
+    """
+    Filter FashionItems by a full-text search.
+
+    Args:
+        queryset (QuerySet): FashionItem queryset to filter
+        terms (str): Search input
+
+    Returns:
+        QuerySet or None: The filtered queryset, or None when full-text
+            search is not available on the queryset's database
+    """
+    using = queryset.db
+    if not terms.strip() or not search_available(using):
+        return None
+    vendor = connections[using].vendor
+    table = _table()
+    if vendor == 'postgresql':
+        # websearch syntax: words, "quoted phrases", OR and -excluded words
+        return queryset.filter(RawSQL(
+            f"{_document_sql(table)} @@ websearch_to_tsquery('{SEARCH_CONFIG}', %s)",
+            [terms], output_field=BooleanField(),
+        ))
+    query = fts_query(terms)
+    if not query:
+        return queryset.none()
+    return queryset.filter(id__in=RawSQL(
+        f'SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH %s', [query],
+    ))
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import FashionItem, StyleRecommendation
+from .models import FashionItem, InferenceJob, StyleRecommendation
 
 
 class FashionItemSerializer(serializers.ModelSerializer):
@@ -14,4 +14,11 @@ class StyleRecommendationSerializer(serializers.ModelSerializer):
     class Meta:
         model = StyleRecommendation
         fields = ['id', 'source_item', 'recommended_item', 'recommended_item_details', 
-                  'similarity_score', 'recommendation_reason', 'created_at']
\ No newline at end of file
+                  'similarity_score', 'recommendation_reason', 'created_at']
+
+class InferenceJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = InferenceJob
+        fields = ['id', 'kind', 'status', 'payload', 'result', 'error', 'attempts',
+                  'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
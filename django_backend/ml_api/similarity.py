@@ -0,0 +1,632 @@
+"""
+Similarity engine for fashion items.
+Item embeddings live in a memory-mapped float32 matrix on disk and are searched
+with an inverted-file (IVF) index, so top-k lookups only score the few lists
+closest to the query instead of the whole catalog.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .clustering import assign, kmeans
+from .neighbours import refresh_neighbours
+from .palette import load_pixels
+
+logger = logging.getLogger(__name__)
+
+# Color histogram with HISTOGRAM_BINS levels per RGB channel
+HISTOGRAM_BINS = 8
+EMBEDDING_DIM = HISTOGRAM_BINS ** 3
+
+# Assignment of rows that have not been placed in an IVF list yet
+UNASSIGNED = -1
+# Assignment of rows whose item was removed
+REMOVED = -2
+
+
+def embed_pixels(pixels):
+    """
+    Embed (n, 3) RGB pixels as a unit-length color histogram.
+
+    The histogram is square-rooted (Hellinger embedding), which makes it unit
+    length, so a dot product between two embeddings is their similarity in
+    [0, 1].
+    """
+    levels = np.clip((pixels * (HISTOGRAM_BINS / 256.0)).astype(np.int64), 0, HISTOGRAM_BINS - 1)
+    codes = (levels[:, 0] * HISTOGRAM_BINS + levels[:, 1]) * HISTOGRAM_BINS + levels[:, 2]
+    histogram = np.bincount(codes, minlength=EMBEDDING_DIM).astype(np.float32)
+    return np.sqrt(histogram / max(histogram.sum(), 1.0))
+
+
+def embed_image(image):
+    """Embed an image given as a path, file object or PIL image."""
+    return embed_pixels(load_pixels(image))
+
+
+def embed_tensor(tensor):
+    """Embed a (h, w, 3) model-input tensor with values in [0, 1]."""
+    return embed_pixels(np.asarray(tensor).reshape(-1, 3) * 255.0)
+
+
+class EmbeddingStore:
+    """
+    Append-only, memory-mapped store of item embeddings.
+
+    Three columns are kept in flat files sized to a shared capacity that
+    doubles as items are added: the float32 vectors, the item ids and the
+    IVF list of each row. Writers serialize on a file lock, and readers in
+    other processes pick up new rows by re-reading meta.json.
+    """
+
+    def __init__(self, directory, dim=EMBEDDING_DIM):
+        self.directory = Path(directory)
+        self.dim = dim
+        self.count = 0
+        self.capacity = 0
+        self.vectors_file = None
+        self.ids_file = None
+        self.lists_file = None
+        self._rows = {}
+        self._meta_mtime = None
+        self._lock = threading.RLock()
+        self._lock_held = False
+
+    @property
+    def meta_path(self):
+        return self.directory / 'meta.json'
+
+    @property
+    def vectors(self):
+        """(count, dim) float32 view of the stored embeddings."""
+        self.refresh()
+        if self.vectors_file is None:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return self.vectors_file[:self.count]
+
+    @property
+    def ids(self):
+        """Item id of every row; removed rows hold -1."""
+        self.refresh()
+        if self.ids_file is None:
+            return np.empty(0, dtype=np.int64)
+        return self.ids_file[:self.count]
+
+    @property
+    def lists(self):
+        """IVF list of every row."""
+        self.refresh()
+        if self.lists_file is None:
+            return np.empty(0, dtype=np.int32)
+        return self.lists_file[:self.count]
+
+    def __len__(self):
+        self.refresh()
+        return len(self._rows)
+
+    def row_of(self, item_id):
+        """Return the row holding an item, or None."""
+        self.refresh()
+        return self._rows.get(item_id)
+
+    def lookup(self, item_ids):
+        """
+        Return the stored embeddings of many items at once.
+
+        Returns:
+            tuple: (positions, vectors) where positions lists the indices in
+                item_ids of the stored items and vectors holds their
+                embeddings, in the same order
+        """
+        self.refresh()
+        rows = [self._rows.get(item_id) for item_id in item_ids]
+        positions = [i for i, row in enumerate(rows) if row is not None]
+        if not positions:
+            return positions, np.empty((0, self.dim), dtype=np.float32)
+        return positions, self.vectors_file[[rows[i] for i in positions]]
+
+    @contextmanager
+    def write_lock(self):
+        """
+        Hold the cross-process writer lock and the latest on-disk state.
+
+        Re-entrant within a thread, so a caller holding it can use add,
+        remove and set_lists.
+        """
+        with self._lock:
+            if self._lock_held:
+                yield
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / 'lock', 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._lock_held = True
+                try:
+                    self.refresh()
+                    yield
+                finally:
+                    self._lock_held = False
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def refresh(self):
+        """Re-open the column files if another process changed them."""
+        try:
+            mtime = self.meta_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._meta_mtime:
+            return
+        with self._lock:
+            meta = json.loads(self.meta_path.read_text())
+            if meta['capacity'] != self.capacity or self.vectors_file is None:
+                self._map(meta['capacity'])
+            self.count = meta['count']
+            self._rows = {
+                int(item_id): row
+                for row, item_id in enumerate(self.ids_file[:self.count])
+                if item_id >= 0
+            }
+            self._meta_mtime = mtime
+
+    def add(self, item_ids, vectors, lists=None):
+        """
+        Insert or overwrite embeddings.
+
+        Args:
+            item_ids (list): FashionItem primary keys
+            vectors (numpy.ndarray): (n, dim) embeddings
+            lists (numpy.ndarray, optional): IVF list of each vector
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if lists is None:
+            lists = np.full(len(vectors), UNASSIGNED, dtype=np.int32)
+        with self.write_lock():
+            new = [item_id for item_id in dict.fromkeys(item_ids) if item_id not in self._rows]
+            self._reserve(self.count + len(new))
+            for item_id, vector, list_id in zip(item_ids, vectors, lists):
+                row = self._rows.get(item_id)
+                if row is None:
+                    row = self.count
+                    self.count += 1
+                    self._rows[item_id] = row
+                    self.ids_file[row] = item_id
+                self.vectors_file[row] = vector
+                self.lists_file[row] = list_id
+            self._commit()
+
+    def remove(self, item_id):
+        """Remove an item; its row is skipped by searches from now on."""
+        with self.write_lock():
+            row = self._rows.pop(item_id, None)
+            if row is None:
+                return
+            self.ids_file[row] = -1
+            self.lists_file[row] = REMOVED
+            self._commit()
+
+    def set_lists(self, lists):
+        """
+        Overwrite the IVF list of the first len(lists) rows (after retraining).
+
+        Rows added since the lists were computed are left UNASSIGNED, so
+        searches scan them until the next training.
+        """
+        with self.write_lock():
+            size = min(len(lists), self.count)
+            removed = self.lists_file[:size] == REMOVED
+            self.lists_file[:size] = np.where(removed, REMOVED, lists[:size])
+            newer = self.lists_file[size:self.count]
+            newer[newer != REMOVED] = UNASSIGNED
+            self._commit()
+
+    def _map(self, capacity):
+        self.capacity = capacity
+        if capacity == 0:
+            return
+        self.vectors_file = np.memmap(
+            self.directory / 'vectors.f32', dtype=np.float32, mode='r+',
+            shape=(capacity, self.dim),
+        )
+        self.ids_file = np.memmap(
+            self.directory / 'ids.i64', dtype=np.int64, mode='r+', shape=(capacity,)
+        )
+        self.lists_file = np.memmap(
+            self.directory / 'lists.i32', dtype=np.int32, mode='r+', shape=(capacity,)
+        )
+
+    def _reserve(self, size):
+        if size <= self.capacity:
+            return
+        capacity = max(1024, self.capacity * 2)
+        while capacity < size:
+            capacity *= 2
+        for name, itemsize in (('vectors.f32', 4 * self.dim), ('ids.i64', 8), ('lists.i32', 4)):
+            with open(self.directory / name, 'ab') as column:
+                column.truncate(capacity * itemsize)
+        self._map(capacity)
+
+    def _commit(self):
+        for column in (self.vectors_file, self.ids_file, self.lists_file):
+            column.flush()
+        temp_path = self.meta_path.with_suffix('.tmp')
+        temp_path.write_text(json.dumps({
+            'count': self.count, 'capacity': self.capacity, 'dim': self.dim,
+        }))
+        os.replace(temp_path, self.meta_path)
+        self._meta_mtime = self.meta_path.stat().st_mtime_ns
+
+
+class SimilarityIndex:
+    """
+    IVF approximate nearest-neighbour index over an EmbeddingStore.
+
+    Embeddings are partitioned into ``nlist`` lists around k-means centroids.
+    A query scores only the rows in its ``nprobe`` closest lists (plus rows
+    added since the last training that have no list yet). Below
+    ``min_train_size`` items the index is searched exhaustively. Adding items
+    never trains the lists; once the catalog has doubled since the last
+    training, ``needs_training`` is set and build_recommendations or a
+    background job calls ``train_if_needed``.
+
+    Args:
+        directory (str): Where the store and centroids are kept
+        nlist (int, optional): Number of lists, defaults to sqrt(n)
+        nprobe (int): Lists scanned per query
+        min_train_size (int): Items needed before lists are trained
+    """
+
+    def __init__(self, directory, nlist=None, nprobe=8, min_train_size=1000):
+        self.directory = Path(directory)
+        self.store = EmbeddingStore(self.directory)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.centroids = None
+        self.trained_count = 0
+        self._centroids_mtime = None
+
+    @property
+    def centroids_path(self):
+        return self.directory / 'centroids.npy'
+
+    def refresh(self):
+        """Load centroids written by another process."""
+        try:
+            mtime = self.centroids_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._centroids_mtime:
+            self.centroids = np.load(self.centroids_path)
+            self.trained_count = int(
+                json.loads((self.directory / 'index.json').read_text())['trained_count']
+            )
+            self._centroids_mtime = mtime
+
+    def train(self, sample_size=50000, seed=0):
+        """
+        Fit the IVF centroids on the stored embeddings and re-list every row.
+        """
+        vectors = self.store.vectors
+        count = len(vectors)
+        if count == 0:
+            return
+        nlist = self.nlist or int(np.clip(np.sqrt(count), 1, 4096))
+        rng = np.random.default_rng(seed)
+        sample = vectors[np.sort(rng.choice(count, size=min(count, sample_size), replace=False))]
+        centroids, _ = kmeans(
+            np.ascontiguousarray(sample), k=nlist, iterations=25,
+            batch_size=min(len(sample), 8192), seed=seed,
+        )
+        # Centroids are fitted on a snapshot; rows are assigned under the
+        # writer lock so that items added meanwhile are listed as well
+        with self.store.write_lock():
+            vectors = self.store.vectors
+            count = len(vectors)
+            self.store.set_lists(assign(vectors, centroids).astype(np.int32))
+
+        np.save(self.centroids_path.with_suffix('.tmp.npy'), centroids)
+        (self.directory / 'index.json').write_text(json.dumps({'trained_count': count}))
+        os.replace(self.centroids_path.with_suffix('.tmp.npy'), self.centroids_path)
+        self.refresh()
+        logger.info(f"Trained similarity index with {nlist} lists on {count} items")
+
+    @property
+    def needs_training(self):
+        """True once the catalog has doubled since the lists were last trained."""
+        self.refresh()
+        count = len(self.store)
+        return count >= self.min_train_size and count >= 2 * self.trained_count
+
+    def train_if_needed(self):
+        """
+        Train the lists if needs_training, unless another process is already
+        training them.
+
+        Returns:
+            bool: True if the lists were trained
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / 'train.lock', 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            try:
+                if not self.needs_training:
+                    return False
+                self.train()
+                return True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def add(self, item_ids, vectors):
+        """
+        Add or update item embeddings, assigning them to their IVF lists.
+
+        Only assigns rows to the current lists; retraining is left to
+        train_if_needed. Rows added before the first training stay
+        UNASSIGNED and are scanned by every query.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.store.dim)
+        self.refresh()
+        lists = None
+        if self.centroids is not None:
+            lists = assign(vectors, self.centroids).astype(np.int32)
+        self.store.add(item_ids, vectors, lists)
+
+    def remove(self, item_id):
+        self.store.remove(item_id)
+
+    def search(self, vector, k=10, exclude=()):
+        """
+        Find the items closest to a query embedding.
+
+        Args:
+            vector (numpy.ndarray): Query embedding
+            k (int): Number of neighbours
+            exclude (iterable): Item ids to leave out
+
+        Returns:
+            list: [(item_id, score), ...] best match first
+        """
+        self.refresh()
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        vectors, ids, lists = self.store.vectors, self.store.ids, self.store.lists
+
+        if self.centroids is None:
+            candidates = np.flatnonzero(lists != REMOVED)
+        else:
+            nprobe = min(self.nprobe, len(self.centroids))
+            probe = np.argpartition(-(self.centroids @ vector), nprobe - 1)[:nprobe]
+            candidates = np.flatnonzero(np.isin(lists, probe) | (lists == UNASSIGNED))
+
+        if exclude:
+            candidates = candidates[~np.isin(ids[candidates], list(exclude))]
+        if len(candidates) == 0:
+            return []
+
+        scores = vectors[candidates] @ vector
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[candidates[i]]), float(scores[i])) for i in top]
+
+    def similar_to(self, item_id, k=10):
+        """Find the items closest to an indexed item."""
+        row = self.store.row_of(item_id)
+        if row is None:
+            return []
+        return self.search(self.store.vectors[row], k=k, exclude={item_id})
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_similarity_index():
+    """Return the process-wide similarity index configured in settings."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                config = getattr(settings, 'ML_SIMILARITY', {})
+                _index = SimilarityIndex(
+                    config.get('DATA_DIR', Path(settings.BASE_DIR) / 'ml_data' / 'similarity'),
+                    nlist=config.get('NLIST'),
+                    nprobe=config.get('NPROBE', 8),
+                    min_train_size=config.get('MIN_TRAIN_SIZE', 1000),
+                )
+    return _index
+
+
+def recommendation_reason(score):
+    return f"Similar color profile ({score:.0%} match)"
+
+
+def upsert_recommendations(triples, batch_size=1000):
+    """
+    Insert or update StyleRecommendation rows with bulk upserts.
+
+    Existing (source_item, recommended_item) pairs get their score and
+    reason updated, so re-running a build never violates unique_together.
+
+    Args:
+        triples (iterable): (source_id, recommended_id, score) tuples
+        batch_size (int): Rows per INSERT statement
+    """
+    from .models import StyleRecommendation
+
+    rows = [
+        StyleRecommendation(
+            source_item_id=source_id,
+            recommended_item_id=item_id,
+            similarity_score=score,
+            recommendation_reason=recommendation_reason(score),
+        )
+        for source_id, item_id, score in triples
+    ]
+    StyleRecommendation.objects.bulk_create(
+        rows,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['source_item', 'recommended_item'],
+        update_fields=['similarity_score', 'recommendation_reason'],
+    )
+
+
+def replace_recommendations(lists, batch_size=1000):
+    """
+    Make the given neighbours the complete StyleRecommendation set of their
+    source items.
+
+    The neighbours are upserted, and rows of the same source items that are
+    not among them, e.g. pairs that dropped out of a rebuilt top k, are
+    deleted in the same transaction.
+
+    Args:
+        lists (dict): {source_id: (item_ids, scores)}, best match first
+        batch_size (int): Rows per INSERT or DELETE statement
+    """
+    from django.db import transaction
+
+    from .models import StyleRecommendation
+
+    keep = {
+        (source_id, int(item_id))
+        for source_id, (item_ids, _) in lists.items()
+        for item_id in item_ids
+    }
+    with transaction.atomic():
+        existing = (
+            StyleRecommendation.objects
+            .filter(source_item_id__in=list(lists))
+            .values_list('id', 'source_item_id', 'recommended_item_id')
+        )
+        stale = [
+            row_id for row_id, source_id, item_id in existing
+            if (source_id, item_id) not in keep
+        ]
+        for start in range(0, len(stale), batch_size):
+            StyleRecommendation.objects.filter(id__in=stale[start:start + batch_size]).delete()
+        upsert_recommendations(
+            (
+                (source_id, int(item_id), float(score))
+                for source_id, (item_ids, scores) in lists.items()
+                for item_id, score in zip(item_ids, scores)
+            ),
+            batch_size=batch_size,
+        )
+
+
+def add_reverse_recommendations(item_id, neighbours, k):
+    """
+    Record an item as a recommendation of each of its neighbours where it
+    ranks in their top k, and delete the rows it pushes out of the top k.
+
+    Args:
+        item_id (int): The new or re-indexed item
+        neighbours (list): [(neighbour_id, score), ...]
+        k (int): Recommendations kept per item
+    """
+    from django.db import transaction
+    from django.db.models import Q
+
+    from .models import StyleRecommendation
+
+    ranked = {neighbour_id: [] for neighbour_id, _ in neighbours}
+    rows = (
+        StyleRecommendation.objects
+        .filter(source_item_id__in=list(ranked))
+        .exclude(recommended_item_id=item_id)
+        .values_list('source_item_id', 'recommended_item_id', 'similarity_score')
+    )
+    for source_id, recommended_id, score in rows:
+        ranked[source_id].append((score, recommended_id))
+
+    triples, stale = [], Q()
+    for neighbour_id, score in neighbours:
+        current = sorted(ranked[neighbour_id], reverse=True)
+        if len(current) >= k and score <= current[k - 1][0]:
+            # Not among the neighbour's top k, e.g. after a re-index
+            stale |= Q(source_item_id=neighbour_id, recommended_item_id=item_id)
+            continue
+        triples.append((neighbour_id, item_id, score))
+        displaced = [recommended_id for _, recommended_id in current[k - 1:]]
+        if displaced:
+            stale |= Q(source_item_id=neighbour_id, recommended_item_id__in=displaced)
+
+    with transaction.atomic():
+        if stale:
+            StyleRecommendation.objects.filter(stale).delete()
+        upsert_recommendations(triples)
+
+
+def schedule_training():
+    """
+    Queue a background job retraining the index lists, unless one is
+    already pending or running.
+    """
+    from .jobs import TRAIN_SIMILARITY_INDEX, JobQueueFull, job_runner
+    from .models import InferenceJob
+
+    queued = InferenceJob.objects.filter(
+        kind=TRAIN_SIMILARITY_INDEX,
+        status__in=[InferenceJob.STATUS_PENDING, InferenceJob.STATUS_RUNNING],
+    ).exists()
+    if queued:
+        return
+    try:
+        job_runner.submit(TRAIN_SIMILARITY_INDEX, {})
+    except JobQueueFull as e:
+        # Rows stay searchable unassigned; a later add or build retries
+        logger.warning(f"Could not schedule similarity index training: {e}")
+
+
+def index_item(item, k=None):
+    """
+    Embed an item's image, add it to the index and store its recommendations,
+    replacing those of a previous image.
+
+    The new item is also recorded as a recommendation for each neighbour
+    whose top k it now enters, displacing that neighbour's weakest match,
+    and the packed neighbour lists of all of them are refreshed.
+
+    Args:
+        item (FashionItem): The item to index
+        k (int, optional): Number of neighbours, defaults to settings TOP_K
+
+    Returns:
+        list: The item's neighbours as [(item_id, score), ...]
+    """
+    from .ingestion import item_tensor
+
+    k = k or getattr(settings, 'ML_SIMILARITY', {}).get('TOP_K', 10)
+    vector = embed_tensor(item_tensor(item))
+
+    from .models import StyleRecommendation
+
+    index = get_similarity_index()
+    index.add([item.pk], vector[None, :])
+    if index.needs_training:
+        schedule_training()
+    neighbours = index.search(vector, k=k, exclude={item.pk})
+    neighbour_ids = [neighbour_id for neighbour_id, _ in neighbours]
+    replace_recommendations({item.pk: (neighbour_ids, [score for _, score in neighbours])})
+    add_reverse_recommendations(item.pk, neighbours, k)
+    # A re-indexed item, e.g. with a new image, is dropped from the items
+    # it is no longer a neighbour of; the next build re-ranks them
+    dropped = StyleRecommendation.objects.filter(recommended_item_id=item.pk).exclude(
+        source_item_id__in=neighbour_ids
+    )
+    dropped_ids = list(dropped.values_list('source_item_id', flat=True))
+    if dropped_ids:
+        dropped.delete()
+    refresh_neighbours([item.pk, *neighbour_ids, *dropped_ids], k=k)
+    return neighbours
@@ -0,0 +1,91 @@
+"""
+Live per-process counters behind /api/model-status.
+Counters are updated on the inference path and read on every status poll, so
+both recording and reading take constant time.
+"""
+
+import os
+import threading
+import time
+
+# Sliding windows for request rates, in seconds
+RATE_WINDOWS = (10, 60, 300)
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class SlidingRate:
+    """
+    Event rates over sliding windows of whole seconds.
+
+    Events are counted in one-second slots of a ring as long as the longest
+    window, and a running total is kept per window as slots enter and leave
+    it. Catching up after an idle gap touches at most one ring's worth of
+    slots, so neither recording nor reading depends on the traffic.
+
+    Args:
+        windows (tuple): Window lengths in seconds
+    """
+
+    def __init__(self, windows=RATE_WINDOWS):
+        self.windows = tuple(sorted(windows))
+        self.total = 0
+        self._size = self.windows[-1]
+        self._slots = [0] * self._size
+        self._totals = [0] * len(self.windows)
+        self._started = self._second = int(time.monotonic())
+        self._lock = threading.Lock()
+
+    def _advance(self, now):
+        if now - self._second >= self._size:
+            self._slots = [0] * self._size
+            self._totals = [0] * len(self.windows)
+        else:
+            for second in range(self._second + 1, now + 1):
+                # Second `second - window` leaves each window as `second` starts
+                for i, window in enumerate(self.windows):
+                    self._totals[i] -= self._slots[(second - window) % self._size]
+                self._slots[second % self._size] = 0
+        self._second = now
+
+    def record(self, count=1):
+        """Count events at the current second."""
+        now = int(time.monotonic())
+        with self._lock:
+            if now > self._second:
+                self._advance(now)
+            self._slots[now % self._size] += count
+            for i in range(len(self._totals)):
+                self._totals[i] += count
+            self.total += count
+
+    def rates(self):
+        """
+        Return events per second over each window, e.g. {'10s': 1.5, ...}.
+
+        Windows longer than the counter's lifetime are averaged over the
+        lifetime instead, so rates are not understated right after startup.
+        """
+        now = int(time.monotonic())
+        with self._lock:
+            if now > self._second:
+                self._advance(now)
+            age = now - self._started + 1
+            return {
+                f'{window}s': round(total / min(window, age), 3)
+                for window, total in zip(self.windows, self._totals)
+            }
+
+
+def process_rss():
+    """
+    Return the resident set size of this process in bytes.
+
+    Reads /proc/self/statm, which is constant-time unlike smaps. Returns None
+    on platforms without procfs.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
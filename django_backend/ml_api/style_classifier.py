@@ -0,0 +1,165 @@
+"""
+Style classifier over item image embeddings.
+A scikit-learn pipeline maps the color-histogram embeddings of similarity.py
+to style categories. It is trained on labelled embeddings, either the
+style-analyzer reference set of the knn backend or catalog items whose
+style_category is already set, and saved as a joblib bundle that the sklearn
+backend serves and classify_items applies to the whole catalog in batches.
+"""
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Supported models: a multinomial logistic regression, or a distance-weighted
+# vote of the nearest labelled embeddings
+CLASSIFIERS = ('logistic', 'knn')
+
+
+def build_pipeline(kind='logistic', k=15):
+    """
+    Build an unfitted scikit-learn pipeline.
+
+    Args:
+        kind (str): 'logistic' or 'knn'
+        k (int): Neighbours voting in the knn classifier
+    """
+    from sklearn.pipeline import make_pipeline
+
+    if kind == 'logistic':
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.preprocessing import StandardScaler
+        return make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000))
+    if kind == 'knn':
+        from sklearn.neighbors import KNeighborsClassifier
+        # Embeddings are unit length, so euclidean order matches cosine order;
+        # brute force is one matrix product per batch
+        return make_pipeline(KNeighborsClassifier(n_neighbors=k, weights='distance', algorithm='brute'))
+    raise ValueError(f"Unknown classifier '{kind}'. Available: {', '.join(CLASSIFIERS)}")
+
+
+class StyleClassifier:
+    """
+    A fitted pipeline and the style categories it predicts.
+
+    Args:
+        pipeline: Fitted scikit-learn pipeline whose classes are indices
+            into categories
+        categories (list): Category names
+        kind (str): Classifier the pipeline was built with
+    """
+
+    def __init__(self, pipeline, categories, kind='logistic'):
+        self.pipeline = pipeline
+        self.categories = list(categories)
+        self.kind = kind
+
+    @classmethod
+    def train(cls, vectors, labels, categories, kind='logistic', k=15):
+        """
+        Fit a classifier.
+
+        Args:
+            vectors (numpy.ndarray): (n, d) embeddings
+            labels (numpy.ndarray): (n,) category index of each embedding
+            categories (list): Category names
+            kind (str): 'logistic' or 'knn'
+            k (int): Neighbours voting in the knn classifier
+        """
+        pipeline = build_pipeline(kind, k=min(k, len(labels)))
+        pipeline.fit(np.asarray(vectors, dtype=np.float32), np.asarray(labels))
+        return cls(pipeline, categories, kind)
+
+    def predict_proba(self, vectors):
+        """
+        Score a batch of embeddings.
+
+        Returns:
+            numpy.ndarray: (n, len(categories)) probabilities; categories
+                absent from the training data score 0
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        probabilities = np.zeros((len(vectors), len(self.categories)), dtype=np.float32)
+        if len(vectors):
+            probabilities[:, self.pipeline.classes_] = self.pipeline.predict_proba(vectors)
+        return probabilities
+
+    def predict(self, vectors):
+        """Return the most likely category name of each embedding."""
+        best = self.predict_proba(vectors).argmax(axis=1)
+        return [self.categories[c] for c in best]
+
+    def analyze(self, vectors, top_n=3):
+        """
+        Return style-analyzer outputs, in the format of the knn backend.
+
+        Returns:
+            list: One {'style_categories': [...], 'scores': {...}} per embedding
+        """
+        outputs = []
+        for row in self.predict_proba(vectors):
+            order = [c for c in np.argsort(-row)[:top_n] if row[c] > 0]
+            outputs.append({
+                'style_categories': [self.categories[c] for c in order],
+                'scores': {self.categories[c]: round(float(row[c]), 4) for c in order},
+            })
+        return outputs
+
+    def save(self, path):
+        """Save the classifier as a joblib bundle."""
+        import joblib
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump(
+            {'pipeline': self.pipeline, 'categories': self.categories, 'kind': self.kind}, path
+        )
+
+    @classmethod
+    def load(cls, path, shared=True):
+        """Load a bundle written by save, memory-mapping its arrays if shared."""
+        from .weights import load_joblib
+
+        bundle = load_joblib(path, shared=shared)
+        return cls(bundle['pipeline'], bundle['categories'], bundle.get('kind', 'logistic'))
+
+
+def reference_set(directory):
+    """
+    Load the labelled references of the knn style-analyzer model.
+
+    Returns:
+        tuple: (vectors, labels, categories)
+    """
+    from .weights import load_arrays, load_metadata
+
+    arrays = load_arrays(directory, shared=False)
+    return arrays['embeddings'], arrays['labels'], load_metadata(directory)['categories']
+
+
+def labelled_items(batch_size=1000):
+    """
+    Collect the embeddings of catalog items that have a style_category.
+
+    Returns:
+        tuple: (vectors, labels, categories)
+    """
+    from .models import FashionItem
+    from .similarity import get_similarity_index
+
+    store = get_similarity_index().store
+    rows = (
+        FashionItem.objects.exclude(style_category='')
+        .values_list('id', 'style_category')
+        .iterator(chunk_size=batch_size)
+    )
+    item_ids, names = [], []
+    for item_id, name in rows:
+        item_ids.append(item_id)
+        names.append(name)
+    positions, vectors = store.lookup(item_ids)
+    categories = sorted({names[i] for i in positions})
+    index = {name: c for c, name in enumerate(categories)}
+    labels = np.array([index[names[i]] for i in positions], dtype=np.int32)
+    return vectors, labels, categories
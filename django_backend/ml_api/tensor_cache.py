@@ -0,0 +1,102 @@
+"""
+On-disk cache of preprocessed model-input tensors.
+Tensors are keyed by the SHA-256 of the source image bytes and stored as .npy
+files that are memory-mapped on read, so the same image is decoded and
+preprocessed once no matter how often, or by which worker, it is analyzed.
+The cache is capped in bytes and evicts least recently used entries.
+"""
+
+import hashlib
+import io
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .disk_cache import DiskLRU
+
+
+def content_key(data):
+    """Return the cache key of raw image bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class TensorCache(DiskLRU):
+    """
+    Size-capped LRU cache of .npy arrays, see DiskLRU.
+
+    Args:
+        directory: Cache directory
+        max_bytes (int): Size cap
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, low_watermark=0.9):
+        super().__init__(directory, max_bytes, '.npy', low_watermark=low_watermark)
+
+    def get(self, key):
+        """
+        Return the cached array for a key, memory-mapped read-only, or None.
+        """
+        path = self.path_for(key)
+        try:
+            array = np.load(path, mmap_mode='r', allow_pickle=False)
+        except (FileNotFoundError, ValueError):
+            # ValueError: a partially evicted or truncated file
+            self.miss()
+            return None
+        self.hit(path)
+        return array
+
+    def set(self, key, array):
+        """Store an array under a key, evicting old entries if over the cap."""
+        self.write(key, lambda f: np.save(f, np.ascontiguousarray(array), allow_pickle=False))
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached array for a key, computing and storing it on a miss.
+
+        Args:
+            key (str): Cache key, e.g. from content_key
+            compute (callable): Returns the array to cache
+        """
+        array = self.get(key)
+        if array is None:
+            array = compute()
+            self.set(key, array)
+        return array
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tensor_cache():
+    """Return the process-wide tensor cache configured in settings."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = getattr(settings, 'ML_TENSOR_CACHE', {})
+                _cache = TensorCache(
+                    config.get('DIR', Path(settings.BASE_DIR) / 'ml_data' / 'tensors'),
+                    max_bytes=config.get('MAX_BYTES', 512 * 1024 * 1024),
+                )
+    return _cache
+
+
+def tensor_for_bytes(data):
+    """
+    Return the model-input tensor of an encoded image, through the cache.
+
+    Args:
+        data (bytes): Encoded image, e.g. the body of a fetched image URL
+
+    Returns:
+        numpy.ndarray: (TENSOR_SIDE, TENSOR_SIDE, 3) float32 tensor
+    """
+    from .ingestion import process_image
+
+    return get_tensor_cache().get_or_compute(
+        content_key(data), lambda: process_image(io.BytesIO(data))[1]
+    )
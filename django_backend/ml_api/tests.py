@@ -0,0 +1,170 @@
+"""
+Tests for the ml_api endpoints and the inference engine.
+
+Each list page must cost a fixed number of queries however many rows it
+holds, so a serializer that starts touching a relation per row fails here.
+"""
+
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APITestCase
+
+from .inference import InferenceEngine
+from .models import FashionItem, ItemNeighbours, StyleRecommendation
+from .neighbours import pack
+
+PAGE_SIZES = (1, 10, 50)
+
+
+class QueryCountTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester')
+        FashionItem.objects.bulk_create(
+            FashionItem(title=f'item {i}', image=f'fashion_items/{i}.jpg') for i in range(120)
+        )
+        cls.items = list(FashionItem.objects.order_by('id'))
+        cls.source, *cls.others = cls.items
+        StyleRecommendation.objects.bulk_create(
+            StyleRecommendation(
+                source_item=cls.source,
+                recommended_item=item,
+                similarity_score=1 - i / 100,
+                recommendation_reason='Similar style',
+            )
+            for i, item in enumerate(cls.others)
+        )
+        ItemNeighbours.objects.create(
+            item=cls.source,
+            packed=pack([item.pk for item in cls.others], [1 - i / 100 for i in range(len(cls.others))]),
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        for cache in caches.all():
+            cache.clear()
+
+    def assertPageQueries(self, url, params, count, expected_queries):
+        with self.assertNumQueries(expected_queries):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), count)
+        return response
+
+    def test_recommendations_page(self):
+        for page_size in PAGE_SIZES:
+            with self.subTest(page_size=page_size):
+                response = self.assertPageQueries(
+                    '/api/recommendations/', {'page_size': page_size}, page_size, 1
+                )
+                self.assertIn('recommended_item_details', response.data['results'][0])
+
+    def test_recommendations_page_for_source(self):
+        for page_size in PAGE_SIZES:
+            with self.subTest(page_size=page_size):
+                self.assertPageQueries(
+                    '/api/recommendations/',
+                    {'source_id': self.source.pk, 'page_size': page_size},
+                    page_size,
+                    1,
+                )
+
+    def test_fashion_items_cursor_page(self):
+        for page_size in PAGE_SIZES:
+            with self.subTest(page_size=page_size):
+                first = self.assertPageQueries(
+                    '/api/fashion-items/', {'page_size': page_size}, page_size, 1
+                )
+                # A later page filters on the cursor instead of an OFFSET
+                with self.assertNumQueries(1):
+                    response = self.client.get(first.data['next'])
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), page_size)
+                first_ids = {item['id'] for item in first.data['results']}
+                self.assertFalse(first_ids & {item['id'] for item in response.data['results']})
+
+    def test_similar_items(self):
+        url = f'/api/fashion-items/{self.source.pk}/similar_items/'
+        for limit in PAGE_SIZES:
+            with self.subTest(limit=limit):
+                for cache in caches.all():
+                    cache.clear()
+                # The neighbour list, then the item and its neighbours
+                with self.assertNumQueries(2):
+                    response = self.client.get(url, {'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [row['recommended_item'] for row in response.data],
+                    [item.pk for item in self.others[:limit]],
+                )
+                # A cached neighbour list leaves the item query only
+                with self.assertNumQueries(1):
+                    self.client.get(url, {'limit': limit})
+
+    def test_similar_items_rejects_limit_below_one(self):
+        url = f'/api/fashion-items/{self.source.pk}/similar_items/'
+        for limit in ('0', '-1', 'ten'):
+            with self.subTest(limit=limit):
+                response = self.client.get(url, {'limit': limit})
+                self.assertEqual(response.status_code, 400)
+
+
+class SlowSharedCache(LocMemCache):
+    """Shared result cache taking SLOW_SECONDS per call for fashion-gen keys."""
+
+    SLOW_SECONDS = 0.5
+
+    def _delay(self, keys):
+        if any(':fashion-gen:' in key for key in keys):
+            time.sleep(self.SLOW_SECONDS)
+
+    def get(self, key, default=None, version=None):
+        self._delay([key])
+        return super().get(key, default=default, version=version)
+
+    def set(self, key, value, timeout=None, version=None):
+        self._delay([key])
+        return super().set(key, value, timeout=timeout, version=version)
+
+    def get_many(self, keys, version=None):
+        self._delay(keys)
+        return super().get_many(keys, version=version)
+
+    def set_many(self, data, timeout=None, version=None):
+        self._delay(data)
+        return super().set_many(data, timeout=timeout, version=version)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'slow': {'BACKEND': 'ml_api.tests.SlowSharedCache', 'LOCATION': 'slow'},
+})
+class SharedResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.engine = InferenceEngine({
+            'LATENCY': {},
+            'BATCHING': {'ENABLED': False},
+            'ADMISSION': {'ENABLED': False},
+            'COALESCING': {'ENABLED': False},
+            'RESULT_CACHE': {'ALIAS': 'slow'},
+        })
+
+    def test_slow_shared_cache_does_not_delay_other_requests(self):
+        # Warm both models so loading does not count
+        self.engine.predict('style-analyzer', ['/media/warm-up.jpg'])
+        slow = self.engine.submit(self.engine._predict('fashion-gen', ['summer linen']))
+        time.sleep(0.05)
+        started = time.perf_counter()
+        self.engine.predict('style-analyzer', ['/media/other.jpg'])
+        elapsed = time.perf_counter() - started
+        self.assertLess(elapsed, SlowSharedCache.SLOW_SECONDS / 2)
+        # The slow call still completes and fills the shared tier
+        slow.result(timeout=5)
+        self.assertEqual(self.engine.cache.stats()['shared_hits'], 0)
+        self.engine.cache.clear()
+        self.engine.predict('fashion-gen', ['summer linen'])
+        self.assertEqual(self.engine.cache.stats()['shared_hits'], 1)
@@ -1,10 +1,27 @@
+from django.conf import settings
 from django.urls import path
+from rest_framework.routers import SimpleRouter
 from . import views
 
+if settings.ML_API_ASYNC_VIEWS:
+    from . import async_views as ml_views
+else:
+    ml_views = views
+
+router = SimpleRouter()
+router.register('fashion-items', views.FashionItemViewSet, basename='fashion-item')
+router.register('recommendations', views.StyleRecommendationViewSet, basename='recommendation')
+
 urlpatterns = [
-    path('generate-ideas', views.generate_ideas, name='generate-ideas'),
-    path('generate-image', views.generate_image, name='generate-image'),
-    path('analyze-style', views.analyze_style, name='analyze-style'),
-    path('model-status', views.model_status, name='model-status'),
-    path('health', views.health_check, name='health-check'),
-]
\ No newline at end of file
+    path('generate-ideas', ml_views.generate_ideas, name='generate-ideas'),
+    path('generate-ideas/batch', ml_views.generate_ideas_batch, name='generate-ideas-batch'),
+    path('generate-image', ml_views.generate_image, name='generate-image'),
+    path('analyze-style', ml_views.analyze_style, name='analyze-style'),
+    path('analyze-style/batch', ml_views.analyze_style_batch, name='analyze-style-batch'),
+    path('model-status', ml_views.model_status, name='model-status'),
+    path('health', ml_views.health_check, name='health-check'),
+    path('jobs/<uuid:job_id>', views.job_detail, name='job-detail'),
+    path('metrics', views.metrics, name='metrics'),
+]
+
+urlpatterns += router.urls
@@ -1,15 +1,184 @@
-from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+import json
+import logging
+from datetime import datetime
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from rest_framework import status, viewsets
+from rest_framework.decorators import action, api_view, permission_classes, renderer_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 
+from .admission import Overloaded
+from .jobs import JobQueueFull, job_runner
 from .ml_service import ml_service
+from .models import FashionItem, InferenceJob, StyleRecommendation
+from .pagination import CreatedAtCursorPagination
+from .renderers import STREAMING_RENDERERS, sse_event
+from .serializers import (
+    FashionItemSerializer, InferenceJobSerializer, StyleRecommendationSerializer,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def wants_job(request):
+    """Return True if the client asked for a background job instead of a result."""
+    return (
+        request.query_params.get('mode') == 'job'
+        or str(request.data.get('async', '')).lower() in ('1', 'true')
+    )
+
+
+def submit_job(request, kind, payload):
+    """
+    Queue a background job and build the 202 response pointing at it.
+    """
+    try:
+        job = job_runner.submit(kind, payload, user=request.user)
+    except JobQueueFull as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={'Retry-After': '5'}
+        )
+    data = InferenceJobSerializer(job).data
+    data['status_url'] = reverse('job-detail', args=[job.id], request=request)
+    return Response(data, status=status.HTTP_202_ACCEPTED)
+
+
+def overloaded_response(error):
+    """
+    Build the 429/503 response for a model call refused by admission control.
+    """
+    return Response(
+        {'error': str(error)},
+        status=error.status_code,
+        headers={'Retry-After': str(error.retry_after)}
+    )
+
+
+def batch_inputs(request, field):
+    """
+    Validate the input array of a batch request.
+
+    Returns:
+        tuple: (inputs, None) or (None, error Response)
+    """
+    inputs = request.data.get(field)
+    max_items = settings.ML_BATCH_MAX_ITEMS
+
+    if not isinstance(inputs, list) or not inputs:
+        return None, Response(
+            {'error': f'{field} must be a non-empty list'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(inputs) > max_items:
+        return None, Response(
+            {'error': f'At most {max_items} items are allowed per batch'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not all(isinstance(value, str) and value for value in inputs):
+        return None, Response(
+            {'error': f'{field} must only contain non-empty strings'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return inputs, None
+
+
+def wants_stream(request):
+    """Return True if the client asked for NDJSON streaming."""
+    return (
+        request.query_params.get('stream') in ('1', 'true')
+        or 'application/x-ndjson' in request.headers.get('Accept', '')
+    )
+
+
+def wants_event_stream(request):
+    """Return True if the client asked for Server-Sent Events."""
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def stream_chunk(event, data, sse):
+    """Encode one streamed event as a Server-Sent Event or an NDJSON line."""
+    if sse:
+        return sse_event(event, data)
+    return json.dumps({'event': event, **data}) + '\n'
+
+
+def done_event(count):
+    """Payload of the event closing a stream of ideas."""
+    return {'count': count, 'timestamp': datetime.now().isoformat(), 'model': 'fashion-gen'}
+
+
+def streaming_response(chunks, sse):
+    """Wrap encoded chunks in a streaming response of the negotiated type."""
+    response = StreamingHttpResponse(
+        chunks, content_type='text/event-stream' if sse else 'application/x-ndjson'
+    )
+    if sse:
+        response['Cache-Control'] = 'no-cache'
+        # Keep reverse proxies such as nginx from buffering events
+        response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def idea_stream_response(first, ideas, sse):
+    """
+    Stream ideas as NDJSON lines or Server-Sent Events.
+
+    Every idea is sent as an 'idea' event with its index, then a 'done'
+    event with the count, or an 'error' event if generation fails part way.
+
+    Args:
+        first (str): First idea, already taken from ideas, or None
+        ideas (iterator): The remaining ideas
+        sse (bool): Send Server-Sent Events instead of NDJSON
+    """
+    def chunks():
+        count = 0
+        idea = first
+        try:
+            while idea is not None:
+                yield stream_chunk('idea', {'index': count, 'idea': idea}, sse)
+                count += 1
+                idea = next(ideas, None)
+        except Exception as e:
+            yield stream_chunk('error', {'error': str(e)}, sse)
+            return
+        yield stream_chunk('done', done_event(count), sse)
+
+    return streaming_response(chunks(), sse)
+
+
+def batch_response(items):
+    """Build the response body of a non-streamed batch."""
+    return {
+        'results': items,
+        'count': len(items),
+        'errors': sum(1 for item in items if 'error' in item),
+    }
+
+
+def ndjson_response(items):
+    """Stream batch items as newline-delimited JSON as they complete."""
+    return StreamingHttpResponse(
+        (json.dumps(item) + '\n' for item in items),
+        content_type='application/x-ndjson'
+    )
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(STREAMING_RENDERERS)
 def generate_ideas(request):
     """
     Generate fashion design ideas based on a text prompt.
+
+    With ?stream=1 the ideas are streamed as NDJSON as they are generated,
+    or as Server-Sent Events with Accept: text/event-stream.
     """
     prompt = request.data.get('prompt')
     
@@ -19,20 +188,68 @@ def generate_ideas(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    sse = wants_event_stream(request)
+    if sse or wants_stream(request):
+        ideas = ml_service.stream_ideas(prompt)
+        # Failures before the first idea still get a status code
+        try:
+            first = next(ideas, None)
+        except Overloaded as e:
+            return overloaded_response(e)
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        return idea_stream_response(first, ideas, sse)
+    
     try:
         result = ml_service.generate_ideas(prompt)
         return Response(result, status=status.HTTP_200_OK)
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         return Response(
             {'error': str(e)}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes(STREAMING_RENDERERS)
+def generate_ideas_batch(request):
+    """
+    Generate fashion design ideas for a list of prompts.
+
+    Results are returned in input order, or streamed as NDJSON in completion
+    order with ?stream=1.
+    """
+    prompts, error = batch_inputs(request, 'prompts')
+    if error:
+        return error
+
+    if wants_stream(request):
+        return ndjson_response(ml_service.iter_batch('generate_ideas', prompts))
+
+    try:
+        items = ml_service.generate_ideas_batch(prompts)
+        return Response(batch_response(items), status=status.HTTP_200_OK)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def generate_image(request):
     """
     Generate a fashion design image based on a text prompt.
+
+    Pass ?mode=job (or "async": true) to get a job id back immediately and
+    poll /api/jobs/<id> for the result.
     """
     prompt = request.data.get('prompt')
     
@@ -42,9 +259,14 @@ def generate_image(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    if wants_job(request):
+        return submit_job(request, 'generate-image', {'prompt': prompt})
+    
     try:
         result = ml_service.generate_image(prompt)
         return Response(result, status=status.HTTP_200_OK)
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         return Response(
             {'error': str(e)}, 
@@ -68,12 +290,42 @@ def analyze_style(request):
     try:
         result = ml_service.analyze_style(image_url)
         return Response(result, status=status.HTTP_200_OK)
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         return Response(
             {'error': str(e)}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes(STREAMING_RENDERERS)
+def analyze_style_batch(request):
+    """
+    Analyze the style of a list of fashion images.
+
+    Results are returned in input order, or streamed as NDJSON in completion
+    order with ?stream=1.
+    """
+    image_urls, error = batch_inputs(request, 'imageUrls')
+    if error:
+        return error
+
+    if wants_stream(request):
+        return ndjson_response(ml_service.iter_batch('analyze_style', image_urls))
+
+    try:
+        items = ml_service.analyze_style_batch(image_urls)
+        return Response(batch_response(items), status=status.HTTP_200_OK)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def model_status(request):
@@ -89,6 +341,184 @@ def model_status(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def job_detail(request, job_id):
+    """
+    Get the status and result of a background job, or cancel it.
+
+    DELETE cancels a pending or running job and removes a finished one.
+    """
+    try:
+        job = InferenceJob.objects.get(id=job_id, user=request.user)
+    except InferenceJob.DoesNotExist:
+        return Response(
+            {'error': 'Job not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    if request.method == 'DELETE':
+        if job.is_finished:
+            job.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        job_runner.cancel(job)
+        job.refresh_from_db()
+
+    return Response(InferenceJobSerializer(job).data, status=status.HTTP_200_OK)
+
+class FashionItemViewSet(viewsets.ModelViewSet):
+    """
+    CRUD for fashion items, plus ML analysis and similar-item lookups.
+    """
+    queryset = FashionItem.objects.all()
+    serializer_class = FashionItemSerializer
+    pagination_class = CreatedAtCursorPagination
+    permission_classes = [IsAuthenticated]
+
+    def perform_create(self, serializer):
+        from .ingestion import ingest
+        from .similarity import index_item
+
+        item = serializer.save()
+        try:
+            ingest(item)
+            self._analyze(item)
+            index_item(item)
+        except Exception as e:
+            # The item is still created; it can be re-analyzed later
+            logger.warning(f"Analysis failed for item {item.pk}: {e}")
+
+    def perform_update(self, serializer):
+        from .ingestion import delete_derivatives, ingest
+        from .similarity import index_item
+
+        if 'image' not in serializer.validated_data:
+            serializer.save()
+            return
+        delete_derivatives(serializer.instance)
+        item = serializer.save()
+        # A new image needs a new palette, style and embedding, as on create
+        try:
+            ingest(item)
+            self._analyze(item)
+            index_item(item)
+        except Exception as e:
+            logger.warning(f"Analysis failed for item {item.pk}: {e}")
+
+    def perform_destroy(self, instance):
+        from .ingestion import delete_derivatives
+        from .similarity import get_similarity_index
+
+        get_similarity_index().remove(instance.pk)
+        delete_derivatives(instance)
+        instance.delete()
+
+    def _analyze(self, item):
+        # NumPy/Pillow are imported on first use to keep startup fast
+        from .ingestion import has_derivatives, ingest
+        from .palette import palette_for_item
+
+        if not has_derivatives(item):
+            ingest(item)
+        image_url = self.request.build_absolute_uri(item.image.url)
+        result = ml_service.analyze_style(image_url)
+        # Copied, since the service may share its result with other callers
+        analysis = dict(result['analysis'])
+        result = {**result, 'analysis': analysis}
+        categories = analysis.get('style_categories') or ['']
+        item.style_category = categories[0]
+        item.color_palette = palette_for_item(item)
+        item.save(update_fields=['style_category', 'color_palette'])
+        analysis['color_palette'] = [entry['color'] for entry in item.color_palette['colors']]
+        return result
+
+    @action(detail=True, methods=['post'])
+    def analyze(self, request, pk=None):
+        """
+        Run style analysis on an existing item and store the results.
+        """
+        item = self.get_object()
+        try:
+            result = self._analyze(item)
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        return Response(
+            {'item': self.get_serializer(item).data, 'analysis': result['analysis']},
+            status=status.HTTP_200_OK
+        )
+
+    @action(detail=True, methods=['get'])
+    def similar_items(self, request, pk=None):
+        """
+        Get the items most similar to this one, best match first.
+
+        Served from the item's packed neighbour list, so the request costs a
+        cache lookup plus one query fetching this item and its neighbours.
+        """
+        from .neighbours import get_neighbours
+        from .similarity import recommendation_reason
+
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response(
+                {'error': 'limit must be a positive integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = min(limit, 100)
+        try:
+            item_id = int(pk)
+        except ValueError:
+            raise Http404
+        ids, scores = get_neighbours(item_id)
+        ids, scores = ids[:limit].tolist(), scores[:limit].tolist()
+        items = self.get_queryset().in_bulk([item_id, *ids])
+        item = items.get(item_id)
+        if item is None:
+            raise Http404
+        self.check_object_permissions(request, item)
+
+        # Items deleted since the list was built are skipped
+        found = [(items[i], score) for i, score in zip(ids, scores) if i in items]
+        details = FashionItemSerializer(
+            [neighbour for neighbour, _ in found], many=True, context=self.get_serializer_context()
+        ).data
+        return Response([
+            {
+                'source_item': item_id,
+                'recommended_item': neighbour.pk,
+                'recommended_item_details': neighbour_details,
+                'similarity_score': round(score, 3),
+                'recommendation_reason': recommendation_reason(score),
+            }
+            for (neighbour, score), neighbour_details in zip(found, details)
+        ], status=status.HTTP_200_OK)
+
+
+class StyleRecommendationViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    List style recommendations, optionally for one source item (?source_id=).
+    """
+    serializer_class = StyleRecommendationSerializer
+    pagination_class = CreatedAtCursorPagination
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        # recommended_item_details is nested, so join it to keep a page at a
+        # constant number of queries
+        queryset = StyleRecommendation.objects.select_related('recommended_item')
+        source_id = self.request.query_params.get('source_id')
+        if source_id:
+            if not source_id.isdigit():
+                raise ValidationError({'source_id': 'Must be an integer'})
+            queryset = queryset.filter(source_item_id=source_id)
+        return queryset
+
 # Public endpoint for health check
 @api_view(['GET'])
 def health_check(request):
@@ -98,4 +528,23 @@ def health_check(request):
     return Response(
         {'status': 'healthy', 'service': 'fashion-ml-api'}, 
         status=status.HTTP_200_OK
-    )
\ No newline at end of file
+    )
+
+def metrics(request):
+    """
+    Prometheus metrics of all worker processes, in text exposition format.
+
+    Public unless settings.ML_METRICS_TOKEN is set, in which case scrapers must
+    send it as a bearer token.
+    """
+    from django.utils.crypto import constant_time_compare
+
+    from .metrics import render
+
+    token = getattr(settings, 'ML_METRICS_TOKEN', '')
+    if token and not constant_time_compare(
+        request.headers.get('Authorization', ''), f'Bearer {token}'
+    ):
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    body, content_type = render()
+    return HttpResponse(body, content_type=content_type)
@@ -0,0 +1,90 @@
+"""
+Loading of model weights that can be shared between worker processes.
+Weights are stored as plain .npy files. When sharing is on they are
+memory-mapped read-only, so every gunicorn worker maps the same page-cache
+pages instead of holding a private copy and memory stays flat as workers are
+added.
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+def load_array(path, shared=True):
+    """
+    Load a .npy array.
+
+    Args:
+        path: Path of the .npy file
+        shared (bool): Memory-map the file read-only instead of reading it into
+            private memory
+
+    Returns:
+        numpy.ndarray: The array (a read-only numpy.memmap when shared)
+    """
+    return np.load(path, mmap_mode='r' if shared else None, allow_pickle=False)
+
+
+def load_arrays(directory, shared=True):
+    """
+    Load every .npy file in a directory.
+
+    Returns:
+        dict: File stem -> array, e.g. {'embeddings': ..., 'labels': ...}
+    """
+    return {
+        path.stem: load_array(path, shared=shared)
+        for path in sorted(Path(directory).glob('*.npy'))
+    }
+
+
+def load_joblib(path, shared=True):
+    """
+    Load a joblib bundle, memory-mapping the NumPy arrays it contains.
+
+    Only arrays of uncompressed dumps can be mapped; compressed bundles are
+    read into private memory either way.
+    """
+    import joblib
+    return joblib.load(path, mmap_mode='r' if shared else None)
+
+
+def save_arrays(directory, metadata=None, **arrays):
+    """
+    Write arrays as .npy files, plus an optional metadata.json.
+
+    Files are written under a temporary name and renamed into place, so
+    workers mapping the previous version keep a consistent view of it.
+
+    Args:
+        directory: Model directory, e.g. <MODEL_DIR>/style-analyzer
+        metadata (dict, optional): JSON-serializable model metadata
+        **arrays: Name -> array
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, array in arrays.items():
+        temp_path = directory / f'.{name}.npy.tmp'
+        with open(temp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(array), allow_pickle=False)
+        os.replace(temp_path, directory / f'{name}.npy')
+    if metadata is not None:
+        temp_path = directory / '.metadata.json.tmp'
+        temp_path.write_text(json.dumps(metadata))
+        os.replace(temp_path, directory / 'metadata.json')
+
+
+def load_metadata(directory):
+    """Return the metadata.json of a model directory, or an empty dict."""
+    path = Path(directory) / 'metadata.json'
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def nbytes(arrays):
+    """Total size in bytes of a dict of arrays."""
+    return sum(array.nbytes for array in arrays.values())
@@ -13,7 +13,7 @@ const SimilarItems = ({ items }) => {
       <h5 className="font-medium text-neutral-900 mb-2">{t('Similar Items')}</h5>
       <div className="space-y-2">
         {items.map((rec) => (
-          <div key={rec.id} className="flex items-center">
+          <div key={rec.recommended_item} className="flex items-center">
             <div className="w-8 h-8 bg-neutral-200 rounded-full flex items-center justify-center mr-2">
               <ImageIcon size={16} />
             </div>